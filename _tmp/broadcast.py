@@ -55,13 +55,13 @@ async def sse():
     queue = asyncio.Queue()
     app.clients.add(queue)
     async def send_events():
-        while True:
-            try:
+        try:
+            while True:
                 data = await queue.get()
                 event = ServerSentEvent(data)
                 yield event.encode()
-            except asyncio.CancelledError as error:
-                app.clients.remove(queue)
+        finally:
+            app.clients.remove(queue)
 
     response = await make_response(
         send_events(),
@@ -0,0 +1,56 @@
+import grpc
+from google.protobuf.empty_pb2 import Empty
+from rchain.client import DataQueries, RClientException
+from rchain.crypto import PrivateKey
+from rchain.pb.DeployService_pb2 import (
+    DataAtNameQuery, ListeningNameDataResponse)
+from rchain.pb.DeployService_pb2_grpc import DeployServiceStub
+from rchain.pb.ProposeService_pb2_grpc import ProposeServiceStub
+from rchain.util import create_deploy_data
+
+
+def _check_response(response):
+    if response.HasField('error'):
+        raise RClientException('\n'.join(response.error.messages))
+
+
+# Same interface as common.AsyncRClient, but awaits RPCs on a grpc.aio channel
+# instead of hopping to the default executor for every call. Requests and
+# responses are the ones RClient uses.
+class AioRClient:
+
+    def __init__(
+            self,
+            channel: grpc.aio.Channel,
+            phlo_price: int = 1,
+            phlo_limit: int = 1000000000):
+        self.channel = channel
+        self.deploy_stub = DeployServiceStub(channel)
+        self.propose_stub = ProposeServiceStub(channel)
+        self.phlo_price = phlo_price
+        self.phlo_limit = phlo_limit
+
+    async def deploy(self, key: PrivateKey, contract: str, ts=None):
+        deploy_data = create_deploy_data(
+            key, contract, self.phlo_price, self.phlo_limit,
+            timestamp_millis=-1 if ts is None else ts)
+        return await self.deploy_signed(deploy_data)
+
+    async def deploy_signed(self, deploy_data):
+        response = await self.deploy_stub.DoDeploy(deploy_data)
+        _check_response(response)
+        return deploy_data.sig
+
+    async def propose(self):
+        response = await self.propose_stub.propose(Empty())
+        _check_response(response)
+
+    async def get_data_at_deploy_id(self, deploy_id: bytes, depth: int = -1):
+        response = await self.deploy_stub.listenForDataAtName(
+            DataAtNameQuery(
+                depth=depth, name=DataQueries.deploy_id(deploy_id)))
+        _check_response(response)
+        wrapped = response.success.response
+        if hasattr(wrapped, 'value'):
+            return ListeningNameDataResponse.FromString(wrapped.value)
+        return None
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+import grpc
+from rchain.client import RClient
+from rchain.crypto import PrivateKey
+
+from ..common import AsyncRClient
+
+CONTRACT = 'new x in { x!(0) }'
+
+
+async def _run_deploys(client, key: PrivateKey, count: int, concurrency: int):
+    counter = iter(range(1, count + 1))
+
+    async def worker():
+        for ts in counter:
+            await client.deploy(key, CONTRACT, ts=ts)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def bench_executor(address: str, count: int, concurrency: int) -> float:
+    with grpc.insecure_channel(address) as channel:
+        client = AsyncRClient(RClient(channel))
+        key = PrivateKey.generate()
+        start = time.perf_counter()
+        await _run_deploys(client, key, count, concurrency)
+        return count / (time.perf_counter() - start)
+
+
+async def bench_aio(address: str, count: int, concurrency: int) -> float:
+    from ..aio_client import AioRClient
+    async with grpc.aio.insecure_channel(address) as channel:
+        client = AioRClient(channel)
+        key = PrivateKey.generate()
+        start = time.perf_counter()
+        await _run_deploys(client, key, count, concurrency)
+        return count / (time.perf_counter() - start)
+
+
+BACKENDS = {
+    'executor': bench_executor,
+    'aio': bench_aio,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare deploys/s of AsyncRClient backends against '
+        'a local stub DeployService')
+    parser.add_argument('--address', default='127.0.0.1:40411')
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 16, 64, 256])
+    args = parser.parse_args()
+
+    stub = subprocess.Popen([
+        sys.executable, '-m', 'rchain.vault_demo.stub_node', '--address',
+        args.address
+    ])
+    try:
+        time.sleep(1)
+        print(f'{"backend":>10} {"concurrency":>12} {"deploys/s":>12}')
+        for concurrency in args.concurrency:
+            for name, bench in BACKENDS.items():
+                rate = asyncio.run(
+                    bench(args.address, args.count, concurrency))
+                print(f'{name:>10} {concurrency:>12} {rate:>12.1f}')
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import time
+
+from rchain.util import load_contract
+
+from ..contracts import TRANSFER
+
+SENDER = '11112ZM9yrfaTrzCCbKjPbxBncjNCkMFsPqtcLFvhBf4Kqx6rpir2w'
+RECIPIENT = '111127RX5ZgiAdRaQy4AWy57RdvAAckdELReEBxzvWYVvdnR32PiHA'
+
+
+def bench_load_contract(count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        load_contract('rchain.vault', 'transfer.rho.tpl', {
+            'from': SENDER,
+            'to': RECIPIENT,
+            'amount': i
+        })
+    return time.perf_counter() - start
+
+
+def bench_template(count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        TRANSFER.render(SENDER, RECIPIENT, i)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render transfer contracts with load_contract and with '
+        'the precompiled template')
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, bench in [('load_contract', bench_load_contract),
+                        ('ContractTemplate', bench_template)]:
+        elapsed = bench(args.count)
+        print(
+            f'{name:>16}: {args.count} transfers in {elapsed:.3f}s '
+            f'({args.count / elapsed:.0f}/s)')
+
+
+if __name__ == '__main__':
+    main()
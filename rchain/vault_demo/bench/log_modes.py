@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import structlog
+
+from .. import logconfig
+from ..metrics import Histogram
+
+RECIPIENT = '111127RX5ZgiAdRaQy4AWy57RdvAAckdELReEBxzvWYVvdnR32PiHA'
+
+MODES = ['console', 'fast', 'fast_unsampled']
+TICK = 0.001
+
+
+def _configure(mode: str):
+    if mode == 'console':
+        logconfig.configure_console()
+        return None
+    return logconfig.configure_fast(
+        os.devnull, None if mode == 'fast' else {})
+
+
+# Logs like User.deploy_random_transfers while a ticker measures how late the
+# event loop wakes it up.
+async def _measure(count: int, chunk: int) -> dict:
+    logger = structlog.get_logger().bind(rev_addr=RECIPIENT)
+    loop = asyncio.get_running_loop()
+    stalls = Histogram()
+
+    async def ticker():
+        while True:
+            start = loop.time()
+            await asyncio.sleep(TICK)
+            stalls.record(max(0.0, loop.time() - start - TICK))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK)
+    start = time.perf_counter()
+    for i in range(0, count, chunk):
+        logger.info('Deploying %s random transfers', chunk)
+        for j in range(chunk):
+            logger.info('Deploying transfer of %d REV to %s', j, RECIPIENT)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+    return {
+        'events': count,
+        'events_per_s': count / elapsed,
+        'stall_p99_s': stalls.percentile(99),
+        'stall_max_s': stalls.max,
+    }
+
+
+def _run_child(mode: str, count: int, chunk: int) -> dict:
+    listener = _configure(mode)
+    result = asyncio.run(_measure(count, chunk))
+    start = time.perf_counter()
+    if listener is not None:
+        listener.stop()
+    result['drain_s'] = time.perf_counter() - start
+    result['mode'] = mode
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare event rate and event loop stalls of log modes')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument(
+        '--chunk', type=int, default=100,
+        help='events logged between yields to the event loop')
+    parser.add_argument('--child', choices=MODES)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_child(args.child, args.count, args.chunk)))
+        return
+
+    print(
+        f'{"mode":>16} {"events/s":>10} {"stall p99 (ms)":>15} '
+        f'{"stall max (ms)":>15} {"drain (s)":>10}')
+    for mode in args.modes:
+        # Each mode runs in a fresh process, logging config is global. The
+        # console renderer writes to stderr, which is discarded.
+        out = subprocess.run(
+            [
+                sys.executable, '-m', 'rchain.vault_demo.bench.log_modes',
+                '--child', mode, '--count',
+                str(args.count), '--chunk',
+                str(args.chunk)
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL).stdout
+        r = json.loads(out)
+        print(
+            f'{mode:>16} {r["events_per_s"]:>10.0f} '
+            f'{r["stall_p99_s"] * 1000:>15.2f} '
+            f'{r["stall_max_s"] * 1000:>15.2f} {r["drain_s"]:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from random import Random
+
+import structlog
+
+from ..population import UserPopulation
+from ..user import User
+
+SIZES = [1000, 10000, 100000]
+
+
+def _rss() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _user_configs(count: int) -> list:
+    rng = Random(count)
+    return [{
+        'key': f'{rng.getrandbits(256):064x}',
+        'rev_addr': f'1111{rng.getrandbits(200):050x}',
+        'rng_seed': rng.getrandbits(32),
+        'initial_balance': 100000,
+    } for _ in range(count)]
+
+
+def _measure(kind: str, count: int) -> dict:
+    configs = _user_configs(count)
+    logger = structlog.get_logger()
+    rss_before = _rss()
+    start = time.perf_counter()
+    if kind == 'users':
+        population = [User(c, None, logger) for c in configs]
+    else:
+        population = UserPopulation([c['rev_addr'] for c in configs],
+                                    (c['initial_balance'] for c in configs),
+                                    (0 for _ in configs))
+    elapsed = time.perf_counter() - start
+    rss_after = _rss()
+    assert len(population) == count
+    return {
+        'kind': kind,
+        'count': count,
+        'construction_s': elapsed,
+        'rss_bytes': rss_after - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report RSS and construction time of user populations')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--child', nargs=2, metavar=('KIND', 'COUNT'))
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(args.child[0], int(args.child[1]))))
+        return
+
+    print(f'{"kind":>12} {"count":>8} {"time (s)":>10} {"RSS (MiB)":>10}')
+    for count in args.sizes:
+        for kind in ('users', 'population'):
+            # Each measurement runs in a fresh process, so that RSS deltas
+            # aren't skewed by memory freed by earlier runs.
+            out = subprocess.run(
+                [
+                    sys.executable, '-m', 'rchain.vault_demo.bench.population',
+                    '--child', kind,
+                    str(count)
+                ],
+                check=True,
+                stdout=subprocess.PIPE).stdout
+            r = json.loads(out)
+            print(
+                f'{kind:>12} {count:>8} {r["construction_s"]:>10.3f} '
+                f'{r["rss_bytes"] / (1 << 20):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
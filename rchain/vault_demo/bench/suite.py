@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+from random import Random
+from typing import Callable, Dict, List, Tuple
+
+import structlog
+from rchain.crypto import PrivateKey
+from rchain.util import create_deploy_data
+
+from ..config_gen import _key_address, derive_key
+from ..contracts import TRANSFER
+from ..phonetic_names import PhoneticNames
+from ..user import User
+from ..world import World
+
+SENDER = '11112ZM9yrfaTrzCCbKjPbxBncjNCkMFsPqtcLFvhBf4Kqx6rpir2w'
+RECIPIENT = '111127RX5ZgiAdRaQy4AWy57RdvAAckdELReEBxzvWYVvdnR32PiHA'
+ADMIN_KEY = '1' * 64
+
+USER_CONFIG = {
+    'initial_balance': 1000000,
+    'transfer_min_amount': 1,
+    'transfer_max_amount': 10,
+    'deploy_batch_min_size': 100,
+    'deploy_batch_max_size': 100,
+    'deploy_time_limit': 10,
+    'deploy_max_inflight': 8,
+}
+
+
+# Answers every call immediately, so that only client side overhead is
+# measured.
+class StubClient:
+
+    async def deploy(self, key, contract: str, ts=None) -> bytes:
+        return b''
+
+    async def deploy_signed(self, deploy_data) -> bytes:
+        return b''
+
+    async def propose(self):
+        pass
+
+
+class StubNode:
+
+    def __init__(self):
+        self.config = {'address': 'stub'}
+        self.client = StubClient()
+        self.router = None
+        self.trace = None
+
+
+def _user_configs(count: int) -> List[dict]:
+    rng = Random(count)
+    return [
+        dict(
+            USER_CONFIG,
+            key=derive_key(count, i),
+            rev_addr=f'1111{rng.getrandbits(200):050x}',
+            rng_seed=rng.getrandbits(32)) for i in range(count)
+    ]
+
+
+def bench_contract_render(count: int) -> int:
+    for i in range(count):
+        TRANSFER.render(SENDER, RECIPIENT, i)
+    return count
+
+
+def bench_key_derivation(count: int) -> int:
+    for i in range(count):
+        _key_address(derive_key(0, i))
+    return count
+
+
+def bench_deploy_signing(count: int) -> int:
+    key = PrivateKey.from_hex(ADMIN_KEY)
+    for i in range(count):
+        create_deploy_data(
+            key, TRANSFER.render(SENDER, RECIPIENT, i), 1, 1000000000,
+            timestamp_millis=i)
+    return count
+
+
+def bench_user_deploys(count: int) -> int:
+    node = StubNode()
+    logger = structlog.get_logger()
+    users = [User(c, node, logger) for c in _user_configs(count)]
+    recipients = [u.rev_addr for u in users]
+
+    async def run() -> int:
+        batches = await asyncio.gather(
+            *(u.deploy_random_transfers(recipients) for u in users))
+        return sum(len(b) for b in batches)
+
+    return asyncio.run(run())
+
+
+def bench_init_vaults(count: int) -> int:
+    world = World({'rng_seed': 0, 'admin_key': ADMIN_KEY})
+    users = [
+        User(c, StubNode(), structlog.get_logger())
+        for c in _user_configs(count)
+    ]
+    asyncio.run(world._init_vaults(StubClient(), users))
+    return count
+
+
+def bench_phonetic_names(count: int) -> int:
+    names = PhoneticNames(1 << 62)
+    for i in range(count):
+        names[(1 << 62) - i]
+    return count
+
+
+# name -> (function, default count); every function returns the number of
+# operations it performed.
+BENCHMARKS: Dict[str, Tuple[Callable[[int], int], int]] = {
+    'contract_render': (bench_contract_render, 100000),
+    'key_derivation': (bench_key_derivation, 1000),
+    'deploy_signing': (bench_deploy_signing, 1000),
+    'user_deploys': (bench_user_deploys, 100),
+    'init_vaults': (bench_init_vaults, 10000),
+    'phonetic_names': (bench_phonetic_names, 100000),
+}
+
+
+def run_benchmark(name: str, scale: float, repeat: int) -> dict:
+    (func, count) = BENCHMARKS[name]
+    count = max(1, int(count * scale))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = func(count)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[1]:
+            best = (ops, elapsed)
+    (ops, elapsed) = best
+    return {'ops': ops, 'elapsed_s': elapsed, 'ops_per_s': ops / elapsed}
+
+
+# Returns (name, baseline ops/s, current ops/s) of every benchmark that got
+# slower than the baseline by more than the threshold fraction.
+def find_regressions(baseline: dict, current: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if result['ops_per_s'] < base['ops_per_s'] * (1 - threshold):
+            regressions.append((name, base['ops_per_s'], result['ops_per_s']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark client side hot paths without a node')
+    parser.add_argument(
+        '--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument(
+        '--scale', type=float, default=1.0,
+        help='multiply default operation counts')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='report the best of this many runs')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument(
+        '--baseline', help='compare with results of an earlier run')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='allowed throughput drop against the baseline (fraction)')
+    args = parser.parse_args()
+
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    report = {
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'results': {},
+    }
+    for name in args.only:
+        result = run_benchmark(name, args.scale, args.repeat)
+        report['results'][name] = result
+        print(
+            f'{name:>16}: {result["ops"]:>8} ops in '
+            f'{result["elapsed_s"]:.3f}s ({result["ops_per_s"]:.0f}/s)',
+            file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, report, args.threshold)
+        for name, base, current in regressions:
+            print(
+                f'{name}: {current:.0f}/s is {1 - current / base:.1%} below '
+                f'baseline {base:.0f}/s',
+                file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
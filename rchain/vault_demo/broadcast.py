@@ -0,0 +1,131 @@
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+from .common import Transfer
+
+
+class ClientQueue:
+
+    def __init__(self, maxsize: int):
+        self._items: Deque[str] = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # Never blocks the producer, a slow client loses its oldest messages.
+    def put_nowait(self, item: str):
+        if len(self._items) == self._items.maxlen:
+            self.dropped += 1
+        self._items.append(item)
+        self._ready.set()
+
+    async def get(self) -> str:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+
+# Collects simulation events and hands them to subscribed clients once per
+# tick as a single JSON batch. Balances are coalesced to the latest value per
+# address and only the most recent transfers are kept, so neither the batch
+# size nor the producer's work depends on the event rate or the number of
+# clients: every batch is encoded once and shared by all client queues.
+# Balances of published addresses are kept up to date by published transfers,
+# in both directions, so only the addresses a transfer touches are sent.
+class Broadcaster:
+
+    def __init__(
+            self,
+            tick: float = 0.5,
+            client_queue_size: int = 16,
+            max_transfers: int = 100):
+        self.tick = tick
+        self.client_queue_size = client_queue_size
+        self.clients: Set[ClientQueue] = set()
+        self._transfers: Deque[Transfer] = deque(maxlen=max_transfers)
+        self._transfer_count = 0
+        self._balances: Dict[str, int] = {}
+        self._current_balances: Dict[str, int] = {}
+        self._observed_balances: Dict[str, int] = {}
+        self._proposes: List[dict] = []
+        self._failure: Optional[str] = None
+        self._seq = 0
+
+    def subscribe(self) -> ClientQueue:
+        queue = ClientQueue(self.client_queue_size)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: ClientQueue):
+        self.clients.discard(queue)
+
+    def publish_transfer(self, transfer: Transfer):
+        self._transfers.append(transfer)
+        self._transfer_count += 1
+        self._add_balance(transfer.sender, -transfer.amount)
+        self._add_balance(transfer.recipient, transfer.amount)
+
+    def _add_balance(self, rev_addr: str, amount: int):
+        balance = self._current_balances.get(rev_addr)
+        if balance is not None:
+            self.publish_balance(rev_addr, balance + amount)
+
+    def publish_balance(self, rev_addr: str, balance: int):
+        self._current_balances[rev_addr] = balance
+        self._balances[rev_addr] = balance
+
+    # Balances read from the chain, kept apart from the ones tracked from
+    # published transfers: they lag behind until the transfers are proposed.
+    def publish_observed_balance(self, rev_addr: str, balance: int):
+        self._observed_balances[rev_addr] = balance
+
+    def publish_propose(self, node: str, deploys: int, latency: float):
+        self._proposes.append({
+            'node': node,
+            'deploys': deploys,
+            'latency': latency
+        })
+
+    def publish_failure(self, message: str):
+        self._failure = message
+
+    def _take_batch(self) -> Optional[dict]:
+        if not (self._transfer_count or self._balances or
+                self._observed_balances or self._proposes or self._failure):
+            return None
+        self._seq += 1
+        batch = {
+            'seq': self._seq,
+            'transfer_count': self._transfer_count,
+            'transfers': [[t.sender, t.recipient, t.amount]
+                          for t in self._transfers],
+            'balances': self._balances,
+            'observed_balances': self._observed_balances,
+            'proposes': self._proposes,
+            'failure': self._failure,
+        }
+        self._transfers.clear()
+        self._transfer_count = 0
+        self._balances = {}
+        self._observed_balances = {}
+        self._proposes = []
+        self._failure = None
+        return batch
+
+    def flush(self):
+        batch = self._take_batch()
+        if batch is None or not self.clients:
+            return
+        message = json.dumps(batch)
+        for queue in self.clients:
+            queue.put_nowait(message)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.flush()
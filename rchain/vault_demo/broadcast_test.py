@@ -0,0 +1,90 @@
+import asyncio
+import json
+import unittest
+
+from .broadcast import Broadcaster, ClientQueue
+from .common import Transfer
+
+
+class TestClientQueue(unittest.TestCase):
+
+    def test_drop_oldest(self):
+
+        async def test():
+            queue = ClientQueue(2)
+            for i in range(5):
+                queue.put_nowait(str(i))
+            self.assertEqual(3, queue.dropped)
+            self.assertEqual('3', await queue.get())
+            self.assertEqual('4', await queue.get())
+
+        asyncio.run(test())
+
+    def test_get_waits(self):
+
+        async def test():
+            queue = ClientQueue(2)
+            getter = asyncio.create_task(queue.get())
+            await asyncio.sleep(0)
+            self.assertFalse(getter.done())
+            queue.put_nowait('x')
+            self.assertEqual('x', await getter)
+
+        asyncio.run(test())
+
+
+class TestBroadcaster(unittest.TestCase):
+
+    def test_coalesce(self):
+
+        async def test():
+            broadcaster = Broadcaster(max_transfers=2)
+            queue = broadcaster.subscribe()
+            for i in range(10):
+                broadcaster.publish_transfer(Transfer('a', 'b', i))
+                broadcaster.publish_balance('a', 100 - i)
+            broadcaster.publish_propose('node0', 10, 0.5)
+            broadcaster.flush()
+            broadcaster.flush()
+            self.assertEqual(1, len(queue))
+            return json.loads(await queue.get())
+
+        batch = asyncio.run(test())
+        self.assertEqual(10, batch['transfer_count'])
+        self.assertEqual([['a', 'b', 8], ['a', 'b', 9]], batch['transfers'])
+        self.assertEqual({'a': 91}, batch['balances'])
+        self.assertEqual(1, len(batch['proposes']))
+
+    def test_transfer_balances(self):
+        broadcaster = Broadcaster()
+        broadcaster.publish_balance('a', 100)
+        broadcaster.publish_balance('b', 100)
+        broadcaster.publish_balance('c', 100)
+        broadcaster._take_batch()
+        broadcaster.publish_transfer(Transfer('a', 'b', 30))
+        broadcaster.publish_transfer(Transfer('b', 'x', 5))
+        batch = broadcaster._take_batch()
+        self.assertEqual({'a': 70, 'b': 125}, batch['balances'])
+        broadcaster.publish_transfer(Transfer('c', 'a', 1))
+        batch = broadcaster._take_batch()
+        self.assertEqual({'a': 71, 'c': 99}, batch['balances'])
+
+    def test_failure(self):
+        broadcaster = Broadcaster()
+        broadcaster.publish_failure('RuntimeError: boom')
+        self.assertEqual('RuntimeError: boom',
+                         broadcaster._take_batch()['failure'])
+        self.assertIsNone(broadcaster._take_batch())
+
+    def test_unsubscribe(self):
+
+        async def test():
+            broadcaster = Broadcaster()
+            queue = broadcaster.subscribe()
+            broadcaster.unsubscribe(queue)
+            broadcaster.publish_balance('a', 1)
+            broadcaster.flush()
+            self.assertEqual(0, len(queue))
+            self.assertEqual(set(), broadcaster.clients)
+
+        asyncio.run(test())
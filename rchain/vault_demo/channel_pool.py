@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from typing import List
+
+import grpc
+from rchain.client import RClient
+from rchain.crypto import PrivateKey
+
+from .common import AsyncRClient
+from .metrics import REGISTRY, MetricsRegistry
+
+# Channels to the same address share one subchannel (and so one TCP connection)
+# through the global subchannel pool unless told otherwise.
+CHANNEL_OPTIONS = [('grpc.use_local_subchannel_pool', 1)]
+
+
+@dataclass
+class ChannelStats:
+    in_flight: int = 0
+    calls: int = 0
+    errors: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    @property
+    def latency_mean(self) -> float:
+        return self.latency_total / self.calls if self.calls else 0.0
+
+
+class PooledChannel:
+
+    def __init__(
+            self, address: str, backend: str, phlo_price: int,
+            phlo_limit: int):
+        if backend == 'aio':
+            # grpc.aio needs a newer grpcio than the executor backend, only
+            # require it when it's used.
+            from .aio_client import AioRClient
+            self.channel = grpc.aio.insecure_channel(
+                address, options=CHANNEL_OPTIONS)
+            self.client = AioRClient(self.channel, phlo_price, phlo_limit)
+        elif backend == 'executor':
+            self.channel = grpc.insecure_channel(
+                address, options=CHANNEL_OPTIONS)
+            self.client = AsyncRClient(
+                RClient(self.channel), phlo_price, phlo_limit)
+        else:
+            raise ValueError(f'Unknown client backend: {backend}')
+        self.stats = ChannelStats()
+
+    async def close(self):
+        closed = self.channel.close()
+        if asyncio.iscoroutine(closed):
+            await closed
+
+
+class ChannelPool:
+
+    def __init__(
+            self,
+            address: str,
+            size: int = 1,
+            backend: str = 'executor',
+            policy: str = 'round_robin',
+            phlo_price: int = 1,
+            phlo_limit: int = 1000000000):
+        if policy not in ('round_robin', 'least_in_flight'):
+            raise ValueError(f'Unknown channel pool policy: {policy}')
+        self.address = address
+        self.policy = policy
+        self.channels = [
+            PooledChannel(address, backend, phlo_price, phlo_limit)
+            for _ in range(size)
+        ]
+        self._next = itertools.cycle(self.channels)
+
+    def select(self) -> PooledChannel:
+        if self.policy == 'least_in_flight':
+            return min(self.channels, key=lambda c: c.stats.in_flight)
+        return next(self._next)
+
+    async def close(self):
+        for c in self.channels:
+            await c.close()
+
+
+# AsyncRClient interface over a ChannelPool, every call picks a channel
+# according to the pool policy and is accounted in its ChannelStats.
+class PooledRClient:
+
+    def __init__(self, pool: ChannelPool, metrics: MetricsRegistry = REGISTRY):
+        self.pool = pool
+        self.metrics = metrics
+        self._latency = {
+            method: metrics.histogram(
+                'rpc_latency', node=pool.address, method=method)
+            for method in ('deploy', 'deploy_signed', 'propose',
+                           'get_data_at_deploy_id')
+        }
+
+    async def _call(self, method: str, *args, **kwargs):
+        channel = self.pool.select()
+        stats = channel.stats
+        stats.in_flight += 1
+        start_time = time.perf_counter()
+        try:
+            return await getattr(channel.client, method)(*args, **kwargs)
+        except Exception as e:
+            stats.errors += 1
+            self.metrics.counter(
+                'rpc_errors',
+                node=self.pool.address,
+                method=method,
+                error=type(e).__name__).inc()
+            raise
+        finally:
+            latency = time.perf_counter() - start_time
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            self._latency[method].record(latency)
+
+    async def deploy(self, key: PrivateKey, contract: str, ts=None):
+        return await self._call('deploy', key, contract, ts=ts)
+
+    async def deploy_signed(self, deploy_data):
+        return await self._call('deploy_signed', deploy_data)
+
+    async def propose(self):
+        return await self._call('propose')
+
+    async def get_data_at_deploy_id(self, deploy_id: bytes):
+        return await self._call('get_data_at_deploy_id', deploy_id)
+
+    def channel_stats(self) -> List[ChannelStats]:
+        return [c.stats for c in self.pool.channels]
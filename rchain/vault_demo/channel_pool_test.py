@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+
+from .channel_pool import ChannelPool, PooledRClient
+from .metrics import MetricsRegistry
+
+
+# Proposes block until released, deploys fail.
+class FakeClient:
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.proposes = 0
+
+    async def propose(self):
+        self.proposes += 1
+        await self.release.wait()
+        return 'block'
+
+    async def deploy(self, key, contract, ts=None):
+        raise ConnectionError('Connection reset')
+
+
+def fake_pool(size: int, policy: str) -> ChannelPool:
+    # grpc channels connect lazily, nothing is dialed here.
+    pool = ChannelPool('127.0.0.1:1', size=size, policy=policy)
+    for c in pool.channels:
+        c.client = FakeClient()
+    return pool
+
+
+class TestChannelPool(unittest.TestCase):
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ChannelPool('127.0.0.1:1', policy='random')
+
+    def test_round_robin(self):
+        pool = fake_pool(3, 'round_robin')
+        selected = [pool.select() for _ in range(6)]
+        self.assertEqual(selected, pool.channels * 2)
+
+    def test_least_in_flight(self):
+
+        async def test():
+            pool = fake_pool(3, 'least_in_flight')
+            client = PooledRClient(pool, metrics=MetricsRegistry())
+            a, b, c = pool.channels
+            first = asyncio.ensure_future(client.propose())
+            second = asyncio.ensure_future(client.propose())
+            await asyncio.sleep(0)
+            self.assertEqual([1, 1, 0],
+                             [s.in_flight for s in client.channel_stats()])
+            # Only c is idle, then a is the first of the least busy.
+            self.assertIs(pool.select(), c)
+            a.client.release.set()
+            self.assertEqual('block', await first)
+            self.assertIs(pool.select(), a)
+            b.client.release.set()
+            await second
+            self.assertEqual([0, 0, 0],
+                             [s.in_flight for s in client.channel_stats()])
+            self.assertEqual([1, 1, 0],
+                             [s.calls for s in client.channel_stats()])
+
+        asyncio.run(test())
+
+    def test_failed_call(self):
+
+        async def test():
+            metrics = MetricsRegistry()
+            pool = fake_pool(2, 'least_in_flight')
+            client = PooledRClient(pool, metrics=metrics)
+            for _ in range(3):
+                with self.assertRaises(ConnectionError):
+                    await client.deploy(None, 'Nil')
+            # The failed calls release their slot, so least_in_flight keeps
+            # picking the first channel.
+            stats = client.channel_stats()
+            self.assertEqual([0, 0], [s.in_flight for s in stats])
+            self.assertEqual([3, 0], [s.calls for s in stats])
+            self.assertEqual([3, 0], [s.errors for s in stats])
+            self.assertEqual(
+                3,
+                metrics.counter(
+                    'rpc_errors',
+                    node='127.0.0.1:1',
+                    method='deploy',
+                    error='ConnectionError').value)
+            self.assertEqual(
+                3,
+                metrics.histogram(
+                    'rpc_latency', node='127.0.0.1:1',
+                    method='deploy').count)
+
+        asyncio.run(test())
+
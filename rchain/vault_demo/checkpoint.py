@@ -0,0 +1,178 @@
+import asyncio
+import os
+import pickle
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from structlog.stdlib import BoundLogger as Logger
+
+from .ledger import LedgerReader, LedgerWriter, truncate
+from .population import UserPopulation
+
+SNAPSHOT_NAME = 'snapshot.pickle'
+
+
+@dataclass
+class NodeSnapshot:
+    rng_state: tuple
+    users: UserPopulation
+    user_rng_states: List[Optional[tuple]]
+    # Transfers of this node in its ledger up to the snapshot.
+    ledger_records: int
+
+
+@dataclass
+class Snapshot:
+    vaults_funded: bool = False
+    elapsed: float = 0.0
+    nodes: Dict[str, NodeSnapshot] = field(default_factory=dict)
+
+
+# Checkpoints a simulation into a directory: a snapshot of user and rng state
+# plus one transfer ledger per node as the delta log. Nodes are captured
+# after each of their deploy rounds, when none of their deploys is in flight,
+# and the snapshot is pickled and written on a worker thread after the
+# ledgers it refers to are synced. Transfers logged after a node's last
+# capture were sent, so on resume they are kept and reconciled into the
+# users' state instead of being drawn and sent again. Deploys in flight at
+# the time of a crash were never logged and aren't accounted for.
+class Checkpointer:
+
+    def __init__(self, directory: str, logger: Logger, interval: float = 60):
+        self.directory = directory
+        self.logger = logger
+        self.interval = interval
+        self.snapshot = Snapshot()
+        self._elapsed_base = 0.0
+        self._started: Optional[float] = None
+        self._last_write = time.monotonic()
+        self._write_task: Optional[asyncio.Task] = None
+        self._ledgers: List[LedgerWriter] = []
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_NAME)
+
+    def ledger_path(self, node: 'Node') -> str:
+        address = node.config['address'].replace(':', '_').replace('/', '_')
+        return os.path.join(self.directory, f'{address}.ledger')
+
+    # Restores nodes and users from the last snapshot, if there's one, and
+    # opens their ledgers. Returns whether there was a snapshot.
+    def restore(self, nodes: List['Node']) -> bool:
+        found = os.path.exists(self.snapshot_path)
+        if found:
+            with open(self.snapshot_path, 'rb') as f:
+                self.snapshot = pickle.load(f)
+            self._elapsed_base = self.snapshot.elapsed
+        for n in nodes:
+            path = self.ledger_path(n)
+            node_snapshot = self.snapshot.nodes.get(n.config['address'])
+            captured = 0
+            if node_snapshot is not None:
+                n.rng.setstate(node_snapshot.rng_state)
+                node_snapshot.users.update_users(n.users)
+                for u, state in zip(n.users, node_snapshot.user_rng_states):
+                    u.set_rng_state(state)
+                captured = node_snapshot.ledger_records
+            if os.path.exists(path):
+                if found:
+                    self._reconcile(n, path, captured)
+                else:
+                    truncate(path, 0)
+            n.ledger = LedgerWriter(path)
+            self._ledgers.append(n.ledger)
+            n.checkpointer = self
+        return found
+
+    # Charges transfers logged after the node's capture to their senders and
+    # moves the senders' deploy counters past them. The transfers drawn again
+    # from the restored rng state then get new timestamps, so they are new
+    # deploys rather than copies of ones already sent.
+    def _reconcile(self, node: 'Node', path: str, start: int):
+        users = {u.rev_addr: u for u in node.users}
+        with LedgerReader(path) as reader:
+            if len(reader) < start:
+                self.logger.warning(
+                    'Ledger %s has %d transfers, %d were captured', path,
+                    len(reader), start)
+                return
+            for (_, sender, _, amount) in reader.records(start):
+                user = users.get(reader.addrs[sender])
+                if user is not None:
+                    user.balance -= amount
+                    user.deploy_counter += 1
+            if len(reader) > start:
+                self.logger.info(
+                    'Kept %d transfers logged after the checkpoint of %s',
+                    len(reader) - start, node.config['address'])
+
+    # Starts counting simulation time, which continues from the snapshot.
+    def start(self):
+        self._started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None:
+            return self._elapsed_base
+        return self._elapsed_base + time.monotonic() - self._started
+
+    def capture(self, node: 'Node'):
+        node.ledger.flush()
+        self.snapshot.nodes[node.config['address']] = NodeSnapshot(
+            node.rng.getstate(), UserPopulation.from_users(node.users),
+            [u.get_rng_state() for u in node.users], node.ledger.count)
+        if time.monotonic() - self._last_write >= self.interval:
+            self._schedule_write()
+
+    def _schedule_write(self):
+        if self._write_task is not None and not self._write_task.done():
+            return
+        self._last_write = time.monotonic()
+        self.snapshot.elapsed = self.elapsed
+        # Pickled on the worker thread, so it must not be touched until the
+        # write is done; captures go into a new snapshot meanwhile.
+        snapshot = self.snapshot
+        self.snapshot = Snapshot(
+            snapshot.vaults_funded, snapshot.elapsed, dict(snapshot.nodes))
+        for ledger in self._ledgers:
+            ledger.flush()
+        self._write_task = asyncio.create_task(self._write(snapshot))
+
+    async def _write(self, snapshot: Snapshot):
+        start = time.monotonic()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write_sync, snapshot)
+        self.logger.info(
+            'Checkpoint written in %.3fs (%.0fs of simulation)',
+            time.monotonic() - start, snapshot.elapsed)
+
+    def _write_sync(self, snapshot: Snapshot):
+        # A snapshot must never refer to ledger records that could still be
+        # lost, resuming would then log transfers that didn't happen.
+        for ledger in self._ledgers:
+            ledger.fsync()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def mark_funded(self):
+        self.snapshot.vaults_funded = True
+        await self.flush()
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        self._schedule_write()
+        await self._write_task
+
+    # Ledgers with every transfer, including the ones of earlier runs.
+    def ledger_paths(self, nodes: List['Node']) -> List[str]:
+        for ledger in self._ledgers:
+            ledger.flush()
+        return [self.ledger_path(n) for n in nodes]
@@ -0,0 +1,87 @@
+import asyncio
+import tempfile
+import unittest
+from random import Random
+
+import structlog
+
+from .checkpoint import Checkpointer
+from .ledger import LedgerReader
+from .user import User
+
+RECIPIENTS = ['a', 'b', 'c']
+
+
+class FakeNode:
+
+    def __init__(self):
+        self.config = {'address': '127.0.0.1:40401'}
+        self.rng = Random(1)
+        self.users = [
+            User({
+                'key': f'{i + 1:064x}',
+                'rev_addr': f'user{i}',
+                'rng_seed': i,
+                'initial_balance': 10000,
+                'transfer_min_amount': 1,
+                'transfer_max_amount': 100,
+            }, self, structlog.get_logger()) for i in range(3)
+        ]
+        self.ledger = None
+        self.checkpointer = None
+
+    def deploy_round(self) -> list:
+        self.rng.random()
+        batch = [u._next_transfer(RECIPIENTS) for u in self.users]
+        self.ledger.extend(tf for tf, _ in batch)
+        return batch
+
+
+class TestCheckpointer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resume_keeps_uncaptured_transfers(self):
+        logger = structlog.get_logger()
+
+        async def first_run():
+            node = FakeNode()
+            checkpointer = Checkpointer(self.tmpdir.name, logger)
+            self.assertFalse(checkpointer.restore([node]))
+            await checkpointer.mark_funded()
+            checkpointer.start()
+            logged = node.deploy_round()
+            node.checkpointer.capture(node)
+            await checkpointer.flush()
+            # Logged but not captured before the crash.
+            uncaptured = node.deploy_round()
+            node.ledger.close()
+            return (logged, uncaptured, [u.balance for u in node.users])
+
+        async def second_run():
+            node = FakeNode()
+            checkpointer = Checkpointer(self.tmpdir.name, logger)
+            self.assertTrue(checkpointer.restore([node]))
+            self.assertTrue(checkpointer.snapshot.vaults_funded)
+            balances = [u.balance for u in node.users]
+            redrawn = node.deploy_round()
+            (path, ) = checkpointer.ledger_paths([node])
+            with LedgerReader(path) as reader:
+                transfers = [tf for (_, tf) in reader]
+            node.ledger.close()
+            return (balances, redrawn, transfers)
+
+        (logged, uncaptured, balances) = asyncio.run(first_run())
+        (resumed_balances, redrawn, transfers) = asyncio.run(second_run())
+        self.assertEqual(balances, resumed_balances)
+        # Same draws as the uncaptured round, but not the same deploys.
+        self.assertEqual([tf for tf, _ in uncaptured],
+                         [tf for tf, _ in redrawn])
+        self.assertEqual([ts + 1 for _, ts in uncaptured],
+                         [ts for _, ts in redrawn])
+        self.assertEqual([tf for tf, _ in logged + uncaptured + redrawn],
+                         transfers)
@@ -1,11 +1,14 @@
 import asyncio
+import functools
 from random import Random
-from rchain.client import RClient
+from rchain.client import RClient, RClientException
 from rchain.crypto import PrivateKey
+from rchain.pb.DeployService_pb2_grpc import DeployServiceStub
 from dataclasses import dataclass
 
 @dataclass
 class Transfer:
+    __slots__ = ('sender', 'recipient', 'amount')
     sender: str
     recipient: str
     amount: int
@@ -34,9 +37,28 @@ class AsyncRClient:
         self.phlo_limit = phlo_limit
 
     async def deploy(self, key: PrivateKey, contract: str, ts=None):
+        # Same timestamp as a presigned deploy of the transfer would have.
         return await asyncio.get_running_loop().run_in_executor(
-            None, self.blocking_client.deploy, key, contract, self.phlo_price,
-            self.phlo_limit, ts)
+            None,
+            functools.partial(
+                self.blocking_client.deploy,
+                key,
+                contract,
+                self.phlo_price,
+                self.phlo_limit,
+                timestamp_millis=-1 if ts is None else ts))
+
+    # RClient only sends deploys it signs itself.
+    def _send_deploy(self, deploy_data):
+        response = DeployServiceStub(
+            self.blocking_client.channel).DoDeploy(deploy_data)
+        if response.HasField('error'):
+            raise RClientException('\n'.join(response.error.messages))
+        return deploy_data.sig
+
+    async def deploy_signed(self, deploy_data):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._send_deploy, deploy_data)
 
     async def propose(self):
         return await asyncio.get_running_loop().run_in_executor(
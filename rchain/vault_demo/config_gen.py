@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from random import Random
+from typing import Dict, List, Optional
+
+from rchain.crypto import PrivateKey
+
+from .common import rand_int
+from .phonetic_names import PhoneticNames
+
+NODE_DEFAULTS = {
+    'client_backend': 'executor',
+    'channel_pool_size': 1,
+    'channel_pool_policy': 'round_robin',
+    'deploys_max_delay': 0,
+    'deploys_min_delay': 0,
+    'deploys_fixed_duration': 12,
+    'propose_max_delay': 2,
+    'propose_min_delay': 2,
+    'propose_time_limit': 25,
+    'propose_fixed_duration': 30,
+}
+
+USER_DEFAULTS = {
+    'initial_balance': 100000,
+    'deploy_batch_max_size': 5,
+    'deploy_batch_min_size': 1,
+    'deploy_max_inflight': 1,
+    'deploy_time_limit': 5,
+    'transfer_max_amount': 1000,
+    'transfer_min_amount': 100,
+}
+
+
+def derive_key(master_seed: int, index: int) -> str:
+    return hashlib.blake2b(
+        f'{master_seed}:{index}'.encode(), digest_size=32).hexdigest()
+
+
+def _key_address(key_hex: str) -> str:
+    return PrivateKey.from_hex(key_hex).get_public_key().get_address()
+
+
+class AddressCache:
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.addrs: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            for line in Path(path).read_text().splitlines():
+                (key_hex, addr) = line.split()
+                self.addrs[key_hex] = addr
+
+    def resolve(self, keys: List[str], workers: Optional[int] = None):
+        missing = [k for k in keys if k not in self.addrs]
+        if not missing:
+            return
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(missing) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            addrs = list(
+                executor.map(_key_address, missing, chunksize=chunksize))
+        self.addrs.update(zip(missing, addrs))
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(''.join(f'{k} {a}\n' for k, a in zip(missing, addrs)))
+
+
+# Drawn counts are at least 1, a node without users would sit idle.
+def _user_count(rng: Random, spec) -> int:
+    if isinstance(spec, int):
+        return spec
+    return max(1, int(rng.gauss(spec['mean'], spec.get('stddev', 0))))
+
+
+def generate_config(
+        spec: dict,
+        cache: AddressCache,
+        workers: Optional[int] = None) -> dict:
+    seed = spec['seed']
+    rng = Random(seed)
+    user_defaults = dict(USER_DEFAULTS, **spec.get('user_defaults', {}))
+    if 'transfer_amount' in spec:
+        (user_defaults['transfer_min_amount'],
+         user_defaults['transfer_max_amount']) = spec['transfer_amount']
+    if 'deploy_batch_size' in spec:
+        (user_defaults['deploy_batch_min_size'],
+         user_defaults['deploy_batch_max_size']) = spec['deploy_batch_size']
+    if 'initial_balance' in spec:
+        user_defaults['initial_balance'] = spec['initial_balance']
+
+    nodes = []
+    user_configs = []
+    for node_spec in spec['nodes']:
+        if isinstance(node_spec, str):
+            node_spec = {'address': node_spec}
+        node = dict(NODE_DEFAULTS, **spec.get('node_defaults', {}))
+        node.update(node_spec)
+        node.pop('users_per_node', None)
+        node['rng_seed'] = rand_int(rng)
+        node['users'] = []
+        count = _user_count(
+            rng, node_spec.get('users_per_node', spec['users_per_node']))
+        for _ in range(count):
+            user = dict(user_defaults)
+            user['key'] = derive_key(seed, len(user_configs))
+            user['rng_seed'] = rand_int(rng)
+            node['users'].append(user)
+            user_configs.append(user)
+        nodes.append(node)
+
+    cache.resolve([u['key'] for u in user_configs], workers)
+    names = PhoneticNames(max_index=len(user_configs), sep='_')
+    for i, user in enumerate(user_configs):
+        user['name'] = names[i].upper()
+        user['rev_addr'] = cache.addrs[user['key']]
+
+    return {
+        'admin_key': spec.get('admin_key', derive_key(seed, -1)),
+        'rng_seed': rand_int(rng),
+        'run_duration': spec.get('run_duration', 120),
+        'workers': spec.get('workers', 0),
+        'nodes': nodes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Expand a scenario spec into a full World config')
+    parser.add_argument('spec', help='Scenario spec (JSON)')
+    parser.add_argument('-o', '--output', help='Defaults to stdout')
+    parser.add_argument(
+        '--address-cache',
+        default='.address_cache',
+        help='File caching derived REV addresses by private key')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    spec = json.loads(Path(args.spec).read_text())
+    config = generate_config(
+        spec, AddressCache(args.address_cache), args.workers)
+    if args.output:
+        Path(args.output).write_text(json.dumps(config, indent=2))
+    else:
+        json.dump(config, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
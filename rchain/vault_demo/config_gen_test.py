@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from random import Random
+
+from .config_gen import AddressCache, _key_address, _user_count, derive_key
+
+
+class TestConfigGen(unittest.TestCase):
+
+    def test_derive_key(self):
+        key = derive_key(1, 0)
+        self.assertEqual(key, derive_key(1, 0))
+        self.assertEqual(64, len(key))
+        others = [derive_key(1, 1), derive_key(2, 0), derive_key(1, -1)]
+        self.assertEqual(4, len({key, *others}))
+
+    def test_user_count(self):
+        rng = Random(1)
+        self.assertEqual(0, _user_count(rng, 0))
+        self.assertEqual(5, _user_count(rng, 5))
+        counts = [
+            _user_count(rng, {'mean': 0, 'stddev': 3}) for _ in range(100)
+        ]
+        self.assertEqual(1, min(counts))
+
+    def test_address_cache(self):
+        keys = [derive_key(1, i) for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'addrs')
+            cache = AddressCache(path)
+            cache.resolve(keys[:2], workers=1)
+            self.assertEqual(_key_address(keys[0]), cache.addrs[keys[0]])
+
+            cache = AddressCache(path)
+            self.assertEqual(keys[:2], list(cache.addrs))
+            # Only keys missing from the cache are resolved and appended.
+            cache.resolve(keys, workers=1)
+            with open(path) as f:
+                self.assertEqual(3, len(f.read().splitlines()))
+            self.assertEqual(
+                _key_address(keys[2]),
+                AddressCache(path).addrs[keys[2]])
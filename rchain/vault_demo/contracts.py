@@ -0,0 +1,79 @@
+import functools
+import re
+from typing import Callable, Optional, Pattern, Sequence, Tuple
+
+from rchain.util import load_contract
+
+_SENTINEL_RE = re.compile('\x00([0-9]+)\x00')
+
+
+class ContractTemplate:
+
+    def __init__(
+            self,
+            package: str,
+            name: str,
+            params: Sequence[str],
+            cache_size: Optional[int] = None):
+        self.package = package
+        self.name = name
+        self.params = tuple(params)
+        self.cache_size = cache_size
+        self._render: Callable[..., str] = self._compile_and_render
+        self._pattern: Optional[Pattern] = None
+
+    def _compile(self):
+        # Let load_contract substitute unique sentinels for the parameters so
+        # that we don't depend on its placeholder syntax, then turn the result
+        # into a format string with positional fields.
+        rendered = load_contract(
+            self.package, self.name,
+            {p: f'\x00{i}\x00' for i, p in enumerate(self.params)})
+        pieces = _SENTINEL_RE.split(rendered)
+        fmt = ''.join(
+            '{' + piece + '}' if i % 2 else piece.replace('{', '{{').replace(
+                '}', '}}') for i, piece in enumerate(pieces))
+        render = fmt.format
+        if self.cache_size is not None:
+            render = functools.lru_cache(maxsize=self.cache_size)(render)
+        self._render = render
+
+        regex = []
+        seen = set()
+        for i, piece in enumerate(pieces):
+            if not i % 2:
+                regex.append(re.escape(piece))
+            elif piece in seen:
+                regex.append(f'(?P=p{piece})')
+            else:
+                seen.add(piece)
+                regex.append(f'(?P<p{piece}>.*?)')
+        self._pattern = re.compile(''.join(regex) + '$', re.DOTALL)
+
+    def _compile_and_render(self, *args) -> str:
+        self._compile()
+        return self._render(*args)
+
+    def render(self, *args) -> str:
+        return self._render(*args)
+
+    # Inverse of render, returns the parameter values (as strings) if the
+    # contract was rendered from this template.
+    def parse(self, contract: str) -> Optional[Tuple[str, ...]]:
+        if self._pattern is None:
+            self._compile()
+        m = self._pattern.match(contract)
+        if m is None:
+            return None
+        return tuple(m.group(f'p{i}') for i in range(len(self.params)))
+
+
+CREATE_GENESIS_VAULT = ContractTemplate(
+    'rchain.vault', 'create_genesis_vault.rho.tpl', ('addr', 'balance'))
+
+TRANSFER = ContractTemplate(
+    'rchain.vault', 'transfer.rho.tpl', ('from', 'to', 'amount'))
+
+# Balance queries repeat for the same addresses on every verification round.
+GET_BALANCE = ContractTemplate(
+    'rchain.vault', 'get_balance.rho.tpl', ('addr',), cache_size=100000)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass
+from string import Template
+from typing import Dict, List, Optional, Set, Tuple
+
+from rchain.crypto import PrivateKey
+from structlog.stdlib import BoundLogger as Logger
+
+from .common import AsyncRClient, VaultDemoException
+from .contracts import CREATE_GENESIS_VAULT
+from .verify import BalanceVerifier
+
+# Transfers from one vault to many in a single deploy. The vault and its
+# auth key are looked up once, transfers are then chained one after another.
+FUND_VAULTS_RHO_TPL = Template('''
+new rl(`rho:registry:lookup`), RevVaultCh, vaultCh, revVaultKeyCh, loop in {
+  rl!(`rho:rchain:revVault`, *RevVaultCh) |
+  for (@(_, RevVault) <- RevVaultCh) {
+    @RevVault!("findOrCreate", "$from_addr", *vaultCh) |
+    @RevVault!("deployerAuthKey", *revVaultKeyCh) |
+    for (@(true, vault) <- vaultCh; key <- revVaultKeyCh) {
+      contract loop(@transfers) = {
+        match transfers {
+          [] => Nil
+          [(addr, amount) ...rest] => {
+            new resultCh in {
+              @vault!("transfer", addr, amount, *key, *resultCh) |
+              for (_ <- resultCh) {
+                loop!(rest)
+              }
+            }
+          }
+        }
+      } |
+      loop!([$transfers])
+    }
+  }
+}
+''')
+
+
+def render_fund_vaults(from_addr: str, amounts: List[Tuple[str, int]]) -> str:
+    return FUND_VAULTS_RHO_TPL.substitute(
+        from_addr=from_addr,
+        transfers=', '.join(f'("{a}", {n})' for a, n in amounts))
+
+
+_FUND_VAULTS_AFFIXES = FUND_VAULTS_RHO_TPL.substitute(
+    from_addr='\x00', transfers='\x00').split('\x00')
+
+
+def parse_fund_vaults(
+        contract: str) -> Optional[Tuple[str, List[Tuple[str, int]]]]:
+    (prefix, infix, suffix) = _FUND_VAULTS_AFFIXES
+    if not (contract.startswith(prefix) and contract.endswith(suffix)):
+        return None
+    (from_addr, sep, transfers) = contract[len(prefix):-len(suffix)] \
+        .partition(infix)
+    if not sep:
+        return None
+    return (
+        from_addr, [
+            (a, int(n))
+            for a, n in re.findall(r'\("([^"]*)", (\d+)\)', transfers)
+        ])
+
+
+@dataclass
+class FundingError(VaultDemoException):
+    unfunded: List[str]
+
+
+# Records what has been funded so far, so that an interrupted funding can be
+# resumed without paying twice.
+class FundingState:
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.genesis_vault: Optional[str] = None
+        self.funded: Set[str] = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.genesis_vault = state['genesis_vault']
+            self.funded = set(state['funded'])
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'genesis_vault': self.genesis_vault,
+                'funded': sorted(self.funded),
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+# Balances are checked on the node that proposed a vault's funding, other
+# nodes may not have its block yet and the vault would be paid twice.
+class VaultFunder:
+
+    def __init__(
+            self,
+            verifiers: List[BalanceVerifier],
+            admin_key: PrivateKey,
+            logger: Logger,
+            state: FundingState,
+            chunk_size: int = 200,
+            concurrency: int = 8,
+            max_rounds: int = 3):
+        # One verifier per node, funding is deployed through their clients.
+        self.verifiers = verifiers
+        self.clients: List[AsyncRClient] = [v.client for v in verifiers]
+        self.admin_key = admin_key
+        self.admin_rev_addr = admin_key.get_public_key().get_address()
+        self.logger = logger
+        self.state = state
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_rounds = max_rounds
+        # Index of the client that last funded a vault.
+        self._funded_by: Dict[str, int] = {}
+
+    async def _create_genesis_vault(self, balance: int):
+        if self.state.genesis_vault == self.admin_rev_addr:
+            return
+        self.logger.info(
+            'Initializing genesis vault %s with balance of %d REV',
+            self.admin_rev_addr, balance)
+        await self.clients[0].deploy(
+            self.admin_key,
+            CREATE_GENESIS_VAULT.render(self.admin_rev_addr, balance))
+        await self.clients[0].propose()
+        self.state.genesis_vault = self.admin_rev_addr
+        self.state.save()
+
+    # Vaults this run hasn't funded yet, e.g. ones funded by an earlier,
+    # interrupted run, are looked up on every node.
+    async def _fetch_balances(self, rev_addrs: List[str]) -> Dict[str, int]:
+        groups: Dict[int, List[str]] = {}
+        for a in rev_addrs:
+            i = self._funded_by.get(a)
+            for j in range(len(self.clients)) if i is None else [i]:
+                groups.setdefault(j, []).append(a)
+        results = await asyncio.gather(
+            *(self.verifiers[i].fetch_balances(g) for i, g in groups.items()))
+        balances: Dict[str, int] = {}
+        for r in results:
+            for a, bal in r.items():
+                balances[a] = max(bal, balances.get(a, bal))
+        return balances
+
+    # Records vaults holding at least their initial balance as funded and
+    # returns how much the others are short of it. Vaults whose balance
+    # couldn't be looked up are short by None, they aren't paid until a later
+    # check finds their balance.
+    async def _check_funded(
+            self, amounts: Dict[str, int]) -> Dict[str, Optional[int]]:
+        balances = await self._fetch_balances(list(amounts))
+        shortfall: Dict[str, Optional[int]] = {}
+        for a, n in amounts.items():
+            bal = balances.get(a)
+            if bal is not None and bal >= n:
+                self.state.funded.add(a)
+            else:
+                shortfall[a] = None if bal is None else n - bal
+        self.state.save()
+        return shortfall
+
+    async def _fund_chunks(self, amounts: Dict[str, int]):
+        items = list(amounts.items())
+        chunks = [
+            items[i:i + self.chunk_size]
+            for i in range(0, len(items), self.chunk_size)
+        ]
+        self.logger.info(
+            'Funding %d vaults in %d deploys across %d nodes', len(items),
+            len(chunks), len(self.clients))
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def fund(i: int, chunk: List[Tuple[str, int]]):
+            async with sem:
+                await self.clients[i].deploy(
+                    self.admin_key,
+                    render_fund_vaults(self.admin_rev_addr, chunk))
+            for a, _ in chunk:
+                self._funded_by[a] = i
+
+        await asyncio.gather(
+            *(fund(i % len(self.clients), c) for i, c in enumerate(chunks)))
+        await asyncio.gather(
+            *(c.propose() for c in self.clients[:len(chunks)]))
+
+    async def fund(self, amounts: Dict[str, int]):
+        resumed = self.state.genesis_vault == self.admin_rev_addr
+        # account for possible deploy fees for transfers from genesis vault by
+        # 1.2 factor
+        await self._create_genesis_vault(int(1.2 * sum(amounts.values())))
+        pending = {
+            a: n
+            for a, n in amounts.items() if a not in self.state.funded
+        }
+        shortfall: Dict[str, Optional[int]] = dict(pending)
+        if resumed:
+            self.logger.info(
+                'Resuming funding, %d of %d vaults recorded as funded',
+                len(amounts) - len(pending), len(amounts))
+            shortfall = await self._check_funded(pending)
+        for _ in range(self.max_rounds):
+            if not shortfall:
+                break
+            payments = {a: n for a, n in shortfall.items() if n is not None}
+            if payments:
+                await self._fund_chunks(payments)
+            shortfall = await self._check_funded(
+                {a: pending[a]
+                 for a in shortfall})
+            if shortfall:
+                self.logger.warning(
+                    '%d vaults not funded, retrying', len(shortfall))
+        if shortfall:
+            raise FundingError(sorted(shortfall))
+        self.logger.info('Funded %d vaults', len(amounts))
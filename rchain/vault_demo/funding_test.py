@@ -0,0 +1,138 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import structlog
+from rchain.crypto import PrivateKey
+
+from .funding import (
+    FundingError, FundingState, VaultFunder, parse_fund_vaults,
+    render_fund_vaults)
+
+ADMIN_KEY = PrivateKey.from_hex('1' * 64)
+
+
+# A node's view of vault balances. Blocks aren't propagated, a vault funded
+# on one node doesn't show up on the others.
+class FakeClient:
+
+    def __init__(self):
+        self.balances = {}
+        self.pending = []
+        self.funding_deploys = 0
+
+    async def deploy(self, key, contract, ts=None):
+        self.pending.append(contract)
+
+    async def propose(self):
+        for contract in self.pending:
+            funding = parse_fund_vaults(contract)
+            if funding is not None:
+                self.funding_deploys += 1
+                for addr, amount in funding[1]:
+                    self.balances[addr] = self.balances.get(addr, 0) + amount
+        self.pending = []
+
+
+class FakeVerifier:
+
+    def __init__(self, client: FakeClient, unknown=()):
+        self.client = client
+        self.unknown = set(unknown)
+
+    async def fetch_balances(self, rev_addrs):
+        balances = {
+            a: self.client.balances.get(a, 0)
+            for a in rev_addrs if a not in self.unknown
+        }
+        self.unknown.clear()
+        return balances
+
+
+class TestFundVaultsContract(unittest.TestCase):
+
+    def test_roundtrip(self):
+        amounts = [('1111a', 10), ('1111b', 200)]
+        contract = render_fund_vaults('1111admin', amounts)
+        self.assertEqual(('1111admin', amounts), parse_fund_vaults(contract))
+
+    def test_other_contract(self):
+        self.assertIsNone(parse_fund_vaults('new x in { x!(1) }'))
+
+
+class TestFundingState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'funding.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_load(self):
+        state = FundingState(self.path)
+        self.assertIsNone(state.genesis_vault)
+        state.genesis_vault = '1111admin'
+        state.funded.update(['1111b', '1111a'])
+        state.save()
+        loaded = FundingState(self.path)
+        self.assertEqual('1111admin', loaded.genesis_vault)
+        self.assertEqual({'1111a', '1111b'}, loaded.funded)
+
+    def test_no_path(self):
+        state = FundingState(None)
+        state.funded.add('1111a')
+        state.save()
+        self.assertEqual([], os.listdir(self.tmpdir.name))
+
+
+class TestVaultFunder(unittest.TestCase):
+
+    def _fund(self, verifiers, amounts, state=None, **kwargs):
+        funder = VaultFunder(
+            verifiers, ADMIN_KEY, structlog.get_logger(), state or
+            FundingState(None), **kwargs)
+        asyncio.run(funder.fund(amounts))
+
+    def test_checked_on_funding_node(self):
+        clients = [FakeClient(), FakeClient()]
+        amounts = {f'1111{i}': 100 for i in range(5)}
+        self._fund([FakeVerifier(c) for c in clients], amounts, chunk_size=2)
+        funded = {}
+        for c in clients:
+            for a, bal in c.balances.items():
+                funded[a] = funded.get(a, 0) + bal
+        self.assertEqual(amounts, funded)
+        self.assertEqual([2, 1], [c.funding_deploys for c in clients])
+
+    def test_resume_pays_shortfall(self):
+        client = FakeClient()
+        client.balances.update({'1111a': 100, '1111b': 30, '1111c': 250})
+        state = FundingState(None)
+        state.genesis_vault = ADMIN_KEY.get_public_key().get_address()
+        # A failed lookup isn't taken as an empty vault.
+        verifier = FakeVerifier(client, unknown=['1111c'])
+        self._fund(
+            [verifier], {a: 100
+                         for a in ('1111a', '1111b', '1111c', '1111d')},
+            state)
+        self.assertEqual({
+            '1111a': 100,
+            '1111b': 100,
+            '1111c': 250,
+            '1111d': 100
+        }, client.balances)
+        self.assertEqual(4, len(state.funded))
+
+    def test_unfunded(self):
+        client = FakeClient()
+        verifier = FakeVerifier(client)
+
+        async def lost_propose():
+            client.pending = []
+
+        client.propose = lost_propose
+        with self.assertRaises(FundingError) as cm:
+            self._fund([verifier], {'1111a': 100}, max_rounds=2)
+        self.assertEqual(['1111a'], cm.exception.unfunded)
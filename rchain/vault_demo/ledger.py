@@ -0,0 +1,184 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rchain.crypto import PrivateKey
+
+from .common import Transfer
+
+# Ledger file layout: a header followed by fixed size records of
+# (unix time, sender index, recipient index, amount). Addresses are interned
+# into a sidecar file with one address per line, the line number being the
+# index used in records.
+MAGIC = b'VDLEDG01'
+RECORD = struct.Struct('<dIIq')
+
+
+def _addrs_path(path: str) -> str:
+    return path + '.addrs'
+
+
+class LedgerWriter:
+
+    def __init__(self, path: str, buffer_size: int = 1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._addr_index: Dict[str, int] = {}
+        # A crash may have cut the last record or address short, appending
+        # after it would misalign everything written later.
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            if size < len(MAGIC):
+                os.truncate(path, 0)
+            else:
+                os.truncate(path, size - (size - len(MAGIC)) % RECORD.size)
+        if os.path.exists(_addrs_path(path)):
+            addrs = Path(_addrs_path(path)).read_text()
+            if not addrs.endswith('\n'):
+                addrs = addrs[:addrs.rfind('\n') + 1]
+                os.truncate(_addrs_path(path), len(addrs.encode()))
+            for line in addrs.splitlines():
+                self._addr_index[line] = len(self._addr_index)
+        self._data_file = open(path, 'ab')
+        if self._data_file.tell() == 0:
+            self._data_file.write(MAGIC)
+            self._data_file.flush()
+        # Records written so far, including the ones still buffered.
+        self.count = (self._data_file.tell() - len(MAGIC)) // RECORD.size
+        self._addrs_file = open(_addrs_path(path), 'a')
+        self._buf = bytearray()
+        self._new_addrs: List[str] = []
+
+    def _index(self, addr: str) -> int:
+        idx = self._addr_index.get(addr)
+        if idx is None:
+            idx = self._addr_index[addr] = len(self._addr_index)
+            self._new_addrs.append(addr)
+        return idx
+
+    def append(self, transfer: Transfer, timestamp: Optional[float] = None):
+        self._buf += RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            self._index(transfer.sender), self._index(transfer.recipient),
+            transfer.amount)
+        self.count += 1
+        if len(self._buf) >= self.buffer_size:
+            self.flush()
+
+    def extend(self, transfers: Iterable[Transfer]):
+        timestamp = time.time()
+        for tf in transfers:
+            self.append(tf, timestamp)
+
+    def flush(self):
+        # Addresses must hit the disk before records that refer to them.
+        if self._new_addrs:
+            self._addrs_file.write(''.join(a + '\n' for a in self._new_addrs))
+            self._addrs_file.flush()
+            self._new_addrs.clear()
+        if self._buf:
+            self._data_file.write(self._buf)
+            self._data_file.flush()
+            self._buf.clear()
+
+    # Only syncs what was flushed, so it may run on another thread than the
+    # one appending.
+    def fsync(self):
+        os.fsync(self._addrs_file.fileno())
+        os.fsync(self._data_file.fileno())
+
+    def close(self):
+        self.flush()
+        self._data_file.close()
+        self._addrs_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Drops records past the first `count`, e.g. the ones written after the last
+# checkpoint.
+def truncate(path: str, count: int):
+    os.truncate(path, len(MAGIC) + count * RECORD.size)
+
+
+class LedgerReader:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.addrs = Path(_addrs_path(path)).read_text().splitlines()
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a transfer ledger')
+            size = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A record may have been cut short by a crash while writing.
+        self._count = (size - len(MAGIC)) // RECORD.size
+        self._view = memoryview(self._mmap)[
+            len(MAGIC):len(MAGIC) + self._count * RECORD.size]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def records(
+            self, start: int = 0) -> Iterator[Tuple[float, int, int, int]]:
+        return RECORD.iter_unpack(self._view[start * RECORD.size:])
+
+    def __iter__(self) -> Iterator[Tuple[float, Transfer]]:
+        addrs = self.addrs
+        for (ts, sender, recipient, amount) in self.records():
+            yield ts, Transfer(addrs[sender], addrs[recipient], amount)
+
+    # Records before start are skipped, e.g. ones of earlier runs.
+    def expected_balances(
+            self, initial: Dict[str, int], start: int = 0) -> Dict[str, int]:
+        deltas = [0] * len(self.addrs)
+        for (_, sender, recipient, amount) in self.records(start):
+            deltas[sender] -= amount
+            deltas[recipient] += amount
+        balances = dict(initial)
+        for addr, delta in zip(self.addrs, deltas):
+            balances[addr] = balances.get(addr, 0) + delta
+        return balances
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Recompute expected balances from transfer ledgers')
+    parser.add_argument('config', help='World config with initial balances')
+    parser.add_argument('ledgers', nargs='+')
+    args = parser.parse_args()
+
+    config = json.loads(Path(args.config).read_text())
+    balances = {
+        PrivateKey.from_hex(u['key']).get_public_key().get_address():
+        u['initial_balance']
+        for n in config['nodes'] for u in n['users']
+    }
+    for path in args.ledgers:
+        with LedgerReader(path) as reader:
+            balances = reader.expected_balances(balances)
+    json.dump(balances, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
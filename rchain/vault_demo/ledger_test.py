@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from .common import Transfer
+from .ledger import RECORD, LedgerReader, LedgerWriter, truncate
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'ledger')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        transfers = [
+            Transfer('a', 'b', 10),
+            Transfer('b', 'c', 3),
+            Transfer('c', 'a', 1),
+        ]
+        with LedgerWriter(self.path, buffer_size=RECORD.size) as writer:
+            writer.extend(transfers)
+        with LedgerReader(self.path) as reader:
+            self.assertEqual(3, len(reader))
+            self.assertEqual(transfers, [tf for (_, tf) in reader])
+            balances = reader.expected_balances({'a': 100, 'b': 100, 'd': 5})
+            self.assertEqual({'a': 91, 'b': 107, 'c': 2, 'd': 5}, balances)
+
+    def test_append_to_existing(self):
+        with LedgerWriter(self.path) as writer:
+            writer.append(Transfer('a', 'b', 1))
+        with LedgerWriter(self.path) as writer:
+            writer.append(Transfer('b', 'c', 2))
+        with LedgerReader(self.path) as reader:
+            self.assertEqual(['a', 'b', 'c'], reader.addrs)
+            self.assertEqual([Transfer('a', 'b', 1), Transfer('b', 'c', 2)],
+                             [tf for (_, tf) in reader])
+
+    def test_truncated_record(self):
+        with LedgerWriter(self.path) as writer:
+            writer.extend([Transfer('a', 'b', 1), Transfer('b', 'a', 2)])
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        with LedgerReader(self.path) as reader:
+            self.assertEqual(1, len(reader))
+
+    def test_truncate_and_continue(self):
+        with LedgerWriter(self.path) as writer:
+            writer.extend([Transfer('a', 'b', 1), Transfer('b', 'c', 2)])
+            self.assertEqual(2, writer.count)
+        truncate(self.path, 1)
+        with LedgerWriter(self.path) as writer:
+            self.assertEqual(1, writer.count)
+            writer.append(Transfer('c', 'a', 3))
+        with LedgerReader(self.path) as reader:
+            self.assertEqual([Transfer('a', 'b', 1), Transfer('c', 'a', 3)],
+                             [tf for (_, tf) in reader])
+
+    def test_append_after_partial_write(self):
+        with LedgerWriter(self.path) as writer:
+            writer.extend([Transfer('a', 'b', 1), Transfer('b', 'c', 2)])
+        # A crash in the middle of writing a record and an address.
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        with open(self.path + '.addrs', 'a') as f:
+            f.write('d')
+        with LedgerWriter(self.path) as writer:
+            self.assertEqual(1, writer.count)
+            writer.append(Transfer('c', 'd', 3))
+        with LedgerReader(self.path) as reader:
+            self.assertEqual(['a', 'b', 'c', 'd'], reader.addrs)
+            self.assertEqual([Transfer('a', 'b', 1), Transfer('c', 'd', 3)],
+                             [tf for (_, tf) in reader])
+
+    def test_expected_balances_from_start(self):
+        with LedgerWriter(self.path) as writer:
+            writer.extend([Transfer('a', 'b', 1), Transfer('b', 'c', 2)])
+        with LedgerReader(self.path) as reader:
+            self.assertEqual({
+                'a': 10,
+                'b': 8,
+                'c': 12
+            }, reader.expected_balances({'a': 10, 'b': 10, 'c': 10}, 1))
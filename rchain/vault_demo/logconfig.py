@@ -0,0 +1,165 @@
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from random import Random
+from typing import Dict, Optional
+
+import structlog
+
+# Messages logged for every single transfer. The fast mode keeps only a sample
+# of them unless configured otherwise.
+DEFAULT_SAMPLING = {
+    'Deploying transfer of %d REV to %s': 0.01,
+}
+
+
+class EventSampler:
+
+    def __init__(
+            self,
+            rates: Dict[str, float],
+            limits: Dict[str, float],
+            rng: Optional[Random] = None):
+        self.rates = rates
+        self.limits = limits
+        self.rng = rng or Random()
+        self.dropped: Dict[str, int] = {}
+        # event -> (tokens, last refill)
+        self._buckets: Dict[str, list] = {}
+
+    def _allow(self, event: str) -> bool:
+        rate = self.rates.get(event)
+        if rate is not None and self.rng.random() >= rate:
+            return False
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(event, [limit, now])
+        bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        event = event_dict.get('event')
+        if event in self.rates or event in self.limits:
+            if not self._allow(event):
+                self.dropped[event] = self.dropped.get(event, 0) + 1
+                raise structlog.DropEvent
+        return event_dict
+
+
+_format_positional = structlog.stdlib.PositionalArgumentsFormatter()
+
+
+# Runs on the listener thread, everything expensive about an event happens
+# here.
+def _render_json(logger, method_name: str, event_dict: dict) -> str:
+    event_dict = {
+        k: v
+        for k, v in event_dict.items()
+        if k not in ('_record', '_from_structlog')
+    }
+    event_dict = _format_positional(logger, method_name, event_dict)
+    return json.dumps(event_dict, default=repr)
+
+
+# Hands records to the listener as they are. The stock QueueHandler formats
+# them on the caller's thread first.
+class _DeferredQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_console(level: int = logging.INFO):
+    shared_processors = [
+        structlog.stdlib.add_log_level,
+        structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S"),
+        structlog.stdlib.PositionalArgumentsFormatter(),
+    ]
+
+    structlog.configure(
+        processors=shared_processors + [
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processor=structlog.dev.ConsoleRenderer(),
+        foreign_pre_chain=shared_processors,
+    )
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+    root_logger.setLevel(level)
+
+
+# JSON lines written by a background thread. The event loop only samples the
+# event, stamps it and puts it on a queue.
+def configure_fast(
+        path: Optional[str] = None,
+        sampling: Optional[Dict[str, float]] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        level: int = logging.INFO) -> QueueListener:
+    sampler = EventSampler(
+        DEFAULT_SAMPLING if sampling is None else sampling, rate_limits or {})
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            sampler,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(),
+            # The listener thread doesn't see the exception being handled.
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processor=_render_json,
+        foreign_pre_chain=[
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(),
+        ],
+    )
+    if path:
+        handler = logging.FileHandler(path)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(_DeferredQueueHandler(records))
+    root_logger.setLevel(level)
+    listener = QueueListener(records, handler)
+    listener.start()
+    return listener
+
+
+# Returns the listener to stop at exit in the fast mode.
+def configure_logging(config: dict) -> Optional[QueueListener]:
+    mode = config.get('log_mode', 'console')
+    if mode == 'console':
+        configure_console()
+        return None
+    if mode == 'fast':
+        return configure_fast(
+            config.get('log_file'), config.get('log_sampling'),
+            config.get('log_rate_limits'))
+    raise ValueError(f'Unknown log mode: {mode}')
@@ -0,0 +1,29 @@
+import unittest
+from random import Random
+
+import structlog
+
+from .logconfig import EventSampler
+
+
+class TestEventSampler(unittest.TestCase):
+
+    def emit(self, sampler: EventSampler, event: str) -> bool:
+        try:
+            sampler(None, 'info', {'event': event})
+            return True
+        except structlog.DropEvent:
+            return False
+
+    def test_sampling(self):
+        sampler = EventSampler({'a': 0.1, 'b': 0.0}, {}, Random(0))
+        kept = sum(self.emit(sampler, 'a') for _ in range(10000))
+        self.assertTrue(800 < kept < 1200, kept)
+        self.assertFalse(self.emit(sampler, 'b'))
+        self.assertTrue(self.emit(sampler, 'c'))
+        self.assertEqual({'a': 10000 - kept, 'b': 1}, sampler.dropped)
+
+    def test_rate_limit(self):
+        sampler = EventSampler({}, {'a': 5}, Random(0))
+        kept = sum(self.emit(sampler, 'a') for _ in range(100))
+        self.assertEqual(5, kept)
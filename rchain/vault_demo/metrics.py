@@ -0,0 +1,264 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+from structlog.stdlib import BoundLogger as Logger
+
+# Log-linear bucketing as in HdrHistogram: values below SUB_BUCKET_COUNT get a
+# bucket each, above that every power of two is split into SUB_BUCKET_HALF
+# buckets, which keeps the relative error under 1 / SUB_BUCKET_HALF.
+SUB_BUCKET_BITS = 8
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+
+def _bucket_index(v: int) -> int:
+    if v < SUB_BUCKET_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BUCKET_BITS
+    return (SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (v >> shift) -
+            SUB_BUCKET_HALF)
+
+
+def _bucket_upper_bound(idx: int) -> int:
+    if idx < SUB_BUCKET_COUNT:
+        return idx
+    (shift, top) = divmod(idx - SUB_BUCKET_COUNT, SUB_BUCKET_HALF)
+    shift += 1
+    return ((top + SUB_BUCKET_HALF + 1) << shift) - 1
+
+
+# Latency histogram, values are recorded in seconds and bucketed with
+# microsecond resolution. Buckets are kept in a dict so that histograms of
+# rarely used label combinations stay small.
+class Histogram:
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    SCALE = 1000000
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def record(self, value: float):
+        idx = _bucket_index(max(0, int(value * self.SCALE)))
+        counts = self.counts
+        counts[idx] = counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+
+    def reset(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def copy(self) -> 'Histogram':
+        h = Histogram()
+        h.merge(self)
+        return h
+
+    def merge(self, other: 'Histogram'):
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.min = min(self.min, other.min)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, round(p / 100 * self.count))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self.max, _bucket_upper_bound(idx) / self.SCALE)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Counter:
+
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def merge(self, other: 'Counter'):
+        self.value += other.value
+
+
+class Gauge:
+
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+def _labels_key(labels: Dict[str, str]) -> LabelsKey:
+    return tuple(sorted(labels.items()))
+
+
+def drop_labels(labels: LabelsKey, dropped: Tuple[str, ...]) -> LabelsKey:
+    return tuple((k, v) for k, v in labels if k not in dropped)
+
+
+# Sums up the values of counters or gauges whose labels only differ in the
+# dropped ones.
+def aggregate(
+        items,
+        dropped: Tuple[str, ...]) -> Dict[Tuple[str, LabelsKey], float]:
+    totals: Dict[Tuple[str, LabelsKey], float] = defaultdict(float)
+    for (name, labels), metric in items:
+        totals[(name, drop_labels(labels, dropped))] += metric.value
+    return totals
+
+
+# Hot paths should look their metrics up once and keep the returned objects,
+# recording into them is just a few arithmetic operations.
+class MetricsRegistry:
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, LabelsKey], Histogram] = {}
+        self.counters: Dict[Tuple[str, LabelsKey], Counter] = {}
+        self.gauges: Dict[Tuple[str, LabelsKey], Gauge] = {}
+        self.start_time = time.time()
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, _labels_key(labels))
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = Histogram()
+        return h
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, _labels_key(labels))
+        c = self.counters.get(key)
+        if c is None:
+            c = self.counters[key] = Counter()
+        return c
+
+    def gauge(self, name: str, **labels: str) -> Gauge:
+        key = (name, _labels_key(labels))
+        g = self.gauges.get(key)
+        if g is None:
+            g = self.gauges[key] = Gauge()
+        return g
+
+    def merge(self, other: 'MetricsRegistry'):
+        for (name, labels), h in other.histograms.items():
+            self.histogram(name, **dict(labels)).merge(h)
+        for (name, labels), c in other.counters.items():
+            self.counter(name, **dict(labels)).merge(c)
+
+    def iter_histograms(self, name: Optional[str] = None
+                        ) -> Iterator[Tuple[str, LabelsKey, Histogram]]:
+        for (n, labels), h in self.histograms.items():
+            if name is None or n == name:
+                yield n, labels, h
+
+    def iter_counters(self, name: Optional[str] = None
+                      ) -> Iterator[Tuple[str, LabelsKey, Counter]]:
+        for (n, labels), c in self.counters.items():
+            if name is None or n == name:
+                yield n, labels, c
+
+    def summary(self) -> dict:
+        elapsed = time.time() - self.start_time
+        histograms = []
+        for name, labels, h in self.iter_histograms():
+            s = h.summary()
+            s.update(name=name, labels=dict(labels), rate=h.count / elapsed)
+            histograms.append(s)
+        counters = [{
+            'name': name,
+            'labels': dict(labels),
+            'value': c.value
+        } for name, labels, c in self.iter_counters()]
+        return {
+            'elapsed': elapsed,
+            'histograms': histograms,
+            'counters': counters,
+        }
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _format_labels(labels: LabelsKey) -> str:
+    return ','.join(f'{k}={v}' for k, v in labels)
+
+
+# Per-user series would log a line per user, they are summed up per node
+# like for the exporter.
+def log_summary(
+        logger: Logger,
+        registry: MetricsRegistry = REGISTRY,
+        dropped: Tuple[str, ...] = ('user', )):
+    elapsed = time.time() - registry.start_time
+    histograms: Dict[Tuple[str, LabelsKey], Histogram] = {}
+    for name, labels, h in registry.iter_histograms():
+        key = (name, drop_labels(labels, dropped))
+        if key in histograms:
+            histograms[key].merge(h)
+        else:
+            histograms[key] = h.copy()
+    for (name, labels), h in histograms.items():
+        logger.info(
+            '%s{%s}: %d (%.1f/s) p50 %.3fs p90 %.3fs p99 %.3fs max %.3fs',
+            name, _format_labels(labels), h.count, h.count / elapsed,
+            h.percentile(50), h.percentile(90), h.percentile(99), h.max)
+    for (name, labels), value in aggregate(registry.counters.items(),
+                                           dropped).items():
+        logger.info('%s{%s}: %d', name, _format_labels(labels), value)
+
+
+async def report_periodically(
+        logger: Logger,
+        interval: float,
+        registry: MetricsRegistry = REGISTRY):
+    last_counts: Dict[Tuple[str, LabelsKey], int] = {}
+    while True:
+        await asyncio.sleep(interval)
+        for name, labels, h in list(registry.iter_histograms()):
+            key = (name, labels)
+            delta = h.count - last_counts.get(key, 0)
+            last_counts[key] = h.count
+            logger.info(
+                '%s{%s}: %.1f/s over last %.0fs, total %d, p99 %.3fs', name,
+                _format_labels(labels), delta / interval, interval, h.count,
+                h.percentile(99))
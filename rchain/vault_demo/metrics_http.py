@@ -0,0 +1,126 @@
+import asyncio
+from typing import Callable, Iterable, List, Tuple
+
+from .metrics import REGISTRY, MetricsRegistry, aggregate
+
+PREFIX = 'vault_demo_'
+QUANTILES = (0.5, 0.9, 0.99)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(k,
+                         str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels) + '}'
+
+
+# Runs in an executor thread on copies of the registry tables taken on the
+# event loop, so that large registries don't stall the loop while rendering.
+# Histograms are copied as a whole, their buckets change while recording.
+def render(
+        histograms: list, counters: list, gauges: list,
+        drop_labels: Tuple[str, ...]) -> bytes:
+    lines: List[str] = []
+    seen = set()
+
+    def type_line(name: str, kind: str):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), h in sorted(histograms, key=lambda i: i[0]):
+        metric = f'{PREFIX}{name}_seconds'
+        type_line(metric, 'summary')
+        for q in QUANTILES:
+            lines.append(
+                f'{metric}{_format_labels(labels + (("quantile", str(q)), ))} '
+                f'{h.percentile(q * 100)}')
+        lines.append(f'{metric}_sum{_format_labels(labels)} {h.total}')
+        lines.append(f'{metric}_count{_format_labels(labels)} {h.count}')
+    for (name, labels), value in sorted(
+            aggregate(counters, drop_labels).items()):
+        # The 0.0.4 text format wants the sample name on the TYPE line.
+        metric = f'{PREFIX}{name}_total'
+        type_line(metric, 'counter')
+        lines.append(f'{metric}{_format_labels(labels)} {value:g}')
+    for (name, labels), value in sorted(
+            aggregate(gauges, drop_labels).items()):
+        metric = f'{PREFIX}{name}'
+        type_line(metric, 'gauge')
+        lines.append(f'{metric}{_format_labels(labels)} {value:g}')
+    lines.append('')
+    return '\n'.join(lines).encode()
+
+
+class MetricsExporter:
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 9100,
+            registry: MetricsRegistry = REGISTRY,
+            drop_labels: Tuple[str, ...] = ('user', )):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        # Per-user series would make scrapes as large as the population, they
+        # are summed up per node instead.
+        self.drop_labels = drop_labels
+        self.collectors: List[Callable[[MetricsRegistry], None]] = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def scrape(self) -> bytes:
+        for collect in self.collectors:
+            collect(self.registry)
+        histograms = [
+            (key, h.copy()) for key, h in self.registry.histograms.items()
+        ]
+        return await asyncio.get_running_loop().run_in_executor(
+            None, render, histograms, list(self.registry.counters.items()),
+            list(self.registry.gauges.items()), self.drop_labels)
+
+    async def _handle(
+            self, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and \
+                    parts[1].split('?')[0] == '/metrics':
+                (status, body) = ('200 OK', await self.scrape())
+            else:
+                (status, body) = ('404 Not Found', b'Not found\n')
+            head = (
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: {CONTENT_TYPE}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                'Connection: close\r\n\r\n')
+            writer.write(head.encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import unittest
+from typing import Tuple
+
+from .config_gen import AddressCache, generate_config
+from .metrics import MetricsRegistry
+from .metrics_http import MetricsExporter
+from .stub_node import start_server
+from .world import World
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _scrape(port: int, path: str = '/metrics') -> Tuple[str, str]:
+    (reader, writer) = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    response = (await reader.read()).decode()
+    writer.close()
+    (head, body) = response.split('\r\n\r\n', 1)
+    return head.split('\r\n')[0], body
+
+
+# Stands in for a node under load: records deploys the way PooledRClient and
+# User do while the exporter is being scraped.
+async def _stub_run(registry: MetricsRegistry, deploys: int):
+    latency = registry.histogram('rpc_latency', node='stub', method='deploy')
+    for i in range(deploys):
+        await asyncio.sleep(0)
+        latency.record(0.001 * (i % 10 + 1))
+        registry.counter('deploys', node='stub', user=f'user{i % 3}').inc()
+        if i % 50 == 0:
+            registry.counter(
+                'deploy_errors',
+                node='stub',
+                user=f'user{i % 3}',
+                error='UserDeployTimeoutError').inc()
+
+
+class TestMetricsExporter(unittest.TestCase):
+
+    def test_scrape_during_run(self):
+
+        async def test():
+            registry = MetricsRegistry()
+            registry.gauge('expected_supply').set(300000)
+            async with MetricsExporter(port=0, registry=registry) as exporter:
+                run = asyncio.create_task(_stub_run(registry, 1000))
+                await asyncio.sleep(0)
+                (status, _) = await _scrape(exporter.port)
+                self.assertEqual('HTTP/1.1 200 OK', status)
+                await run
+                (_, body) = await _scrape(exporter.port)
+                (status, _) = await _scrape(exporter.port, '/other')
+                self.assertEqual('HTTP/1.1 404 Not Found', status)
+            return body
+
+        body = asyncio.run(test())
+        lines = body.splitlines()
+        self.assertIn('# TYPE vault_demo_deploys_total counter', lines)
+        self.assertIn('vault_demo_deploys_total{node="stub"} 1000', lines)
+        self.assertIn(
+            'vault_demo_deploy_errors_total'
+            '{error="UserDeployTimeoutError",node="stub"} 20', lines)
+        self.assertIn(
+            'vault_demo_rpc_latency_seconds_count'
+            '{method="deploy",node="stub"} 1000', lines)
+        self.assertIn('vault_demo_expected_supply 300000', lines)
+
+    def test_scrape_world(self):
+
+        # Addresses are derived in forked processes, before any gRPC use.
+        config = generate_config({
+            'seed': 1,
+            'nodes': [''],
+            'users_per_node': 2,
+            'node_defaults': {
+                'deploys_fixed_duration': 0.05,
+                'propose_fixed_duration': 0.05,
+                'propose_min_delay': 0,
+                'propose_max_delay': 0,
+            },
+        }, AddressCache(None))
+        config.update(
+            run_duration=1, metrics_port=_free_port(), monitor_interval=0.1)
+
+        async def test():
+            (server, node) = await start_server('127.0.0.1:0')
+            config['nodes'][0]['address'] = f'127.0.0.1:{node.port}'
+            try:
+                run = asyncio.create_task(World(config).main())
+                bodies = []
+                while not run.done():
+                    await asyncio.sleep(0.1)
+                    try:
+                        (_, body) = await _scrape(config['metrics_port'])
+                    except ConnectionError:
+                        continue
+                    bodies.append(body)
+                report = await run
+            finally:
+                await server.stop(None)
+            return (report, bodies)
+
+        (report, bodies) = asyncio.run(test())
+        self.assertEqual([], report.mismatches)
+        self.assertTrue(
+            any(
+                'vault_demo_deploys_total{node="' in b and
+                'vault_demo_rpc_in_flight{node="' in b for b in bodies))
+        # Observed supply is reported while the run goes on, not only by the
+        # final verification.
+        self.assertGreater(
+            sum('vault_demo_observed_supply 200000' in b for b in bodies), 2)
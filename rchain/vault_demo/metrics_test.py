@@ -0,0 +1,92 @@
+import unittest
+from random import Random
+
+from .metrics import Histogram, MetricsRegistry, log_summary
+
+
+class RecordingLogger:
+
+    def __init__(self):
+        self.lines = []
+
+    def info(self, msg, *args):
+        self.lines.append(msg % args)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram()
+        for i in range(1, 10001):
+            h.record(i / 1000)
+        self.assertEqual(10000, h.count)
+        self.assertEqual(10.0, h.max)
+        self.assertAlmostEqual(5.0, h.percentile(50), delta=5.0 / 128)
+        self.assertAlmostEqual(9.9, h.percentile(99), delta=9.9 / 128)
+        self.assertEqual(10.0, h.percentile(100))
+
+    def test_relative_error(self):
+        rng = Random(1)
+        for _ in range(1000):
+            value = rng.expovariate(10)
+            h = Histogram()
+            h.record(value)
+            h.record(100)
+            self.assertLessEqual(
+                abs(h.percentile(50) - value), value / 128 + 1e-6)
+
+    def test_merge(self):
+        a = Histogram()
+        b = Histogram()
+        for i in range(100):
+            a.record(0.001 * i)
+            b.record(1 + 0.001 * i)
+        a.merge(b)
+        self.assertEqual(200, a.count)
+        self.assertAlmostEqual(1.099, a.max)
+        self.assertLess(a.percentile(50), 1)
+        self.assertGreater(a.percentile(51), 1)
+
+    def test_reset(self):
+        h = Histogram()
+        h.record(5)
+        h.reset()
+        h.record(1)
+        self.assertEqual(1, h.count)
+        self.assertEqual(1, h.max)
+        self.assertEqual(1, h.percentile(99))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_labels(self):
+        registry = MetricsRegistry()
+        registry.counter('errors', node='a', error='X').inc()
+        registry.counter('errors', error='X', node='a').inc()
+        registry.counter('errors', node='b', error='X').inc()
+        self.assertEqual(
+            2,
+            registry.counter('errors', node='a', error='X').value)
+
+    def test_merge(self):
+        a = MetricsRegistry()
+        b = MetricsRegistry()
+        a.histogram('deploy', node='n').record(1)
+        b.histogram('deploy', node='n').record(2)
+        b.counter('errors', node='n').inc(3)
+        a.merge(b)
+        self.assertEqual(2, a.histogram('deploy', node='n').count)
+        self.assertEqual(3, a.counter('errors', node='n').value)
+
+    def test_log_summary_drops_users(self):
+        registry = MetricsRegistry()
+        for i in range(100):
+            registry.counter('deploys', node='n', user=f'u{i}').inc()
+            registry.histogram('latency', node='n', user=f'u{i}').record(i)
+        registry.counter('deploys', node='m', user='u0').inc(2)
+        logger = RecordingLogger()
+        log_summary(logger, registry)
+        self.assertEqual(3, len(logger.lines))
+        self.assertIn('deploys{node=n}: 100', logger.lines)
+        self.assertIn('deploys{node=m}: 2', logger.lines)
+        self.assertTrue(logger.lines[0].startswith('latency{node=n}: 100 '))
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, TextIO
+
+import grpc
+import structlog
+from rchain.client import RClientException
+from rchain.crypto import PrivateKey
+from structlog.stdlib import BoundLogger as Logger
+
+from .broadcast import Broadcaster
+from .channel_pool import ChannelPool, PooledRClient
+from .common import AsyncRClient
+from .metrics import REGISTRY, MetricsRegistry
+from .resolver import DeployResolver
+from .verify import BalanceVerifier
+
+
+@dataclass
+class BalanceChange:
+    rev_addr: str
+    old: Optional[int]
+    new: int
+
+
+class StreamSink:
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+
+    def emit(self, changes: List[BalanceChange]):
+        for c in changes:
+            self.stream.write(f'{c.rev_addr} {c.old} -> {c.new}\n')
+        self.stream.flush()
+
+
+# Appends changes as JSON lines.
+class FileSink:
+
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+
+    def emit(self, changes: List[BalanceChange]):
+        ts = time.time()
+        self.file.write(''.join(
+            json.dumps(dict(asdict(c), ts=ts)) + '\n' for c in changes))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Keeps the observed_supply gauge at the sum of the balances seen so far, for
+# a live comparison with expected_supply during a run.
+class SupplySink:
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.supply = 0
+
+    # The gauge only shows up once balances were seen.
+    def emit(self, changes: List[BalanceChange]):
+        for c in changes:
+            self.supply += c.new - (c.old or 0)
+        self.registry.gauge('observed_supply').set(self.supply)
+
+
+class BroadcasterSink:
+
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+
+    def emit(self, changes: List[BalanceChange]):
+        for c in changes:
+            self.broadcaster.publish_observed_balance(c.rev_addr, c.new)
+
+
+# Periodically looks up balances of many addresses and reports only the ones
+# that changed since the previous lookup. Addresses are split among the
+# nodes, each node gets batched combined queries with bounded concurrency.
+# The monitor doesn't propose unless told to: its queries are read from the
+# blocks the simulation proposes anyway, and a refresh waits for those at
+# most resolve_timeout.
+class BalanceMonitor:
+
+    def __init__(
+            self,
+            clients: List[AsyncRClient],
+            key: PrivateKey,
+            rev_addrs: List[str],
+            sinks: list,
+            logger: Logger,
+            interval: float = 5,
+            batch_size: int = 500,
+            concurrency: int = 8,
+            propose: bool = False,
+            resolve_timeout: float = 60):
+        # When proposing itself, a refresh waits for its results at most one
+        # interval.
+        if propose:
+            resolve_timeout = interval
+        self.resolvers = [
+            DeployResolver(c, concurrency, timeout=resolve_timeout)
+            for c in clients
+        ]
+        self.verifiers = [
+            BalanceVerifier(
+                c, key, 'combined', batch_size, concurrency, r, propose)
+            for c, r in zip(clients, self.resolvers)
+        ]
+        self.rev_addrs = rev_addrs
+        self.sinks = sinks
+        self.logger = logger
+        self.interval = interval
+        self.balances: Dict[str, int] = {}
+
+    async def _fetch(self, verifier: BalanceVerifier,
+                     rev_addrs: List[str]) -> Dict[str, int]:
+        try:
+            return await verifier.fetch_balances(rev_addrs)
+        except (IOError, grpc.RpcError, RClientException) as e:
+            self.logger.warning(
+                'Failed to fetch %d balances: %s', len(rev_addrs), e)
+            return {}
+
+    async def refresh(self) -> List[BalanceChange]:
+        n = len(self.verifiers)
+        results = await asyncio.gather(
+            *(
+                self._fetch(v, self.rev_addrs[i::n])
+                for i, v in enumerate(self.verifiers)))
+        changes = []
+        for balances in results:
+            for addr, balance in balances.items():
+                old = self.balances.get(addr)
+                if old != balance:
+                    changes.append(BalanceChange(addr, old, balance))
+                    self.balances[addr] = balance
+        if changes:
+            for sink in self.sinks:
+                sink.emit(changes)
+        return changes
+
+    async def run(self):
+        for r in self.resolvers:
+            r.start()
+        try:
+            while True:
+                start = time.monotonic()
+                changes = await self.refresh()
+                self.logger.debug(
+                    'Refreshed %d balances, %d changed', len(self.rev_addrs),
+                    len(changes))
+                await asyncio.sleep(
+                    max(0, self.interval - (time.monotonic() - start)))
+        finally:
+            for r in self.resolvers:
+                await r.close()
+
+
+async def _monitor(args: argparse.Namespace, rev_addrs: List[str]):
+    pools = [
+        ChannelPool(a, backend=args.client_backend)
+        for a in args.rpc_addrs.split(',')
+    ]
+    sinks = [StreamSink()]
+    if args.output:
+        sinks.append(FileSink(args.output))
+    monitor = BalanceMonitor(
+        [PooledRClient(p) for p in pools], PrivateKey.generate(), rev_addrs,
+        sinks, structlog.get_logger(), args.interval, args.batch_size,
+        args.concurrency, args.propose, args.resolve_timeout)
+    try:
+        await monitor.run()
+    finally:
+        for p in pools:
+            await p.close()
+        for s in sinks[1:]:
+            s.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print changes of vault balances')
+    parser.add_argument(
+        'rpc_addrs', help='comma separated addresses of nodes to query')
+    parser.add_argument('rev_addrs', nargs='*')
+    parser.add_argument(
+        '--addr-file', help='file with one address to watch per line')
+    parser.add_argument(
+        '--output', help='also append changes as JSON lines to this file')
+    parser.add_argument('--interval', type=float, default=5)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument(
+        '--propose',
+        action='store_true',
+        help='propose blocks with the balance queries instead of waiting for '
+        'other proposes to include them')
+    parser.add_argument(
+        '--resolve-timeout',
+        type=float,
+        default=60,
+        help='how long to wait for query results without --propose')
+    parser.add_argument(
+        '--client-backend', choices=('executor', 'aio'), default='executor')
+    args = parser.parse_args()
+
+    rev_addrs = list(args.rev_addrs)
+    if args.addr_file:
+        with open(args.addr_file) as f:
+            rev_addrs.extend(line.strip() for line in f if line.strip())
+    if not rev_addrs:
+        parser.error('no addresses to watch')
+    try:
+        asyncio.run(_monitor(args, rev_addrs))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
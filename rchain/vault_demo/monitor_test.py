@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+
+import structlog
+from rchain.crypto import PrivateKey
+
+from .channel_pool import ChannelPool, PooledRClient
+from .broadcast import Broadcaster
+from .metrics import MetricsRegistry
+from .monitor import (
+    BalanceChange, BalanceMonitor, BroadcasterSink, SupplySink)
+from .stub_node import start_server
+
+
+class FakeVerifier:
+
+    def __init__(self, balances: dict):
+        self.balances = balances
+        self.queried = []
+
+    async def fetch_balances(self, rev_addrs):
+        self.queried.append(rev_addrs)
+        return {a: self.balances[a] for a in rev_addrs if a in self.balances}
+
+
+class ListSink:
+
+    def __init__(self):
+        self.batches = []
+
+    def emit(self, changes):
+        self.batches.append(changes)
+
+
+class TestBalanceMonitor(unittest.TestCase):
+
+    def test_deltas(self):
+        balances = {'a': 1, 'b': 2, 'c': 3}
+        sink = ListSink()
+        monitor = BalanceMonitor([], None, ['a', 'b', 'c', 'd'], [sink],
+                                 structlog.get_logger())
+        monitor.verifiers = [FakeVerifier(balances), FakeVerifier(balances)]
+
+        changes = asyncio.run(monitor.refresh())
+        self.assertEqual(3, len(changes))
+        self.assertEqual([['a', 'c'], ['b', 'd']],
+                         [v.queried[0] for v in monitor.verifiers])
+
+        self.assertEqual([], asyncio.run(monitor.refresh()))
+        balances['b'] = 5
+        balances['d'] = 0
+        self.assertEqual(
+            [BalanceChange('b', 2, 5), BalanceChange('d', None, 0)],
+            sorted(asyncio.run(monitor.refresh()), key=lambda c: c.rev_addr))
+        self.assertEqual(2, len(sink.batches))
+        self.assertEqual({'a': 1, 'b': 5, 'c': 3, 'd': 0}, monitor.balances)
+
+    def _refresh_on_stub(self, propose: bool):
+
+        async def test():
+            (server, node) = await start_server('127.0.0.1:0')
+            address = f'127.0.0.1:{node.port}'
+            node.ledger.vaults.update({'a': 5, 'b': 7})
+            pool = ChannelPool(address)
+            monitor = BalanceMonitor(
+                [PooledRClient(pool)],
+                PrivateKey.from_hex('1' * 64), ['a', 'b'], [ListSink()],
+                structlog.get_logger(),
+                interval=0.1,
+                propose=propose,
+                resolve_timeout=5)
+            for r in monitor.resolvers:
+                r.start()
+            try:
+                refresh = asyncio.ensure_future(monitor.refresh())
+                await asyncio.sleep(0.3)
+                proposed_by_monitor = node.propose_count
+                if not propose:
+                    self.assertFalse(refresh.done())
+                    # A propose of the simulation includes the queries.
+                    node.propose()
+                changes = await refresh
+            finally:
+                for r in monitor.resolvers:
+                    await r.close()
+                await pool.close()
+                await server.stop(None)
+            return (proposed_by_monitor, changes)
+
+        return asyncio.run(test())
+
+    def test_read_only_refresh(self):
+        (proposes, changes) = self._refresh_on_stub(propose=False)
+        self.assertEqual(0, proposes)
+        self.assertEqual(2, len(changes))
+
+    def test_proposing_refresh(self):
+        (proposes, changes) = self._refresh_on_stub(propose=True)
+        self.assertEqual(1, proposes)
+        self.assertEqual(2, len(changes))
+
+    def test_supply_sink(self):
+        registry = MetricsRegistry()
+        sink = SupplySink(registry)
+        self.assertEqual({}, registry.gauges)
+        sink.emit([BalanceChange('a', None, 5), BalanceChange('b', None, 7)])
+        sink.emit([BalanceChange('a', 5, 2)])
+        self.assertEqual(9, registry.gauge('observed_supply').value)
+
+    def test_broadcaster_sink(self):
+        broadcaster = Broadcaster()
+        broadcaster.publish_balance('a', 10)
+        broadcaster._take_batch()
+        BroadcasterSink(broadcaster).emit([BalanceChange('a', None, 7)])
+        batch = broadcaster._take_batch()
+        # Observed balances don't replace the expected ones.
+        self.assertEqual({}, batch['balances'])
+        self.assertEqual({'a': 7}, batch['observed_balances'])
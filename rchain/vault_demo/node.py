@@ -1,13 +1,24 @@
 import asyncio
+import time
 from dataclasses import dataclass
 from random import Random
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional
 
 import grpc
-from rchain.client import RClient, RClientException
+from rchain.client import RClientException
 from structlog.stdlib import BoundLogger as Logger
 
-from .common import AsyncRClient, Transfer, VaultDemoException
+from .broadcast import Broadcaster
+from .checkpoint import Checkpointer
+from .channel_pool import ChannelPool, PooledRClient
+from .common import Transfer, VaultDemoException
+from .ledger import LedgerWriter
+from .metrics import REGISTRY
+from .openloop import OpenLoopGenerator
+from .presign import Presigner
+from .router import NodeRouter
+from .scheduler import create_scheduler
+from .trace import TraceWriter
 from .user import User
 
 
@@ -24,6 +35,12 @@ class NodeProposeTimeoutError(NodeProposeError):
     pass
 
 
+# The router took the node out of rotation, nothing was proposed. Not counted
+# as a failure, the deploys stay pending until a later propose.
+class NodeUnavailableError(NodeProposeError):
+    pass
+
+
 class Node:
 
     def __init__(self, config: dict, parent_logger: Logger):
@@ -34,37 +51,98 @@ class Node:
             User(user_config, self, self.logger)
             for user_config in self.config['users']
         ]
-        self.channel = grpc.insecure_channel(self.config['address'])
-        self.client = AsyncRClient(RClient(self.channel))
-
-    def close(self):
+        self.channel_pool = ChannelPool(
+            self.config['address'], self.config.get('channel_pool_size', 1),
+            self.config.get('client_backend', 'executor'),
+            self.config.get('channel_pool_policy', 'round_robin'),
+            self.config.get('phlo_price', 1),
+            self.config.get('phlo_limit', 1000000000))
+        self.client = PooledRClient(self.channel_pool)
+        # Set when users' deploys are spread over all nodes.
+        self.router: Optional[NodeRouter] = None
+        self.ledger: Optional[LedgerWriter] = None
+        self.trace: Optional[TraceWriter] = None
+        self.events: Optional[Broadcaster] = None
+        self.checkpointer: Optional[Checkpointer] = None
+        self.scheduler = create_scheduler(self.config, self.rng, self.logger)
+        self.presigner: Optional[Presigner] = None
+        if self.config.get('presign'):
+            self.presigner = Presigner.from_config(self.config)
+
+    def log_channel_stats(self):
+        for i, stats in enumerate(self.client.channel_stats()):
+            self.logger.info(
+                'Channel %d: %d calls, %d errors, %d in flight, '
+                'latency mean %.3fs max %.3fs', i, stats.calls, stats.errors,
+                stats.in_flight, stats.latency_mean, stats.latency_max)
+
+    async def close(self):
+        if self.presigner is not None:
+            self.presigner.close()
         try:
-            self.channel.close()
+            await self.channel_pool.close()
         except Exception:
             self.logger.error('Error while closing gRPC channel', exc_info=True)
 
-    def __enter__(self):
+    async def __aenter__(self):
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # Signs the users' next deploys while the node waits for its propose.
+    def _presign(self, recipients: List[str]):
+        if self.presigner is not None:
+            for u in self.users:
+                u.presign_next_batch(recipients, self.presigner)
+
+    async def try_propose(self) -> Optional[NodeProposeError]:
+        if self.router is not None and \
+                not self.router.available(self.config['address']):
+            self.logger.warning('Node unavailable, skipping propose')
+            return NodeUnavailableError(self)
+        self.logger.info('Proposing')
+        sent_at = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self.client.propose(), self.config['propose_time_limit'])
+        except asyncio.TimeoutError:
+            error = NodeProposeTimeoutError(self)
+        except (IOError, grpc.RpcError, RClientException) as e:
+            error = NodeProposeError(self)
+        else:
+            if self.trace is not None:
+                self.trace.propose(self.config['address'], sent_at)
+            return None
+        REGISTRY.counter(
+            'propose_errors',
+            node=self.config['address'],
+            error=type(error).__name__).inc()
+        return error
+
+    # Finished transfers are returned, or only written to the node's ledger
+    # if it has one.
+    async def generate_transfers(
+            self, recipients: List[str],
+            run_duration: float) -> List[Transfer]:
+        if self.config.get('load_mode', 'closed') == 'open':
+            transfers = await OpenLoopGenerator(self, recipients).run(
+                run_duration)
+            self.log_channel_stats()
+            return transfers
 
-    async def generate_transfers(self, recipients: List[str]):
         evt_loop = asyncio.get_running_loop()
         end_time = evt_loop.time() + run_duration
-        propose_time_left = 0
+        finished_transfers = []
+        pending_deploys = 0
+        pending_since = None
+        self._presign(recipients)
 
         while evt_loop.time() < end_time:
-            deploys_delay = self.rng.randint(
-                self.config['deploys_min_delay'],
-                self.config['deploys_max_delay'])
-            propose_delay = self.rng.randint(
-                self.config['propose_min_delay'],
-                self.config['propose_max_delay'])
-
-            sleep_time = propose_time_left + deploys_delay
-            self.logger.info('Sleeping for %.2f seconds', sleep_time)
-            await asyncio.sleep(sleep_time)
+            sleep_time = self.scheduler.deploys_delay()
+            if sleep_time > 0:
+                self.logger.info('Sleeping for %.2f seconds', sleep_time)
+                await asyncio.sleep(sleep_time)
             deploys_start_time = evt_loop.time()
 
             self.logger.info('Starting user deploys')
@@ -75,32 +153,62 @@ class Node:
             (done, pending) = await asyncio.wait(
                 deploy_tasks, return_when=asyncio.FIRST_EXCEPTION)
             try:
-                finished_transfers = [tf for t in done for tf in t.result()]
-            except e:
+                batch = [tf for t in done for tf in t.result()]
+            except Exception:
                 for t in pending:
                     t.cancel()
-                raise e
+                raise
+            if self.ledger is not None:
+                self.ledger.extend(batch)
+            else:
+                finished_transfers.extend(batch)
+            if self.checkpointer is not None:
+                self.checkpointer.capture(self)
+            if self.events is not None:
+                for tf in batch:
+                    self.events.publish_transfer(tf)
+            pending_deploys += len(batch)
+            if pending_since is None:
+                pending_since = deploys_start_time
+            self._presign(recipients)
 
             deploys_end_time = evt_loop.time()
-            deploys_time_left = (
-                self.config['deploys_fixed_duration'] -
-                (deploys_end_time - deploys_start_time))
-
-            sleep_time = deploys_time_left + propose_delay
-            self.logger.info('Sleeping for %.2f seconds', sleep_time)
-            await asyncio.sleep(sleep_time)
-            propose_start_time = evt_loop.time()
-
-            self.logger.info('Proposing')
-            try:
-                await asyncio.wait_for(
-                    self.client.propose(), self.config['propose_time_limit'])
-            except asyncio.TimeoutError:
-                raise NodeProposeTimeoutError(self) from None
-            except (IOError, grpc.RpcError, RClientException) as e:
-                raise NodeProposeError(self)
-
-            propose_end_time = evt_loop.time()
-            propose_time_left = (
-                self.config['propose_fixed_duration'] -
-                (propose_start_time - propose_end_time))
+            sleep_time = self.scheduler.propose_delay(
+                deploys_end_time - deploys_start_time, pending_deploys,
+                deploys_end_time - pending_since)
+            if sleep_time is None:
+                continue
+            if sleep_time > 0:
+                self.logger.info('Sleeping for %.2f seconds', sleep_time)
+                await asyncio.sleep(sleep_time)
+            if await self._propose_pending(pending_deploys):
+                pending_deploys = 0
+                pending_since = None
+
+        # The scheduler may have held back deploys past the end of the run.
+        if pending_deploys and not await self._propose_pending(
+                pending_deploys):
+            self.logger.warning(
+                '%d deploys left unproposed at the end of the run',
+                pending_deploys)
+        self.log_channel_stats()
+        return finished_transfers
+
+    # Returns whether the pending deploys made it into a block.
+    async def _propose_pending(self, pending_deploys: int) -> bool:
+        evt_loop = asyncio.get_running_loop()
+        propose_start_time = evt_loop.time()
+        error = await self.try_propose()
+        if isinstance(error, NodeUnavailableError):
+            return False
+        propose_end_time = evt_loop.time()
+        if not self.scheduler.record_propose(
+                propose_end_time - propose_start_time, pending_deploys, error):
+            raise error
+        if error is not None:
+            return False
+        if self.events is not None:
+            self.events.publish_propose(
+                self.config['address'], pending_deploys,
+                propose_end_time - propose_start_time)
+        return True
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+import structlog
+
+from .node import Node, NodeUnavailableError
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.deploys = 0
+        self.proposes = 0
+
+    async def deploy(self, key, contract, ts=None):
+        self.deploys += 1
+
+    async def propose(self):
+        self.proposes += 1
+
+    def channel_stats(self):
+        return []
+
+
+class UnavailableRouter:
+
+    def available(self, address: str) -> bool:
+        return False
+
+
+class ListEvents:
+
+    def __init__(self):
+        self.proposes = []
+
+    def publish_propose(self, node: str, deploys: int, latency: float):
+        self.proposes.append(deploys)
+
+
+def _node_config(**config) -> dict:
+    return dict({
+        'address': 'node-test',
+        'rng_seed': 1,
+        'propose_time_limit': 5,
+        'users': [{
+            'key': f'{i + 1:064x}',
+            'rev_addr': f'user{i}',
+            'rng_seed': i,
+            'initial_balance': 100000,
+            'transfer_min_amount': 1,
+            'transfer_max_amount': 10,
+            'deploy_batch_min_size': 1,
+            'deploy_batch_max_size': 1,
+            'deploy_time_limit': 5,
+        } for i in range(2)],
+    }, **config)
+
+
+class TestNode(unittest.TestCase):
+
+    def test_adaptive_proposes_at_end(self):
+        # The thresholds are never reached within the run, the pending
+        # deploys are still proposed before it ends.
+        config = _node_config(
+            propose_policy='adaptive',
+            propose_target_pending=1000,
+            propose_max_pending_age=1000,
+            deploys_min_interval=0.01)
+
+        async def test():
+            async with Node(config, structlog.get_logger()) as node:
+                node.client = FakeClient()
+                transfers = await node.generate_transfers(['user0'], 0.1)
+            return (node.client, transfers)
+
+        (client, transfers) = asyncio.run(test())
+        self.assertGreater(client.deploys, 2)
+        self.assertEqual(client.deploys, len(transfers))
+        self.assertEqual(1, client.proposes)
+
+    def test_unavailable_node_keeps_pending(self):
+        config = _node_config(
+            deploys_min_delay=0,
+            deploys_max_delay=0,
+            propose_min_delay=0,
+            propose_max_delay=0,
+            deploys_fixed_duration=0,
+            propose_fixed_duration=1)
+
+        async def test():
+            async with Node(config, structlog.get_logger()) as node:
+                node.client = FakeClient()
+                node.router = UnavailableRouter()
+                node.events = ListEvents()
+                self.assertIsInstance(
+                    await node.try_propose(), NodeUnavailableError)
+                self.assertFalse(await node._propose_pending(3))
+            return node
+
+        node = asyncio.run(test())
+        self.assertEqual(0, node.client.proposes)
+        self.assertEqual([], node.events.proposes)
+        # Nothing was recorded as a propose.
+        self.assertEqual(0.0, node.scheduler.propose_time_left)
@@ -0,0 +1,134 @@
+import asyncio
+from collections import Counter
+from typing import TYPE_CHECKING, List
+
+from .common import Transfer
+from .metrics import REGISTRY
+from .user import User, UserDeployError
+
+if TYPE_CHECKING:
+    from .node import Node
+
+
+# Issues transfers of a node's users at a fixed arrival rate, regardless of
+# how fast the node completes them. Every arrival has an intended send time
+# taken from the arrival schedule, and latency is measured from that time, so
+# delays caused by the generator falling behind count against the node
+# instead of silently lowering the offered load. Arrivals that find
+# open_loop_max_inflight deploys outstanding are dropped and counted. A node
+# without users or with a rate of 0 stays idle.
+class OpenLoopGenerator:
+
+    def __init__(self, node: 'Node', recipients: List[str]):
+        config = node.config
+        self.node = node
+        self.recipients = recipients
+        self.rate = config['open_loop_rate']
+        if self.rate < 0:
+            raise ValueError(f'Negative open loop rate: {self.rate}')
+        self.arrival = config.get('open_loop_arrival', 'poisson')
+        if self.arrival not in ('poisson', 'constant'):
+            raise ValueError(f'Unknown arrival process: {self.arrival}')
+        self.max_inflight = config.get('open_loop_max_inflight', 1000)
+        self.propose_interval = config.get(
+            'open_loop_propose_interval', config['propose_fixed_duration'])
+        self.latencies = REGISTRY.histogram(
+            'open_loop_latency', node=config['address'])
+        self.errors = Counter()
+        self.sent = 0
+        self.dropped = 0
+        self.inflight = 0
+        self.completed = 0
+        self.pending_deploys = 0
+        self.finished_transfers: List[Transfer] = []
+
+    def _interarrival(self) -> float:
+        if self.arrival == 'poisson':
+            return self.node.rng.expovariate(self.rate)
+        return 1 / self.rate
+
+    async def _send(self, user: User, intended_time: float):
+        try:
+            transfer = await user.deploy_random_transfer(self.recipients)
+        except UserDeployError as e:
+            self.errors[type(e).__name__] += 1
+        else:
+            self.latencies.record(
+                asyncio.get_running_loop().time() - intended_time)
+            self.completed += 1
+            if self.node.ledger is not None:
+                self.node.ledger.append(transfer)
+            else:
+                self.finished_transfers.append(transfer)
+            if self.node.events is not None:
+                self.node.events.publish_transfer(transfer)
+            self.pending_deploys += 1
+        finally:
+            self.inflight -= 1
+
+    async def _propose(self):
+        proposed = self.pending_deploys
+        self.pending_deploys = 0
+        start_time = asyncio.get_running_loop().time()
+        error = await self.node.try_propose()
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+            self.pending_deploys += proposed
+        elif self.node.events is not None:
+            self.node.events.publish_propose(
+                self.node.config['address'], proposed,
+                asyncio.get_running_loop().time() - start_time)
+
+    async def _propose_loop(self):
+        while True:
+            await asyncio.sleep(self.propose_interval)
+            if self.pending_deploys:
+                await self._propose()
+
+    async def run(self, run_duration: float) -> List[Transfer]:
+        users = self.node.users
+        if not users or not self.rate:
+            self.node.logger.info('Open loop: no users or rate 0, idle')
+            return self.finished_transfers
+        evt_loop = asyncio.get_running_loop()
+        start_time = evt_loop.time()
+        end_time = start_time + run_duration
+        rng = self.node.rng
+        tasks = set()
+        proposer = asyncio.create_task(self._propose_loop())
+        try:
+            intended_time = start_time
+            while intended_time < end_time:
+                delay = intended_time - evt_loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.inflight >= self.max_inflight:
+                    self.dropped += 1
+                else:
+                    self.sent += 1
+                    self.inflight += 1
+                    t = asyncio.create_task(
+                        self._send(rng.choice(users), intended_time))
+                    tasks.add(t)
+                    t.add_done_callback(tasks.discard)
+                intended_time += self._interarrival()
+            await asyncio.gather(*tasks)
+        finally:
+            proposer.cancel()
+            for t in tasks:
+                t.cancel()
+        if self.pending_deploys:
+            await self._propose()
+        self.log_summary(evt_loop.time() - start_time)
+        return self.finished_transfers
+
+    def log_summary(self, elapsed: float):
+        self.node.logger.info(
+            'Open loop: offered %.1f/s, sent %d, completed %d (%.1f/s), '
+            'dropped %d, errors %s', self.rate, self.sent, self.completed,
+            self.completed / elapsed, self.dropped, dict(self.errors))
+        self.node.logger.info(
+            'Open loop deploy latency: p50 %.3fs p90 %.3fs p99 %.3fs '
+            'max %.3fs', self.latencies.percentile(50),
+            self.latencies.percentile(90), self.latencies.percentile(99),
+            self.latencies.max)
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from random import Random
+
+import structlog
+
+from .openloop import OpenLoopGenerator
+from .user import User
+from .world import World
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.deploys = 0
+
+    async def deploy(self, key, contract, ts=None):
+        self.deploys += 1
+
+
+class FakeNode:
+
+    def __init__(self, user_count: int, rate: float):
+        self.config = {
+            'address': 'openloop-test',
+            'open_loop_rate': rate,
+            'open_loop_arrival': 'constant',
+            'propose_fixed_duration': 0.05,
+        }
+        self.rng = Random(1)
+        self.logger = structlog.get_logger()
+        self.client = FakeClient()
+        self.router = None
+        self.trace = None
+        self.ledger = None
+        self.events = None
+        self.proposes = 0
+        self.users = [
+            User({
+                'key': f'{i + 1:064x}',
+                'rev_addr': f'user{i}',
+                'rng_seed': i,
+                'initial_balance': 100000,
+                'transfer_min_amount': 1,
+                'transfer_max_amount': 10,
+                'deploy_time_limit': 5,
+            }, self, self.logger) for i in range(user_count)
+        ]
+
+    async def try_propose(self):
+        self.proposes += 1
+
+
+class TestOpenLoop(unittest.TestCase):
+
+    def test_constant_rate(self):
+        # Arrivals are exactly 1/64s apart.
+        node = FakeNode(3, 64)
+        generator = OpenLoopGenerator(node, ['user0', 'user1'])
+        transfers = asyncio.run(generator.run(0.25))
+        self.assertEqual(16, generator.sent)
+        self.assertEqual(16, len(transfers))
+        self.assertEqual(16, node.client.deploys)
+        self.assertGreaterEqual(node.proposes, 1)
+        self.assertEqual(16, generator.latencies.count)
+
+    def test_idle_nodes(self):
+        for node in (FakeNode(0, 10), FakeNode(3, 0)):
+            generator = OpenLoopGenerator(node, ['user0'])
+            self.assertEqual([], asyncio.run(generator.run(0.1)))
+            self.assertEqual(0, generator.sent)
+            self.assertEqual(0, node.proposes)
+
+    def test_negative_rate(self):
+        with self.assertRaises(ValueError):
+            OpenLoopGenerator(FakeNode(1, -1), ['user0'])
+
+    def test_world_rate(self):
+        with self.assertRaises(ValueError):
+            World({'rng_seed': 1, 'admin_key': '1' * 64, 'open_loop_rate': 0})
+        world = World({'rng_seed': 1, 'admin_key': '1' * 64,
+                       'open_loop_rate': 30})
+        nodes = [FakeNode(1, None), FakeNode(0, None), FakeNode(2, None)]
+        world._split_open_loop_rate(nodes, 3)
+        self.assertEqual([10, 0, 20],
+                         [n.config['open_loop_rate'] for n in nodes])
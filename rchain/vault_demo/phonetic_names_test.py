@@ -1,6 +1,6 @@
 import unittest
 
-from .ordnames import PhoneticNames
+from .phonetic_names import PhoneticNames
 
 class TestPhoneticNames(unittest.TestCase):
 
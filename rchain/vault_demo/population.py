@@ -0,0 +1,33 @@
+from array import array
+from typing import Iterable, List
+
+
+# Struct-of-arrays view of a user population: one list of addresses plus
+# flat integer arrays, instead of one object per user. Cheap to build for
+# hundreds of thousands of users and compact to pickle between processes.
+class UserPopulation:
+
+    __slots__ = ('rev_addrs', 'index', 'balances', 'deploy_counters')
+
+    def __init__(
+            self, rev_addrs: List[str], balances: Iterable[int],
+            deploy_counters: Iterable[int]):
+        self.rev_addrs = rev_addrs
+        self.index = {a: i for i, a in enumerate(rev_addrs)}
+        self.balances = array('q', balances)
+        self.deploy_counters = array('Q', deploy_counters)
+
+    @classmethod
+    def from_users(cls, users: List['User']) -> 'UserPopulation':
+        return cls([u.rev_addr for u in users], (u.balance for u in users),
+                   (u.deploy_counter for u in users))
+
+    def __len__(self) -> int:
+        return len(self.rev_addrs)
+
+    def update_users(self, users: Iterable['User']):
+        for u in users:
+            i = self.index.get(u.rev_addr)
+            if i is not None:
+                u.balance = self.balances[i]
+                u.deploy_counter = self.deploy_counters[i]
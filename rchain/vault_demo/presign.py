@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from rchain.crypto import PrivateKey
+from rchain.pb.CasperMessage_pb2 import DeployData
+from rchain.util import create_deploy_data
+
+from .common import Transfer
+from .contracts import TRANSFER
+
+
+# Runs in a worker. Deploys travel as serialized protobufs, so that the same
+# function works for thread and process pools.
+def _sign_transfers(
+        key_hex: str, transfers: List[Tuple[Transfer, int]], phlo_price: int,
+        phlo_limit: int) -> List[bytes]:
+    key = PrivateKey.from_hex(key_hex)
+    return [
+        create_deploy_data(
+            key,
+            TRANSFER.render(tf.sender, tf.recipient, tf.amount),
+            phlo_price,
+            phlo_limit,
+            timestamp_millis=ts).SerializeToString() for tf, ts in transfers
+    ]
+
+
+# Transfers a user is expected to deploy next, keyed by timestamp, with their
+# deploys being signed in the background.
+class PresignedTransfers:
+
+    def __init__(
+            self, transfers: List[Tuple[Transfer, int]],
+            signed: asyncio.Future):
+        self.index: Dict[int, Tuple[int, Transfer]] = {
+            ts: (i, tf)
+            for i, (tf, ts) in enumerate(transfers)
+        }
+        self.signed = signed
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # Returns the signed deploy if the transfer actually drawn is the one that
+    # was predicted. It isn't when a refund or a failed deploy changed the
+    # balance the amount was clamped to; the caller signs it then.
+    async def take(self, transfer: Transfer,
+                   ts: int) -> Optional[DeployData]:
+        entry = self.index.pop(ts, None)
+        if entry is None or entry[1] != transfer:
+            return None
+        try:
+            signed = await self.signed
+        except Exception:
+            return None
+        return DeployData.FromString(signed[entry[0]])
+
+    def cancel(self):
+        self.signed.cancel()
+
+
+class Presigner:
+
+    def __init__(
+            self,
+            executor: Executor,
+            phlo_price: int = 1,
+            phlo_limit: int = 1000000000):
+        self.executor = executor
+        self.phlo_price = phlo_price
+        self.phlo_limit = phlo_limit
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'Presigner':
+        workers = config.get('presign_workers', 0)
+        if workers:
+            # Workers start while the node's gRPC channels are in use, which
+            # rules out forking.
+            executor: Executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        else:
+            # Signing holds the GIL, a thread only helps by running while the
+            # event loop sleeps.
+            executor = ThreadPoolExecutor(max_workers=1)
+        return cls(
+            executor, config.get('phlo_price', 1),
+            config.get('phlo_limit', 1000000000))
+
+    def sign(
+            self, key_hex: str,
+            transfers: List[Tuple[Transfer, int]]) -> PresignedTransfers:
+        signed = asyncio.get_running_loop().run_in_executor(
+            self.executor, _sign_transfers, key_hex, transfers,
+            self.phlo_price, self.phlo_limit)
+        return PresignedTransfers(transfers, signed)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
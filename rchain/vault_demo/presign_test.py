@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+import structlog
+
+from .common import Transfer
+from .presign import PresignedTransfers, Presigner
+from .user import User
+
+USER_CONFIG = {
+    'key': '1' * 64,
+    'rev_addr': '1111sender',
+    'rng_seed': 7,
+    'initial_balance': 1000,
+    'transfer_min_amount': 100,
+    'transfer_max_amount': 300,
+    'deploy_batch_min_size': 3,
+    'deploy_batch_max_size': 8,
+}
+
+
+class RecordingPresigner:
+
+    def __init__(self):
+        self.transfers = None
+
+    def sign(self, key_hex, transfers):
+        self.transfers = transfers
+        return PresignedTransfers(transfers, asyncio.Future())
+
+
+class TestPresign(unittest.TestCase):
+
+    def test_prediction_matches_draws(self):
+
+        async def test():
+            user = User(dict(USER_CONFIG), None, structlog.get_logger())
+            presigner = RecordingPresigner()
+            recipients = ['a', 'b', 'c']
+            for _ in range(3):
+                user.presign_next_batch(recipients, presigner)
+                batch_size = user._draw_batch_size(user.rng)
+                drawn = [user._next_transfer(recipients)
+                         for _ in range(batch_size)]
+                self.assertEqual(drawn, presigner.transfers)
+                # Balance is clamped to zero eventually.
+                self.assertTrue(all(tf.amount >= 0 for tf, _ in drawn))
+
+        asyncio.run(test())
+
+    def test_mismatch_is_not_taken(self):
+
+        async def test():
+            signed = asyncio.get_running_loop().create_future()
+            presigned = PresignedTransfers([(Transfer('s', 'a', 10), 1),
+                                            (Transfer('s', 'b', 20), 2)],
+                                           signed)
+            self.assertIsNone(await presigned.take(Transfer('s', 'a', 5), 1))
+            self.assertIsNone(await presigned.take(Transfer('s', 'c', 5), 3))
+            self.assertEqual(1, len(presigned))
+
+        asyncio.run(test())
+
+    def test_sign_in_workers(self):
+        transfers = [(Transfer('s', 'a', 10), 1), (Transfer('s', 'b', 20), 2)]
+
+        async def test():
+            presigner = Presigner.from_config({'presign_workers': 1})
+            try:
+                presigned = presigner.sign('1' * 64, transfers)
+                return [
+                    await presigned.take(tf, ts) for (tf, ts) in transfers
+                ]
+            finally:
+                presigner.close()
+
+        signed = asyncio.run(test())
+        self.assertEqual([1, 2], [d.timestamp for d in signed])
+        self.assertTrue(all(d.sig for d in signed))
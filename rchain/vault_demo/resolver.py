@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass
+from random import Random
+from typing import List, Optional, Tuple
+
+import grpc
+from rchain.client import RClientException
+
+from .common import AsyncRClient, VaultDemoException
+
+
+@dataclass
+class DeployResolveTimeoutError(VaultDemoException):
+    deploy_id: bytes
+
+
+class _Pending:
+
+    __slots__ = ('deploy_id', 'future', 'deadline', 'backoff')
+
+    def __init__(
+            self, deploy_id: bytes, future: asyncio.Future, deadline: float,
+            backoff: float):
+        self.deploy_id = deploy_id
+        self.future = future
+        self.deadline = deadline
+        self.backoff = backoff
+
+
+# Turns deploy ids into futures of their data. A single poller task looks up
+# every outstanding deploy id that is due, with bounded concurrency, and
+# reschedules the ones whose block isn't available yet with exponential
+# backoff and jitter. The node API has no multi-deploy lookup, so the cost per
+# tick is bounded by how many lookups are due rather than how many are
+# pending.
+class DeployResolver:
+
+    def __init__(
+            self,
+            client: AsyncRClient,
+            concurrency: int = 32,
+            min_backoff: float = 0.2,
+            max_backoff: float = 5.0,
+            jitter: float = 0.5,
+            timeout: float = 60.0,
+            rng: Optional[Random] = None):
+        self.client = client
+        self.concurrency = concurrency
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.rng = rng or Random()
+        self.lookups = 0
+        self.errors = 0
+        self._queue: List[Tuple[float, int, _Pending]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _schedule(self, pending: _Pending, delay: float):
+        at = min(
+            asyncio.get_running_loop().time() + delay, pending.deadline)
+        heapq.heappush(self._queue, (at, next(self._seq), pending))
+
+    def resolve(
+            self,
+            deploy_id: bytes,
+            timeout: Optional[float] = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = _Pending(
+            deploy_id, future,
+            loop.time() + (self.timeout if timeout is None else timeout),
+            self.min_backoff)
+        # Results are usually available right after a propose, so the first
+        # lookup isn't delayed.
+        self._schedule(pending, 0)
+        self._wakeup.set()
+        return future
+
+    def _retry(self, pending: _Pending):
+        if asyncio.get_running_loop().time() >= pending.deadline:
+            pending.future.set_exception(
+                DeployResolveTimeoutError(pending.deploy_id))
+            return
+        delay = pending.backoff * (1 - self.jitter * self.rng.random())
+        pending.backoff = min(pending.backoff * 2, self.max_backoff)
+        self._schedule(pending, delay)
+
+    async def _lookup(self, pending: _Pending, sem: asyncio.Semaphore):
+        async with sem:
+            if pending.future.done():
+                return
+            self.lookups += 1
+            try:
+                data = await self.client.get_data_at_deploy_id(
+                    pending.deploy_id)
+            except (IOError, grpc.RpcError, RClientException):
+                self.errors += 1
+                data = None
+            except Exception as e:
+                # Fails this lookup only, the poller has to keep enforcing
+                # the deadlines of the others.
+                self.errors += 1
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+                return
+        if pending.future.done():
+            return
+        if data is not None and data.blockResults:
+            pending.future.set_result(data)
+        else:
+            self._retry(pending)
+
+    def _take_due(self) -> List[_Pending]:
+        now = asyncio.get_running_loop().time()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            (_, _, pending) = heapq.heappop(self._queue)
+            if not pending.future.done():
+                due.append(pending)
+        return due
+
+    async def run(self):
+        sem = asyncio.Semaphore(self.concurrency)
+        while True:
+            due = self._take_due()
+            if due:
+                await asyncio.gather(*(self._lookup(p, sem) for p in due))
+                continue
+            self._wakeup.clear()
+            delay = None
+            if self._queue:
+                delay = self._queue[0][0] - asyncio.get_running_loop().time()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for (_, _, pending) in self._queue:
+            pending.future.cancel()
+        self._queue = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from random import Random
+
+import grpc
+
+from .resolver import DeployResolver, DeployResolveTimeoutError
+
+
+class Data:
+
+    def __init__(self, block_results: list):
+        self.blockResults = block_results
+
+
+# Deploy i becomes available on the i-th lookup of it.
+class FakeClient:
+
+    def __init__(self, fail_first: bool = False):
+        self.lookups = {}
+        self.fail_first = fail_first
+
+    async def get_data_at_deploy_id(self, deploy_id):
+        n = self.lookups.get(deploy_id, 0) + 1
+        self.lookups[deploy_id] = n
+        if self.fail_first and n == 1:
+            raise grpc.RpcError()
+        return Data(['block'] if n >= deploy_id else [])
+
+
+# Lookups of deploy 0 fail with an unexpected error.
+class BrokenClient(FakeClient):
+
+    async def get_data_at_deploy_id(self, deploy_id):
+        if deploy_id == 0:
+            raise ValueError('Malformed response')
+        return await super().get_data_at_deploy_id(deploy_id)
+
+
+class TestDeployResolver(unittest.TestCase):
+
+    def resolver(self, client, **kwargs) -> DeployResolver:
+        return DeployResolver(
+            client, min_backoff=0.001, max_backoff=0.004, rng=Random(0),
+            **kwargs)
+
+    def test_resolve_with_retries(self):
+        client = FakeClient()
+
+        async def test():
+            async with self.resolver(client) as resolver:
+                results = await asyncio.gather(
+                    *(resolver.resolve(i) for i in range(1, 6)))
+                self.assertEqual(0, len(resolver))
+            return results
+
+        results = asyncio.run(test())
+        self.assertEqual([['block']] * 5, [r.blockResults for r in results])
+        self.assertEqual({i: i for i in range(1, 6)}, client.lookups)
+
+    def test_errors_are_retried(self):
+        client = FakeClient(fail_first=True)
+
+        async def test():
+            async with self.resolver(client) as resolver:
+                await resolver.resolve(1)
+                self.assertEqual(1, resolver.errors)
+
+        asyncio.run(test())
+        self.assertEqual({1: 2}, client.lookups)
+
+    def test_deadline(self):
+
+        async def test():
+            async with self.resolver(FakeClient()) as resolver:
+                with self.assertRaises(DeployResolveTimeoutError):
+                    await resolver.resolve(1000, timeout=0.02)
+
+        asyncio.run(test())
+
+    def test_close_cancels_pending(self):
+
+        async def test():
+            resolver = self.resolver(FakeClient(), timeout=10)
+            resolver.start()
+            future = resolver.resolve(1000)
+            await asyncio.sleep(0.01)
+            await resolver.close()
+            self.assertTrue(future.cancelled())
+
+        asyncio.run(test())
+
+    def test_unexpected_error(self):
+
+        async def test():
+            async with self.resolver(BrokenClient()) as resolver:
+                broken = resolver.resolve(0)
+                with self.assertRaises(ValueError):
+                    await broken
+                # The poller is still there for the other lookups.
+                data = await resolver.resolve(2)
+                self.assertEqual(['block'], data.blockResults)
+                with self.assertRaises(DeployResolveTimeoutError):
+                    await resolver.resolve(1000, timeout=0.02)
+
+        # Without the poller the lookups would hang.
+        asyncio.run(asyncio.wait_for(test(), 5))
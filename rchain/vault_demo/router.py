@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import grpc
+from rchain.client import RClientException
+from rchain.crypto import PrivateKey
+from structlog.stdlib import BoundLogger as Logger
+
+from .common import AsyncRClient
+from .metrics import REGISTRY, MetricsRegistry
+
+POLICIES = ('sticky', 'least_latency', 'round_robin')
+
+
+class NoHealthyNodeError(ConnectionError):
+    pass
+
+
+# Stops sending calls to a node after enough consecutive failures. Once the
+# reset timeout passes, a single trial call is let through; its outcome
+# either closes the circuit again or restarts the timeout.
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def available(self, now: float) -> bool:
+        if self.opened_at is None:
+            return True
+        return not self.trial_in_flight and \
+            now - self.opened_at >= self.reset_timeout
+
+    def begin(self):
+        if self.opened_at is not None:
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or \
+                self.failures >= self.failure_threshold:
+            self.opened_at = now
+
+
+class RoutedNode:
+
+    def __init__(
+            self, address: str, client: AsyncRClient, breaker: CircuitBreaker):
+        self.address = address
+        self.client = client
+        self.breaker = breaker
+        self.latency: Optional[float] = None
+        self.pending_deploys = 0
+
+
+# AsyncRClient interface over several nodes. Deploys and queries go to any
+# node whose circuit is closed, chosen by policy, and fail over to the next
+# one on RpcError. A deploy is only included in a block proposed by the node
+# that received it, so propose() proposes on every node that got deploys, and
+# data at a deploy id is looked up on that node first.
+class NodeRouter:
+
+    def __init__(
+            self,
+            clients: Dict[str, AsyncRClient],
+            policy: str = 'round_robin',
+            failure_threshold: int = 5,
+            reset_timeout: float = 30,
+            latency_decay: float = 0.2,
+            metrics: MetricsRegistry = REGISTRY,
+            max_tracked_deploys: int = 100000):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown routing policy: {policy}')
+        self.policy = policy
+        self.nodes = [
+            RoutedNode(a, c, CircuitBreaker(failure_threshold, reset_timeout))
+            for a, c in clients.items()
+        ]
+        self.latency_decay = latency_decay
+        self.metrics = metrics
+        self._next = itertools.cycle(range(len(self.nodes)))
+        self.max_tracked_deploys = max_tracked_deploys
+        self._deploy_nodes: Dict[bytes, RoutedNode] = OrderedDict()
+
+    def available(self, address: str) -> bool:
+        return any(
+            n.breaker.available(time.monotonic())
+            for n in self.nodes if n.address == address)
+
+    # Nodes in the order they should be tried.
+    def _candidates(
+            self,
+            key: Optional[PrivateKey],
+            first: Optional[RoutedNode] = None) -> List[RoutedNode]:
+        now = time.monotonic()
+        nodes = [n for n in self.nodes if n.breaker.available(now)]
+        if not nodes:
+            raise NoHealthyNodeError(
+                f'All {len(self.nodes)} nodes have open circuits')
+        if first in nodes:
+            return [first] + [n for n in nodes if n is not first]
+        if self.policy == 'least_latency':
+            # Nodes without a measurement yet are tried first.
+            return sorted(
+                nodes, key=lambda n: -1 if n.latency is None else n.latency)
+        if self.policy == 'sticky' and key is not None:
+            start = zlib.crc32(key.to_hex().encode()) % len(nodes)
+        else:
+            start = next(self._next) % len(nodes)
+        return nodes[start:] + nodes[:start]
+
+    def _record(self, node: RoutedNode, latency: float):
+        if node.latency is None:
+            node.latency = latency
+        else:
+            node.latency += self.latency_decay * (latency - node.latency)
+
+    def _track_deploy(self, deploy_id: bytes, node: RoutedNode):
+        self._deploy_nodes[deploy_id] = node
+        if len(self._deploy_nodes) > self.max_tracked_deploys:
+            self._deploy_nodes.popitem(last=False)
+
+    async def _call(
+            self,
+            method: str,
+            key: Optional[PrivateKey],
+            *args,
+            first: Optional[RoutedNode] = None,
+            **kwargs):
+        error = None
+        for node in self._candidates(key, first):
+            node.breaker.begin()
+            start_time = time.monotonic()
+            try:
+                result = await getattr(node.client, method)(*args, **kwargs)
+            except (IOError, grpc.RpcError) as e:
+                was_open = node.breaker.open
+                node.breaker.record_failure(time.monotonic())
+                if node.breaker.open and not was_open:
+                    self.metrics.counter(
+                        'router_circuit_open', node=node.address).inc()
+                error = e
+                continue
+            except BaseException:
+                node.breaker.trial_in_flight = False
+                raise
+            node.breaker.record_success()
+            self._record(node, time.monotonic() - start_time)
+            self.metrics.counter(
+                'routed_calls', node=node.address, method=method).inc()
+            if method in ('deploy', 'deploy_signed'):
+                node.pending_deploys += 1
+                self._track_deploy(result, node)
+            return result
+        raise error
+
+    async def deploy(self, key: PrivateKey, contract: str, ts=None):
+        return await self._call('deploy', key, key, contract, ts=ts)
+
+    async def deploy_signed(self, deploy_data):
+        return await self._call('deploy_signed', None, deploy_data)
+
+    # Fails only if no node managed to propose, deploys of the ones that
+    # failed stay pending for the next attempt.
+    async def propose(self):
+        nodes = [n for n in self.nodes if n.pending_deploys]
+        results = await asyncio.gather(
+            *(n.client.propose() for n in nodes), return_exceptions=True)
+        errors = []
+        for node, result in zip(nodes, results):
+            if isinstance(result, (IOError, grpc.RpcError, RClientException)):
+                node.breaker.record_failure(time.monotonic())
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                node.pending_deploys = 0
+        if errors and len(errors) == len(nodes):
+            raise errors[0]
+
+    async def get_data_at_deploy_id(self, deploy_id: bytes):
+        return await self._call(
+            'get_data_at_deploy_id',
+            None,
+            deploy_id,
+            first=self._deploy_nodes.get(deploy_id))
+
+    def shares(self) -> Dict[str, float]:
+        counts = {
+            n.address: sum(
+                self.metrics.counter(
+                    'routed_calls', node=n.address, method=m).value
+                for m in ('deploy', 'deploy_signed'))
+            for n in self.nodes
+        }
+        total = sum(counts.values())
+        return {a: c / total if total else 0.0 for a, c in counts.items()}
+
+    def log_shares(self, logger: Logger):
+        for address, share in self.shares().items():
+            logger.info(
+                'Node %s received %.1f%% of deploys', address, 100 * share)
@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+
+import grpc
+
+from .metrics import MetricsRegistry
+from .router import CircuitBreaker, NodeRouter, NoHealthyNodeError
+
+
+class FakeKey:
+
+    def __init__(self, hex_key: str):
+        self.hex_key = hex_key
+
+    def to_hex(self) -> str:
+        return self.hex_key
+
+
+class FakeClient:
+
+    def __init__(self, failing: bool = False):
+        self.failing = failing
+        self.deploys = 0
+        self.proposes = 0
+        self.deploy_ids = set()
+
+    async def deploy(self, key, contract, ts=None):
+        if self.failing:
+            raise grpc.RpcError()
+        self.deploys += 1
+        deploy_id = contract.encode()
+        self.deploy_ids.add(deploy_id)
+        return deploy_id
+
+    async def get_data_at_deploy_id(self, deploy_id):
+        return deploy_id in self.deploy_ids
+
+    async def propose(self):
+        self.proposes += 1
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_and_reset(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.record_failure(0)
+        self.assertTrue(breaker.available(0))
+        breaker.record_failure(1)
+        self.assertFalse(breaker.available(5))
+        self.assertTrue(breaker.available(11))
+        breaker.begin()
+        self.assertFalse(breaker.available(11))
+        breaker.record_failure(12)
+        self.assertFalse(breaker.available(21))
+        self.assertTrue(breaker.available(22))
+        breaker.record_success()
+        self.assertTrue(breaker.available(22))
+
+
+class TestNodeRouter(unittest.TestCase):
+
+    def router(self, clients: dict, policy: str, **kwargs) -> NodeRouter:
+        return NodeRouter(clients, policy, metrics=MetricsRegistry(), **kwargs)
+
+    def test_round_robin(self):
+        clients = {'a': FakeClient(), 'b': FakeClient(), 'c': FakeClient()}
+        router = self.router(clients, 'round_robin')
+
+        async def test():
+            for _ in range(30):
+                await router.deploy(FakeKey('k'), 'contract')
+            await router.propose()
+
+        asyncio.run(test())
+        self.assertEqual([10, 10, 10], [c.deploys for c in clients.values()])
+        self.assertEqual([1, 1, 1], [c.proposes for c in clients.values()])
+        self.assertEqual({'a': 1 / 3, 'b': 1 / 3, 'c': 1 / 3}, router.shares())
+
+    def test_sticky(self):
+        clients = {'a': FakeClient(), 'b': FakeClient()}
+        router = self.router(clients, 'sticky')
+
+        async def test():
+            for _ in range(10):
+                await router.deploy(FakeKey('k'), 'contract')
+            await router.propose()
+
+        asyncio.run(test())
+        self.assertEqual([0, 10], sorted(c.deploys for c in clients.values()))
+        self.assertEqual(1, sum(c.proposes for c in clients.values()))
+
+    def test_failover_and_circuit(self):
+        clients = {'a': FakeClient(failing=True), 'b': FakeClient()}
+        router = self.router(
+            clients, 'round_robin', failure_threshold=2, reset_timeout=60)
+
+        async def test():
+            for _ in range(10):
+                await router.deploy(FakeKey('k'), 'contract')
+
+        asyncio.run(test())
+        self.assertEqual(10, clients['b'].deploys)
+        self.assertFalse(router.available('a'))
+        self.assertTrue(router.available('b'))
+        self.assertEqual({'a': 0.0, 'b': 1.0}, router.shares())
+
+    def test_no_healthy_node(self):
+        router = self.router({'a': FakeClient(failing=True)},
+                             'least_latency',
+                             failure_threshold=1)
+
+        async def test():
+            with self.assertRaises(grpc.RpcError):
+                await router.deploy(FakeKey('k'), 'contract')
+            with self.assertRaises(NoHealthyNodeError):
+                await router.deploy(FakeKey('k'), 'contract')
+
+        asyncio.run(test())
+
+    def test_least_latency(self):
+        clients = {'a': FakeClient(), 'b': FakeClient()}
+        router = self.router(clients, 'least_latency')
+        router.nodes[0].latency = 0.5
+        router.nodes[1].latency = 0.1
+
+        async def test():
+            for _ in range(5):
+                await router.deploy(FakeKey('k'), 'contract')
+
+        asyncio.run(test())
+        self.assertEqual(5, clients['b'].deploys)
+
+    def test_data_looked_up_on_deploy_node(self):
+        clients = {'a': FakeClient(), 'b': FakeClient(), 'c': FakeClient()}
+        router = self.router(clients, 'round_robin', max_tracked_deploys=4)
+
+        async def test():
+            deploy_ids = [
+                await router.deploy(FakeKey('k'), f'contract{i}')
+                for i in range(7)
+            ]
+            return [await router.get_data_at_deploy_id(d) for d in deploy_ids]
+
+        found = asyncio.run(test())
+        self.assertEqual([True] * 4, found[3:])
@@ -0,0 +1,130 @@
+from abc import ABC, abstractmethod
+from random import Random
+from typing import Optional
+
+from structlog.stdlib import BoundLogger as Logger
+
+
+class ProposeScheduler(ABC):
+
+    @abstractmethod
+    def deploys_delay(self) -> float:
+        pass
+
+    # Returns how long to wait before proposing, or None to go on with another
+    # round of deploys first.
+    @abstractmethod
+    def propose_delay(
+            self, deploys_duration: float, pending_deploys: int,
+            pending_age: float) -> Optional[float]:
+        pass
+
+    # Returns whether the run can go on after a failed propose.
+    @abstractmethod
+    def record_propose(
+            self, latency: float, proposed_deploys: int,
+            error: Optional[Exception]) -> bool:
+        pass
+
+
+class FixedCadenceScheduler(ProposeScheduler):
+
+    def __init__(self, config: dict, rng: Random):
+        self.config = config
+        self.rng = rng
+        self.propose_time_left = 0.0
+        self._propose_delay = 0
+
+    def deploys_delay(self) -> float:
+        deploys_delay = self.rng.randint(
+            self.config['deploys_min_delay'], self.config['deploys_max_delay'])
+        self._propose_delay = self.rng.randint(
+            self.config['propose_min_delay'], self.config['propose_max_delay'])
+        return self.propose_time_left + deploys_delay
+
+    def propose_delay(
+            self, deploys_duration: float, pending_deploys: int,
+            pending_age: float) -> Optional[float]:
+        deploys_time_left = (
+            self.config['deploys_fixed_duration'] - deploys_duration)
+        return deploys_time_left + self._propose_delay
+
+    def record_propose(
+            self, latency: float, proposed_deploys: int,
+            error: Optional[Exception]) -> bool:
+        self.propose_time_left = self.config['propose_fixed_duration'] - latency
+        return error is None
+
+
+# Deploys continuously and proposes once enough deploys are pending or the
+# oldest of them waited long enough. The pause between deploy rounds is
+# adjusted AIMD-style: it grows multiplicatively when proposes fail or get
+# slower than the latency target, and shrinks linearly while they keep up.
+# The highest throughput seen while within the target approximates the
+# maximum sustainable rate.
+class AdaptiveScheduler(ProposeScheduler):
+
+    def __init__(self, config: dict, logger: Logger):
+        self.logger = logger
+        self.target_pending = config.get('propose_target_pending', 100)
+        self.max_pending_age = config.get('propose_max_pending_age', 10)
+        self.latency_target = config.get(
+            'propose_latency_target', config['propose_time_limit'] / 2)
+        self.min_interval = config.get('deploys_min_interval', 0.0)
+        self.max_interval = config.get('deploys_max_interval', 10.0)
+        self.interval_step = config.get('deploys_interval_step', 0.05)
+        self.max_failures = config.get('propose_max_failures', 3)
+        self.interval = self.min_interval
+        self.failures = 0
+        self.throughput = 0.0
+        self.best_throughput = 0.0
+        self._pending_age = 0.0
+
+    def deploys_delay(self) -> float:
+        return self.interval
+
+    def propose_delay(
+            self, deploys_duration: float, pending_deploys: int,
+            pending_age: float) -> Optional[float]:
+        self._pending_age = pending_age
+        if (pending_deploys >= self.target_pending or
+                pending_age >= self.max_pending_age):
+            return 0
+        return None
+
+    def record_propose(
+            self, latency: float, proposed_deploys: int,
+            error: Optional[Exception]) -> bool:
+        if error is not None or latency > self.latency_target:
+            self.interval = min(
+                self.max_interval,
+                max(self.interval * 2, self.interval_step))
+        else:
+            self.interval = max(
+                self.min_interval, self.interval - self.interval_step)
+        if error is not None:
+            self.failures += 1
+            self.logger.warning(
+                'Propose failed (%d in a row), deploy interval now %.2fs',
+                self.failures, self.interval)
+            return self.failures < self.max_failures
+        self.failures = 0
+        self.throughput = proposed_deploys / (self._pending_age + latency)
+        if latency <= self.latency_target:
+            self.best_throughput = max(self.best_throughput, self.throughput)
+        self.logger.info(
+            'Proposed %d deploys in %.2fs, %.1f deploys/s '
+            '(best sustained %.1f), deploy interval now %.2fs',
+            proposed_deploys, latency, self.throughput, self.best_throughput,
+            self.interval)
+        return True
+
+
+def create_scheduler(
+        config: dict, rng: Random, logger: Logger) -> ProposeScheduler:
+    policy = config.get('propose_policy', 'fixed')
+    if policy == 'fixed':
+        return FixedCadenceScheduler(config, rng)
+    if policy == 'adaptive':
+        return AdaptiveScheduler(config, logger)
+    raise ValueError(f'Unknown propose policy: {policy}')
@@ -0,0 +1,98 @@
+import unittest
+from random import Random
+
+import structlog
+
+from .scheduler import (
+    AdaptiveScheduler, FixedCadenceScheduler, ProposeScheduler,
+    create_scheduler)
+
+FIXED_CONFIG = {
+    'deploys_min_delay': 2,
+    'deploys_max_delay': 2,
+    'propose_min_delay': 1,
+    'propose_max_delay': 1,
+    'deploys_fixed_duration': 5,
+    'propose_fixed_duration': 3,
+    'propose_time_limit': 4,
+}
+
+
+class TestFixedCadenceScheduler(unittest.TestCase):
+
+    def test_cadence(self):
+        scheduler = FixedCadenceScheduler(FIXED_CONFIG, Random(1))
+        self.assertEqual(2, scheduler.deploys_delay())
+        self.assertEqual(5.5, scheduler.propose_delay(0.5, 10, 0.5))
+        self.assertTrue(scheduler.record_propose(1.0, 10, None))
+        # The rest of the propose's fixed duration is waited out before the
+        # next deploys.
+        self.assertEqual(2.0, scheduler.propose_time_left)
+        self.assertEqual(4.0, scheduler.deploys_delay())
+
+    def test_failed_propose(self):
+        scheduler = FixedCadenceScheduler(FIXED_CONFIG, Random(1))
+        self.assertFalse(
+            scheduler.record_propose(0.5, 10, RuntimeError('propose')))
+
+
+class TestAdaptiveScheduler(unittest.TestCase):
+
+    def _scheduler(self, **config) -> AdaptiveScheduler:
+        return AdaptiveScheduler(
+            dict({
+                'propose_time_limit': 4,
+                'propose_target_pending': 10,
+                'propose_max_pending_age': 5,
+                'deploys_interval_step': 0.5,
+            }, **config), structlog.get_logger())
+
+    def test_propose_threshold(self):
+        scheduler = self._scheduler()
+        self.assertIsNone(scheduler.propose_delay(0.1, 9, 1))
+        self.assertEqual(0, scheduler.propose_delay(0.1, 10, 1))
+        self.assertEqual(0, scheduler.propose_delay(0.1, 1, 5))
+
+    def test_interval(self):
+        scheduler = self._scheduler(deploys_min_interval=0.25)
+        self.assertEqual(0.25, scheduler.deploys_delay())
+        scheduler.propose_delay(0.1, 10, 1)
+        # Slower than the latency target of half the time limit.
+        self.assertTrue(scheduler.record_propose(3, 10, None))
+        self.assertEqual(0.5, scheduler.deploys_delay())
+        self.assertEqual(0.0, scheduler.best_throughput)
+        self.assertTrue(scheduler.record_propose(1, 10, None))
+        self.assertEqual(0.25, scheduler.deploys_delay())
+        self.assertEqual(5.0, scheduler.best_throughput)
+
+    def test_failures(self):
+        scheduler = self._scheduler(
+            deploys_max_interval=1.5, propose_max_failures=3)
+        error = RuntimeError('propose')
+        self.assertTrue(scheduler.record_propose(1, 10, error))
+        self.assertEqual(0.5, scheduler.interval)
+        # A successful propose resets the count.
+        self.assertTrue(scheduler.record_propose(1, 10, None))
+        self.assertEqual(0.0, scheduler.interval)
+        self.assertTrue(scheduler.record_propose(1, 10, error))
+        self.assertTrue(scheduler.record_propose(1, 10, error))
+        self.assertFalse(scheduler.record_propose(1, 10, error))
+        self.assertEqual(1.5, scheduler.interval)
+
+
+class TestCreateScheduler(unittest.TestCase):
+
+    def test_policies(self):
+        logger = structlog.get_logger()
+        self.assertIsInstance(
+            create_scheduler(FIXED_CONFIG, Random(1), logger),
+            FixedCadenceScheduler)
+        self.assertIsInstance(
+            create_scheduler(
+                dict(FIXED_CONFIG, propose_policy='adaptive'), Random(1),
+                logger), AdaptiveScheduler)
+        with self.assertRaises(ValueError):
+            create_scheduler(
+                dict(FIXED_CONFIG, propose_policy='other'), Random(1), logger)
+        with self.assertRaises(TypeError):
+            ProposeScheduler()
@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+import structlog
+
+from .common import Transfer
+from . import metrics
+from .ledger import LedgerWriter
+from .metrics import MetricsRegistry
+from .node import Node
+from .population import UserPopulation
+
+
+@dataclass
+class ShardResult:
+    # Empty when the shard wrote a ledger, its records from ledger_start on
+    # are the shard's transfers then.
+    transfers: List[Transfer]
+    users: UserPopulation
+    metrics: MetricsRegistry
+    ledger_start: int = 0
+
+
+def split_nodes(node_configs: List[dict], shard_count: int) -> List[List[dict]]:
+    shards = [node_configs[i::shard_count] for i in range(shard_count)]
+    return [s for s in shards if s]
+
+
+async def _run_shard(
+        node_configs: List[dict], recipients: List[str], run_duration: float,
+        ledger_path: Optional[str]) -> ShardResult:
+    logger = structlog.get_logger()
+    async with contextlib.AsyncExitStack() as stack:
+        nodes = [
+            await stack.enter_async_context(Node(node_config, logger))
+            for node_config in node_configs
+        ]
+        ledger_start = 0
+        if ledger_path is not None:
+            ledger = stack.enter_context(LedgerWriter(ledger_path))
+            ledger_start = ledger.count
+            for n in nodes:
+                n.ledger = ledger
+        node_transfers = await asyncio.gather(
+            *(n.generate_transfers(recipients, run_duration) for n in nodes))
+        return ShardResult(
+            transfers=[tf for tfs in node_transfers for tf in tfs],
+            users=UserPopulation.from_users(
+                [u for n in nodes for u in n.users]),
+            metrics=metrics.REGISTRY,
+            ledger_start=ledger_start)
+
+
+# Entry point of a worker process. Users start from their configured initial
+# balance, the coordinator is responsible for funding their vaults beforehand.
+def run_shard(
+        node_configs: List[dict],
+        recipients: List[str],
+        run_duration: float,
+        ledger_path: Optional[str] = None) -> ShardResult:
+    return asyncio.run(
+        _run_shard(node_configs, recipients, run_duration, ledger_path))
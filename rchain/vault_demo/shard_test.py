@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import structlog
+
+from .config_gen import AddressCache, generate_config
+from .ledger import LedgerReader
+from .population import UserPopulation
+from .shard import run_shard, split_nodes
+from .stub_node import start_server
+from .user import User
+from .verify import expected_balances
+
+
+class FakeNode:
+
+    def __init__(self):
+        self.config = {'address': 'shard-test'}
+
+
+class TestShard(unittest.TestCase):
+
+    def test_split_nodes(self):
+        configs = [{'address': str(i)} for i in range(5)]
+        self.assertEqual([['0', '2', '4'], ['1', '3']],
+                         [[c['address'] for c in s]
+                          for s in split_nodes(configs, 2)])
+        self.assertEqual(5, len(split_nodes(configs, 8)))
+
+    def test_update_users(self):
+        logger = structlog.get_logger()
+        node = FakeNode()
+        users = [
+            User({
+                'key': f'{i + 1:064x}',
+                'rev_addr': f'user{i}',
+                'initial_balance': 100
+            }, node, logger) for i in range(3)
+        ]
+        users[1].balance = 40
+        users[1].deploy_counter = 7
+        population = UserPopulation.from_users(users[:2])
+        self.assertEqual(2, len(population))
+        copies = [User(u.config, node, logger) for u in users]
+        copies[2].balance = 5
+        population.update_users(copies)
+        self.assertEqual([100, 40, 5], [u.balance for u in copies])
+        self.assertEqual([0, 7, 0], [u.deploy_counter for u in copies])
+
+    def test_run_shard(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ledger_path = os.path.join(tmpdir, 'ledger')
+            (results, vaults) = asyncio.run(self._run_shards(ledger_path))
+            with LedgerReader(ledger_path) as reader:
+                ledger_transfers = [tf for (_, tf) in reader]
+        (in_memory, in_ledger) = results
+        self.assertEqual([], in_ledger.transfers)
+        self.assertEqual(0, in_ledger.ledger_start)
+        transfers = in_memory.transfers + ledger_transfers
+        self.assertTrue(in_memory.transfers)
+        self.assertTrue(ledger_transfers)
+        self.assertEqual(
+            expected_balances(self.initial, transfers),
+            {a: vaults.get(a, 0) for a in self.initial})
+        self.assertEqual(
+            len(transfers),
+            sum(sum(r.users.deploy_counters) for r in results))
+        self.assertTrue(any(r.metrics.counters for r in results))
+
+    async def _run_shards(self, ledger_path: str):
+        # Addresses are derived in forked processes, before any gRPC use.
+        config = generate_config({
+            'seed': 1,
+            'nodes': ['', ''],
+            'users_per_node': 2,
+            'node_defaults': {
+                'deploys_fixed_duration': 0.05,
+                'propose_fixed_duration': 0.05,
+                'propose_min_delay': 0,
+                'propose_max_delay': 0,
+            },
+        }, AddressCache(None))
+        users = [u for n in config['nodes'] for u in n['users']]
+        self.initial = {u['rev_addr']: u['initial_balance'] for u in users}
+        (server, node) = await start_server('127.0.0.1:0')
+        for n in config['nodes']:
+            n['address'] = f'127.0.0.1:{node.port}'
+        node.ledger.vaults.update(self.initial)
+        shards = split_nodes(config['nodes'], 2)
+        evt_loop = asyncio.get_running_loop()
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=2, mp_context=multiprocessing.get_context(
+                        'spawn')) as executor:
+                results = await asyncio.gather(
+                    evt_loop.run_in_executor(
+                        executor, run_shard, shards[0], list(self.initial),
+                        0.5),
+                    evt_loop.run_in_executor(
+                        executor, run_shard, shards[1], list(self.initial),
+                        0.5, ledger_path))
+        finally:
+            await server.stop(None)
+        return (results, node.ledger.vaults)
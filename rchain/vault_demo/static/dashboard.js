@@ -0,0 +1,54 @@
+document.addEventListener('DOMContentLoaded', function() {
+    var maxTransfers = 50;
+    var transferCount = 0;
+    var balanceRows = {};
+
+    var es = new EventSource('/sse');
+    es.addEventListener('batch', function (event) {
+        var batch = JSON.parse(event.data);
+
+        transferCount += batch.transfer_count;
+        document.getElementById('transfer-count').textContent = transferCount;
+
+        var transfers_dom = document.getElementById('transfers');
+        batch.transfers.forEach(function (t) {
+            var item_dom = document.createElement('li');
+            item_dom.textContent = t[0] + ' → ' + t[1] + ': ' + t[2] + ' REV';
+            transfers_dom.insertBefore(item_dom, transfers_dom.firstChild);
+        });
+        while (transfers_dom.childNodes.length > maxTransfers) {
+            transfers_dom.removeChild(transfers_dom.lastChild);
+        }
+
+        var balances_dom = document.getElementById('balances');
+        function balanceRow(addr) {
+            var row_dom = balanceRows[addr];
+            if (!row_dom) {
+                row_dom = balances_dom.insertRow();
+                row_dom.insertCell().textContent = addr;
+                row_dom.insertCell();
+                row_dom.insertCell();
+                balanceRows[addr] = row_dom;
+            }
+            return row_dom;
+        }
+        Object.keys(batch.balances).forEach(function (addr) {
+            balanceRow(addr).cells[1].textContent = batch.balances[addr];
+        });
+        Object.keys(batch.observed_balances).forEach(function (addr) {
+            balanceRow(addr).cells[2].textContent =
+                batch.observed_balances[addr];
+        });
+
+        if (batch.failure) {
+            document.getElementById('failure').textContent =
+                'Simulation failed: ' + batch.failure;
+        }
+
+        batch.proposes.forEach(function (p) {
+            document.getElementById('last-propose').textContent =
+                p.node + ' (' + p.deploys + ' deploys, ' +
+                p.latency.toFixed(2) + 's)';
+        });
+    });
+});
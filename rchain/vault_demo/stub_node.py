@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+from rchain.pb.DeployService_pb2 import (
+    DataWithBlockInfo, DeployServiceResponse, LightBlockInfo,
+    ListeningNameDataResponse)
+from rchain.pb.DeployService_pb2_grpc import (
+    DeployServiceServicer, add_DeployServiceServicer_to_server)
+from rchain.pb.Either_pb2 import Either, EitherAny, EitherError, EitherSuccess
+from rchain.pb.ProposeService_pb2_grpc import (
+    ProposeServiceServicer, add_ProposeServiceServicer_to_server)
+from rchain.pb.RhoTypes_pb2 import ETuple, Expr, Par
+
+from .contracts import CREATE_GENESIS_VAULT, GET_BALANCE, TRANSFER
+from .funding import parse_fund_vaults
+from .verify import parse_get_balances
+
+
+@dataclass
+class StubConfig:
+    deploy_latency: float = 0.0
+    propose_latency: float = 0.0
+    query_latency: float = 0.0
+    # Uniformly distributed extra latency added to every call.
+    jitter: float = 0.0
+    deploy_failure_rate: float = 0.0
+    propose_failure_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+def _int_par(value: int) -> Par:
+    return Par(exprs=[Expr(g_int=value)])
+
+
+def _tuple_par(addr: str, balance: int) -> Par:
+    return Par(exprs=[
+        Expr(
+            e_tuple_body=ETuple(
+                ps=[Par(exprs=[Expr(g_string=addr)]),
+                    _int_par(balance)]))
+    ])
+
+
+# In-memory REV ledger. Recognizes the contracts this package deploys by
+# matching them against their templates, anything else is accepted and
+# ignored.
+class StubLedger:
+
+    def __init__(self):
+        self.vaults: Dict[str, int] = {}
+
+    def transfer(self, sender: str, recipient: str, amount: int):
+        if self.vaults.get(sender, 0) >= amount:
+            self.vaults[sender] -= amount
+            self.vaults[recipient] = self.vaults.get(recipient, 0) + amount
+
+    def execute(self, term: str) -> List[Par]:
+        args = TRANSFER.parse(term)
+        if args is not None:
+            self.transfer(args[0], args[1], int(args[2]))
+            return []
+        args = GET_BALANCE.parse(term)
+        if args is not None:
+            return [_int_par(self.vaults.get(args[0], 0))]
+        addrs = parse_get_balances(term)
+        if addrs is not None:
+            return [_tuple_par(a, self.vaults.get(a, 0)) for a in addrs]
+        funding = parse_fund_vaults(term)
+        if funding is not None:
+            (sender, amounts) = funding
+            for recipient, amount in amounts:
+                self.transfer(sender, recipient, amount)
+            return []
+        args = CREATE_GENESIS_VAULT.parse(term)
+        if args is not None:
+            self.vaults[args[0]] = int(args[1])
+        return []
+
+
+class StubNode:
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.rng = Random(config.seed)
+        self.ledger = StubLedger()
+        self.pending_deploys = []
+        self.results: Dict[bytes, Tuple[str, List[Par]]] = {}
+        self.block_number = 0
+        self.deploy_count = 0
+        self.propose_count = 0
+        # Port the server is bound to, set by start_server.
+        self.port: Optional[int] = None
+
+    async def delay(self, latency: float):
+        latency += self.rng.random() * self.config.jitter
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def fails(self, rate: float) -> bool:
+        return rate > 0 and self.rng.random() < rate
+
+    def propose(self) -> str:
+        self.block_number += 1
+        block_hash = hashlib.blake2b(
+            b''.join(d.sig for d in self.pending_deploys) +
+            self.block_number.to_bytes(8, 'big'),
+            digest_size=32).hexdigest()
+        for d in self.pending_deploys:
+            self.results[d.sig] = (block_hash, self.ledger.execute(d.term))
+        self.pending_deploys = []
+        self.propose_count += 1
+        return block_hash
+
+
+def _success(message) -> Either:
+    return Either(
+        success=EitherSuccess(
+            response=EitherAny(
+                type_url=f'type.rchain.coop/{message.DESCRIPTOR.full_name}',
+                value=message.SerializeToString())))
+
+
+def _error(message: str) -> Either:
+    return Either(error=EitherError(messages=[message]))
+
+
+class StubDeployService(DeployServiceServicer):
+
+    def __init__(self, node: StubNode):
+        self.node = node
+
+    async def DoDeploy(self, request, context):
+        await self.node.delay(self.node.config.deploy_latency)
+        if self.node.fails(self.node.config.deploy_failure_rate):
+            return _error('Injected deploy failure')
+        self.node.pending_deploys.append(request)
+        self.node.deploy_count += 1
+        return _success(
+            DeployServiceResponse(
+                message=f'Success!\nDeployId is: {request.sig.hex()}'))
+
+    async def listenForDataAtName(self, request, context):
+        await self.node.delay(self.node.config.query_latency)
+        sig = request.name.unforgeables[0].g_deploy_id_body.sig
+        result = self.node.results.get(sig)
+        if result is None:
+            return _success(ListeningNameDataResponse(length=0))
+        (block_hash, pars) = result
+        return _success(
+            ListeningNameDataResponse(
+                blockResults=[
+                    DataWithBlockInfo(
+                        postBlockData=pars,
+                        block=LightBlockInfo(blockHash=block_hash))
+                ],
+                length=1))
+
+
+class StubProposeService(ProposeServiceServicer):
+
+    def __init__(self, node: StubNode):
+        self.node = node
+
+    async def propose(self, request, context):
+        await self.node.delay(self.node.config.propose_latency)
+        if self.node.fails(self.node.config.propose_failure_rate):
+            return _error('Injected propose failure')
+        block_hash = self.node.propose()
+        return _success(
+            DeployServiceResponse(
+                message=f'Success! Block {block_hash} created and added.'))
+
+
+async def start_server(
+        address: str,
+        config: Optional[StubConfig] = None
+) -> Tuple[grpc.aio.Server, StubNode]:
+    node = StubNode(config or StubConfig())
+    server = grpc.aio.server()
+    add_DeployServiceServicer_to_server(StubDeployService(node), server)
+    add_ProposeServiceServicer_to_server(StubProposeService(node), server)
+    node.port = server.add_insecure_port(address)
+    await server.start()
+    return (server, node)
+
+
+async def main(address: str, config: StubConfig):
+    (server, _) = await start_server(address, config)
+    await server.wait_for_termination()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fake RNode DeployService with an in-memory REV ledger')
+    parser.add_argument('--address', default='127.0.0.1:40401')
+    parser.add_argument('--deploy-latency', type=float, default=0.0)
+    parser.add_argument('--propose-latency', type=float, default=0.0)
+    parser.add_argument('--query-latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--deploy-failure-rate', type=float, default=0.0)
+    parser.add_argument('--propose-failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.address,
+            StubConfig(
+                deploy_latency=args.deploy_latency,
+                propose_latency=args.propose_latency,
+                query_latency=args.query_latency,
+                jitter=args.jitter,
+                deploy_failure_rate=args.deploy_failure_rate,
+                propose_failure_rate=args.propose_failure_rate,
+                seed=args.seed)))
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+import grpc
+from rchain.client import RClientException
+from rchain.crypto import PrivateKey
+
+from .aio_client import AioRClient
+from .contracts import GET_BALANCE, TRANSFER
+from .stub_node import StubConfig, start_server
+
+KEY = PrivateKey.from_hex('1' * 64)
+
+
+async def _with_stub(config: StubConfig, test):
+    (server, node) = await start_server('127.0.0.1:0', config)
+    try:
+        async with grpc.aio.insecure_channel(
+                f'127.0.0.1:{node.port}') as channel:
+            return await test(node, AioRClient(channel))
+    finally:
+        await server.stop(None)
+
+
+class TestStubNode(unittest.TestCase):
+
+    def test_deploy_propose(self):
+
+        async def test(node, client):
+            node.ledger.vaults['a'] = 100
+            await client.deploy(KEY, TRANSFER.render('a', 'b', 30))
+            balance_id = await client.deploy(KEY, GET_BALANCE.render('b'))
+            # Deploys only take effect once proposed.
+            data = await client.get_data_at_deploy_id(balance_id)
+            self.assertEqual(0, data.length)
+            self.assertEqual({'a': 100}, node.ledger.vaults)
+            await client.propose()
+            data = await client.get_data_at_deploy_id(balance_id)
+            self.assertEqual(1, data.length)
+            self.assertEqual(
+                30, data.blockResults[0].postBlockData[0].exprs[0].g_int)
+            self.assertEqual({'a': 70, 'b': 30}, node.ledger.vaults)
+            self.assertEqual(2, node.deploy_count)
+            self.assertEqual(1, node.propose_count)
+
+        asyncio.run(_with_stub(StubConfig(), test))
+
+    def test_injected_failures(self):
+
+        async def test(node, client):
+            with self.assertRaises(RClientException):
+                await client.deploy(KEY, TRANSFER.render('a', 'b', 1))
+            with self.assertRaises(RClientException):
+                await client.propose()
+            self.assertEqual(0, node.deploy_count)
+            self.assertEqual(0, node.propose_count)
+
+        asyncio.run(
+            _with_stub(
+                StubConfig(deploy_failure_rate=1, propose_failure_rate=1),
+                test))
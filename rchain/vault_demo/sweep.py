@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+from .config_gen import NODE_DEFAULTS, USER_DEFAULTS
+from .logconfig import configure_fast
+from .metrics import Histogram
+from .world import World
+
+TARGETS = ('stub', 'nodes')
+
+
+# A knob named like deploy_batch_size or propose_delay sets the min and max
+# keys of that range, to a single value or to a [min, max] pair.
+def expand_knob(name: str, value) -> Dict[str, object]:
+    if name in USER_DEFAULTS or name in NODE_DEFAULTS:
+        return {name: value}
+    (prefix, _, suffix) = name.rpartition('_')
+    min_key = f'{prefix}_min_{suffix}'
+    max_key = f'{prefix}_max_{suffix}'
+    if prefix and (min_key in USER_DEFAULTS or min_key in NODE_DEFAULTS):
+        (low, high) = value if isinstance(value, list) else (value, value)
+        return {min_key: low, max_key: high}
+    return {name: value}
+
+
+# Knobs go to every user or node that has such a key, anything else to the
+# World config.
+def apply_params(config: dict, params: Dict[str, object]) -> dict:
+    config = copy.deepcopy(config)
+    nodes = config['nodes']
+    users = [u for n in nodes for u in n['users']]
+    for name, value in params.items():
+        for key, v in expand_knob(name, value).items():
+            if key in USER_DEFAULTS or any(key in u for u in users):
+                targets = users
+            elif key in NODE_DEFAULTS or any(key in n for n in nodes):
+                targets = nodes
+            else:
+                targets = [config]
+            for t in targets:
+                t[key] = v
+    return config
+
+
+def expand_grid(grid: Dict[str, list]) -> List[Dict[str, object]]:
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[n] for n in names))
+    ]
+
+
+# The point after which latency grows faster than throughput: on the
+# latency-throughput curve scaled to a unit square, the one furthest below
+# the diagonal. Points that failed are ignored.
+def find_knee(results: List[dict],
+              latency_key: str = 'deploy_p99') -> Optional[dict]:
+    points = sorted(
+        (r for r in results if 'error' not in r),
+        key=lambda r: r['throughput'])
+    if not points:
+        return None
+    xs = [r['throughput'] for r in points]
+    ys = [r[latency_key] for r in points]
+    x_range = (xs[-1] - xs[0]) or 1.0
+    y_range = (max(ys) - min(ys)) or 1.0
+    return max(
+        points,
+        key=lambda r: (r['throughput'] - xs[0]) / x_range -
+        (r[latency_key] - min(ys)) / y_range)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(address: str, timeout: float = 10):
+    (host, port) = address.rsplit(':', 1)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, int(port)), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _start_stub(address: str, stub_options: dict) -> subprocess.Popen:
+    args = [
+        sys.executable, '-m', 'rchain.vault_demo.stub_node', '--address',
+        address
+    ]
+    for name, value in stub_options.items():
+        args += [f'--{name.replace("_", "-")}', str(value)]
+    return subprocess.Popen(args, stderr=subprocess.DEVNULL)
+
+
+class _MeasuredWorld(World):
+
+    measurement: Optional[dict] = None
+
+    # Only the transfer phase is measured, funding and verification deploy
+    # and propose too.
+    async def _generate_transfers(self, nodes, recipients, run_duration):
+        for _, _, h in metrics.REGISTRY.iter_histograms():
+            h.reset()
+        # Transfers written to a ledger aren't returned.
+        ledgers = {
+            id(n.ledger): n.ledger
+            for n in nodes if n.ledger is not None
+        }
+        ledger_starts = {k: ledger.count for k, ledger in ledgers.items()}
+        start = time.monotonic()
+        transfers = await super()._generate_transfers(
+            nodes, recipients, run_duration)
+        elapsed = time.monotonic() - start
+        count = len(transfers) + sum(
+            ledger.count - ledger_starts[k] for k, ledger in ledgers.items())
+        deploy = Histogram()
+        propose = Histogram()
+        for _, labels, h in metrics.REGISTRY.iter_histograms('rpc_latency'):
+            method = dict(labels)['method']
+            if method in ('deploy', 'deploy_signed'):
+                deploy.merge(h)
+            elif method == 'propose':
+                propose.merge(h)
+        errors = sum(
+            c.value
+            for name in ('deploy_errors', 'propose_errors')
+            for _, _, c in metrics.REGISTRY.iter_counters(name))
+        self.measurement = {
+            'transfers': count,
+            'elapsed': elapsed,
+            'throughput': count / elapsed if elapsed else 0.0,
+            'deploy_p50': deploy.percentile(50),
+            'deploy_p99': deploy.percentile(99),
+            'propose_p50': propose.percentile(50),
+            'propose_p99': propose.percentile(99),
+            'errors': errors,
+        }
+        return transfers
+
+
+def _run_child(config: dict) -> dict:
+    listener = configure_fast(config.get('log_file') or os.devnull)
+    try:
+        world = _MeasuredWorld(config)
+        report = asyncio.run(world.main())
+    finally:
+        listener.stop()
+    result = dict(world.measurement)
+    result.update(
+        mismatched=len(report.mismatches), missing=len(report.missing))
+    return result
+
+
+class SweepRunner:
+
+    def __init__(
+            self,
+            base_config: dict,
+            duration: float,
+            target: str = 'stub',
+            parallel: int = 1,
+            stub_options: Optional[dict] = None,
+            log_dir: Optional[str] = None):
+        if target not in TARGETS:
+            raise ValueError(f'Unknown sweep target: {target}')
+        self.base_config = base_config
+        self.duration = duration
+        self.target = target
+        # Points sharing real nodes would skew each other's measurements.
+        self.parallel = parallel if target == 'stub' else 1
+        self.stub_options = stub_options or {}
+        self.log_dir = log_dir
+        self._points = itertools.count()
+
+    def point_config(self, params: Dict[str, object]) -> dict:
+        config = apply_params(self.base_config, params)
+        config['run_duration'] = self.duration
+        config['workers'] = 0
+        config['metrics_interval'] = 0
+        for key in ('metrics_port', 'checkpoint_dir', 'ledger_path',
+                    'funding_state_path'):
+            config.pop(key, None)
+        if self.log_dir:
+            config['log_file'] = os.path.join(
+                self.log_dir, f'point-{next(self._points)}.log')
+        return config
+
+    def run_point(self, params: Dict[str, object]) -> dict:
+        config = self.point_config(params)
+        stubs = []
+        try:
+            if self.target == 'stub':
+                # Every point gets fresh stubs, one per node, so that points
+                # don't share ledgers or load.
+                for n in config['nodes']:
+                    n['address'] = f'127.0.0.1:{_free_port()}'
+                    stubs.append(_start_stub(n['address'], self.stub_options))
+                for n in config['nodes']:
+                    _wait_for_port(n['address'])
+            out = subprocess.run(
+                [sys.executable, '-m', 'rchain.vault_demo.sweep', '--child'],
+                input=json.dumps(config).encode(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+            if out.returncode:
+                error = out.stderr.decode().strip().splitlines()
+                return {
+                    'params': params,
+                    'error': error[-1] if error else f'exit {out.returncode}'
+                }
+            result = json.loads(out.stdout)
+        finally:
+            for stub in stubs:
+                stub.terminate()
+                stub.wait()
+        result['params'] = params
+        return result
+
+    def run_points(self, points: List[Dict[str, object]]) -> List[dict]:
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            return list(executor.map(self.run_point, points))
+
+    def grid(self, grid: Dict[str, list]) -> List[dict]:
+        return self.run_points(expand_grid(grid))
+
+    # Raises an integer knob geometrically until throughput stops growing by
+    # at least min_gain or the latency limit is crossed, then narrows down
+    # the interval where that happened. Each step tries as many values as
+    # there are parallel slots.
+    def adaptive(
+            self,
+            knob: str,
+            start: int,
+            stop: int,
+            factor: float = 2,
+            min_gain: float = 0.05,
+            latency_limit: Optional[float] = None,
+            refine_steps: int = 2,
+            fixed: Optional[Dict[str, object]] = None) -> List[dict]:
+        fixed = fixed or {}
+        results: Dict[int, dict] = {}
+
+        def run(values: List[int]) -> List[dict]:
+            values = [v for v in values if v not in results]
+            points = [dict(fixed, **{knob: v}) for v in values]
+            for v, r in zip(values, self.run_points(points)):
+                results[v] = r
+            return [results[v] for v in sorted(results)]
+
+        def saturated(prev: dict, cur: dict) -> bool:
+            if 'error' in cur:
+                return True
+            if latency_limit is not None and \
+                    cur['deploy_p99'] > latency_limit:
+                return True
+            return cur['throughput'] < prev['throughput'] * (1 + min_gain)
+
+        # The first value that didn't pay off and the one before the last
+        # that did: the gain may have started to fall anywhere in between.
+        def bracket(ordered: List[dict]) -> Optional[Tuple[dict, dict]]:
+            for i in range(1, len(ordered)):
+                if 'error' not in ordered[i - 1] and \
+                        saturated(ordered[i - 1], ordered[i]):
+                    return (ordered[max(0, i - 2)], ordered[i])
+            return None
+
+        (low, high) = (None, None)
+        value = start
+        while high is None and value <= stop:
+            values = []
+            while len(values) < self.parallel and value <= stop:
+                values.append(value)
+                value = max(value + 1, int(value * factor))
+            ordered = run(values)
+            (low, high) = bracket(ordered) or (low, high)
+        for _ in range(refine_steps if high is not None else 0):
+            (lo, hi) = (low['params'][knob], high['params'][knob])
+            step = (hi - lo) / (self.parallel + 1)
+            values = sorted({
+                int(lo + step * (i + 1))
+                for i in range(self.parallel)
+            } - {lo, hi})
+            if not values:
+                break
+            ordered = [r for r in run(values) if lo <= r['params'][knob] <= hi]
+            (low, high) = bracket(ordered) or (low, high)
+        return [results[v] for v in sorted(results)]
+
+
+def print_table(results: List[dict], knee: Optional[dict]):
+    names = sorted({n for r in results for n in r['params']})
+    columns = [(n, max(len(n), 8)) for n in names]
+    header = ' '.join(f'{n:>{w}}' for n, w in columns)
+    print(
+        f'  {header} {"transfers/s":>12} {"deploy p50":>11} '
+        f'{"deploy p99":>11} {"propose p99":>12} {"errors":>7}')
+    for r in results:
+        mark = '*' if r is knee else ' '
+        params = ' '.join(
+            f'{json.dumps(r["params"].get(n)):>{w}}' for n, w in columns)
+        if 'error' in r:
+            print(f'{mark} {params} {r["error"]}')
+            continue
+        print(
+            f'{mark} {params} {r["throughput"]:>12.1f} '
+            f'{r["deploy_p50"] * 1000:>9.1f}ms '
+            f'{r["deploy_p99"] * 1000:>9.1f}ms '
+            f'{r["propose_p99"] * 1000:>10.1f}ms {r["errors"]:>7}')
+    if knee is not None:
+        print(
+            f'Saturation knee at {json.dumps(knee["params"])}: '
+            f'{knee["throughput"]:.1f} transfers/s, deploy p99 '
+            f'{knee["deploy_p99"] * 1000:.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the simulation over a grid of knob values or '
+        'search one knob adaptively, and find the saturation knee')
+    parser.add_argument(
+        'spec', nargs='?', help='Sweep spec (JSON) with "grid" or "adaptive"')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=60,
+        help='seconds of transfers per point')
+    parser.add_argument('--target', choices=TARGETS, default='stub')
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        default=1,
+        help='points run at once, only against stubs')
+    parser.add_argument('--log-dir', help='Keeps a JSON log per point')
+    parser.add_argument('-o', '--output', help='Writes results as JSON')
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_child(json.load(sys.stdin))))
+        return
+    if not args.spec:
+        parser.error('the spec is required')
+
+    spec = json.loads(Path(args.spec).read_text())
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+    runner = SweepRunner(
+        json.loads(Path(args.config).read_text()), args.duration,
+        args.target, args.parallel, spec.get('stub'), args.log_dir)
+    if 'adaptive' in spec:
+        results = runner.adaptive(**spec['adaptive'])
+    else:
+        results = runner.grid(spec['grid'])
+    knee = find_knee(results)
+    print_table(results, knee)
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps({
+                'results': results,
+                'knee': knee
+            }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import unittest
+
+from .sweep import SweepRunner, apply_params, expand_grid, find_knee
+
+CONFIG = {
+    'rng_seed': 1,
+    'nodes': [{
+        'address': '127.0.0.1:40401',
+        'deploys_fixed_duration': 12,
+        'users': [{
+            'deploy_batch_min_size': 1,
+            'deploy_batch_max_size': 5
+        }, {
+            'deploy_batch_min_size': 1,
+            'deploy_batch_max_size': 5
+        }],
+    }],
+}
+
+
+def _result(batch_size: int, throughput: float, latency: float) -> dict:
+    return {
+        'params': {
+            'deploy_batch_size': batch_size
+        },
+        'throughput': throughput,
+        'deploy_p99': latency,
+    }
+
+
+# Throughput grows linearly up to a batch size of 20 and stays flat after,
+# latency starts growing there.
+class SaturatingRunner(SweepRunner):
+
+    def __init__(self, parallel: int):
+        super().__init__(CONFIG, 1, parallel=parallel)
+        self.runs = []
+
+    def run_point(self, params: dict) -> dict:
+        size = params['deploy_batch_size']
+        self.runs.append(size)
+        return _result(
+            size, 10.0 * min(size, 20), 0.1 + 0.01 * max(0, size - 20))
+
+
+class TestParams(unittest.TestCase):
+
+    def test_apply_params(self):
+        config = apply_params(
+            CONFIG, {
+                'deploy_batch_size': [2, 8],
+                'deploys_fixed_duration': 3,
+                'propose_delay': 1,
+                'run_duration': 30,
+            })
+        for u in config['nodes'][0]['users']:
+            self.assertEqual(2, u['deploy_batch_min_size'])
+            self.assertEqual(8, u['deploy_batch_max_size'])
+        node = config['nodes'][0]
+        self.assertEqual(3, node['deploys_fixed_duration'])
+        self.assertEqual(1, node['propose_min_delay'])
+        self.assertEqual(1, node['propose_max_delay'])
+        self.assertEqual(30, config['run_duration'])
+        self.assertEqual(
+            5, CONFIG['nodes'][0]['users'][0]['deploy_batch_max_size'])
+
+    def test_expand_grid(self):
+        points = expand_grid({'a': [1, 2], 'b': [3, 4, 5]})
+        self.assertEqual(6, len(points))
+        self.assertIn({'a': 2, 'b': 4}, points)
+
+
+class TestKnee(unittest.TestCase):
+
+    def test_find_knee(self):
+        results = [
+            _result(1, 10, 0.10),
+            _result(2, 20, 0.11),
+            _result(4, 40, 0.12),
+            _result(8, 45, 0.50),
+            _result(16, 46, 2.00),
+        ]
+        self.assertIs(results[2], find_knee(results))
+
+    def test_failed_points_ignored(self):
+        results = [
+            _result(1, 10, 0.1),
+            {
+                'params': {
+                    'deploy_batch_size': 2
+                },
+                'error': 'Connection refused'
+            },
+        ]
+        self.assertIs(results[0], find_knee(results))
+        self.assertIsNone(find_knee(results[1:]))
+
+
+class TestAdaptive(unittest.TestCase):
+
+    def test_finds_saturation(self):
+        for parallel in (1, 3):
+            runner = SaturatingRunner(parallel)
+            results = runner.adaptive(
+                'deploy_batch_size', 1, 1000, refine_steps=3)
+            self.assertEqual(len(runner.runs), len(set(runner.runs)))
+            self.assertLessEqual(max(runner.runs), 256)
+            sizes = [r['params']['deploy_batch_size'] for r in results]
+            self.assertEqual(sorted(sizes), sizes)
+            knee = find_knee(results)
+            self.assertLessEqual(
+                abs(knee['params']['deploy_batch_size'] - 20), 4)
+
+    def test_latency_limit(self):
+        runner = SaturatingRunner(1)
+        runner.adaptive(
+            'deploy_batch_size', 16, 1000, latency_limit=0.2, refine_steps=0)
+        self.assertEqual([16, 32], runner.runs)
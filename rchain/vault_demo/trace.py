@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import struct
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Set)
+
+from structlog.stdlib import BoundLogger as Logger
+
+from .common import Transfer
+from .user import User, UserDeployError
+
+if TYPE_CHECKING:
+    from .node import Node
+
+# Trace file layout: a header followed by fixed size records of (seconds since
+# the start of the trace, kind, node index, sender index, recipient index,
+# amount, deploy timestamp). Node and REV addresses are interned into a
+# sidecar file like in transfer ledgers. Propose records only have a node.
+MAGIC = b'VDTRAC01'
+RECORD = struct.Struct('<dBIIIqq')
+TRANSFER = 0
+PROPOSE = 1
+
+
+def _addrs_path(path: str) -> str:
+    return path + '.addrs'
+
+
+class TraceEvent(NamedTuple):
+    offset: float
+    node: str
+    # None for proposes.
+    transfer: Optional[Transfer]
+    ts: int
+
+
+class TraceWriter:
+
+    def __init__(self, path: str, buffer_size: int = 1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._addr_index: Dict[str, int] = {}
+        self._data_file = open(path, 'wb')
+        self._data_file.write(MAGIC)
+        self._addrs_file = open(_addrs_path(path), 'w')
+        self._buf = bytearray()
+        self._new_addrs: List[str] = []
+        self._start = time.monotonic()
+        self.count = 0
+
+    def _index(self, addr: str) -> int:
+        idx = self._addr_index.get(addr)
+        if idx is None:
+            idx = self._addr_index[addr] = len(self._addr_index)
+            self._new_addrs.append(addr)
+        return idx
+
+    def _append(
+            self, kind: int, node: str, sender: str, recipient: str,
+            amount: int, ts: int, sent_at: Optional[float]):
+        if sent_at is None:
+            sent_at = time.monotonic()
+        self._buf += RECORD.pack(
+            sent_at - self._start, kind, self._index(node),
+            self._index(sender), self._index(recipient), amount, ts)
+        self.count += 1
+        if len(self._buf) >= self.buffer_size:
+            self.flush()
+
+    # Events are recorded once they succeeded, but at the time.monotonic()
+    # they were sent, so that a replay sends them at the same pace. Records
+    # of concurrent deploys may then be slightly out of order.
+    def transfer(
+            self, node: str, transfer: Transfer, ts: int,
+            sent_at: Optional[float] = None):
+        self._append(
+            TRANSFER, node, transfer.sender, transfer.recipient,
+            transfer.amount, ts, sent_at)
+
+    def propose(self, node: str, sent_at: Optional[float] = None):
+        self._append(PROPOSE, node, node, node, 0, 0, sent_at)
+
+    def flush(self):
+        # Addresses must hit the disk before records that refer to them.
+        if self._new_addrs:
+            self._addrs_file.write(''.join(a + '\n' for a in self._new_addrs))
+            self._addrs_file.flush()
+            self._new_addrs.clear()
+        if self._buf:
+            self._data_file.write(self._buf)
+            self._data_file.flush()
+            self._buf.clear()
+
+    def close(self):
+        self.flush()
+        self._data_file.close()
+        self._addrs_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Reads records in chunks, so a trace never has to fit in memory. Only the
+# interned addresses are loaded up front.
+class TraceReader:
+
+    def __init__(self, path: str, chunk_records: int = 4096):
+        self.path = path
+        self.chunk_size = chunk_records * RECORD.size
+        self.addrs = Path(_addrs_path(path)).read_text().splitlines()
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f'{path} is not a transfer trace')
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        addrs = self.addrs
+        self._file.seek(len(MAGIC))
+        while True:
+            chunk = self._file.read(self.chunk_size)
+            # A record may have been cut short by a crash while writing.
+            chunk = chunk[:len(chunk) - len(chunk) % RECORD.size]
+            if not chunk:
+                return
+            for (offset, kind, node, sender, recipient, amount,
+                 ts) in RECORD.iter_unpack(chunk):
+                if kind == PROPOSE:
+                    yield TraceEvent(offset, addrs[node], None, 0)
+                else:
+                    yield TraceEvent(
+                        offset, addrs[node],
+                        Transfer(addrs[sender], addrs[recipient], amount), ts)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Re-issues a trace through the nodes' users at its recorded pace divided by
+# speed, or as fast as the nodes take it when speed is 0. Events are read one
+# at a time; at most max_inflight deploys are outstanding and reading waits
+# for a slot, which is what paces a replay at full speed. A propose waits for
+# the deploys its node was sent before it, as it did when recorded, and
+# proposes of a node don't overlap. Finished transfers are only summed up
+# into balance changes, a trace may not fit in memory.
+class TraceReplayer:
+
+    def __init__(
+            self,
+            nodes: List['Node'],
+            logger: Logger,
+            speed: float = 1.0,
+            max_inflight: int = 1000):
+        self.nodes = {n.config['address']: n for n in nodes}
+        self.users: Dict[str, User] = {
+            u.rev_addr: u
+            for n in nodes for u in n.users
+        }
+        self.logger = logger
+        self.speed = speed
+        self.max_inflight = max_inflight
+        self.finished = 0
+        self.balance_deltas: Dict[str, int] = defaultdict(int)
+        self.errors = 0
+        self.skipped = 0
+        self.lag = 0.0
+        self._propose_locks = {a: asyncio.Lock() for a in self.nodes}
+        self._pending: Dict[str, int] = {a: 0 for a in self.nodes}
+        self._deploys: Dict[str, Set[asyncio.Task]] = {
+            a: set()
+            for a in self.nodes
+        }
+
+    async def _deploy(
+            self, user: User, transfer: Transfer, ts: int,
+            inflight: asyncio.Semaphore):
+        try:
+            await user.replay_transfer(transfer, ts)
+        except UserDeployError:
+            self.errors += 1
+        else:
+            self.finished += 1
+            self.balance_deltas[transfer.sender] -= transfer.amount
+            self.balance_deltas[transfer.recipient] += transfer.amount
+            self._pending[user.node.config['address']] += 1
+        finally:
+            inflight.release()
+
+    async def _propose(
+            self, node: 'Node', deploys: Optional[Set[asyncio.Task]] = None):
+        address = node.config['address']
+        if deploys:
+            await asyncio.wait(deploys)
+        async with self._propose_locks[address]:
+            if not self._pending[address]:
+                return
+            proposed = self._pending[address]
+            self._pending[address] = 0
+            if await node.try_propose() is not None:
+                self.errors += 1
+                self._pending[address] += proposed
+
+    async def replay(self, events: Iterator[TraceEvent]) -> int:
+        evt_loop = asyncio.get_running_loop()
+        start_time = evt_loop.time()
+        inflight = asyncio.Semaphore(self.max_inflight)
+        tasks = set()
+
+        def spawn(coro) -> asyncio.Task:
+            t = asyncio.create_task(coro)
+            tasks.add(t)
+            t.add_done_callback(tasks.discard)
+            return t
+
+        try:
+            for event in events:
+                if self.speed:
+                    due = start_time + event.offset / self.speed
+                    delay = due - evt_loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        self.lag = max(self.lag, -delay)
+                if event.transfer is None:
+                    node = self.nodes.get(event.node)
+                    if node is not None:
+                        spawn(
+                            self._propose(
+                                node, set(self._deploys[event.node])))
+                    continue
+                user = self.users.get(event.transfer.sender)
+                if user is None:
+                    self.skipped += 1
+                    continue
+                await inflight.acquire()
+                t = spawn(
+                    self._deploy(user, event.transfer, event.ts, inflight))
+                deploys = self._deploys[user.node.config['address']]
+                deploys.add(t)
+                t.add_done_callback(deploys.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+        # Deploys that finished after the last recorded propose of their node.
+        await asyncio.gather(*(self._propose(n) for n in self.nodes.values()))
+        elapsed = evt_loop.time() - start_time
+        self.logger.info(
+            'Replayed %d transfers in %.1fs (%.1f/s), %d errors, %d skipped '
+            'for unknown senders, max lag %.3fs', self.finished, elapsed,
+            self.finished / elapsed if elapsed else 0.0, self.errors,
+            self.skipped, self.lag)
+        return self.finished
+
+    def expected_balances(self, initial: Dict[str, int]) -> Dict[str, int]:
+        balances = dict(initial)
+        for (rev_addr, delta) in self.balance_deltas.items():
+            balances[rev_addr] = balances.get(rev_addr, 0) + delta
+        return balances
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print a transfer trace as JSON lines')
+    parser.add_argument('trace')
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    with TraceReader(args.trace) as reader:
+        for i, event in enumerate(reader):
+            if args.limit is not None and i >= args.limit:
+                break
+            record = {'offset': event.offset, 'node': event.node}
+            if event.transfer is None:
+                record['kind'] = 'propose'
+            else:
+                record.update(
+                    kind='transfer',
+                    sender=event.transfer.sender,
+                    recipient=event.transfer.recipient,
+                    amount=event.transfer.amount,
+                    ts=event.ts)
+            print(json.dumps(record))
+
+
+if __name__ == '__main__':
+    main()
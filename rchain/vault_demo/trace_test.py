@@ -0,0 +1,180 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+import structlog
+from rchain.client import RClientException
+
+from .common import Transfer
+from .trace import RECORD, TraceReader, TraceReplayer, TraceWriter
+from .user import User, UserDeployError
+from .world import World
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.deploys = []
+
+    async def deploy(self, key, contract, ts=None):
+        self.deploys.append(ts)
+
+
+class FailingClient:
+
+    async def deploy(self, key, contract, ts=None):
+        if ts % 2 == 0:
+            raise RClientException('Injected deploy failure')
+
+
+class SlowClient:
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def deploy(self, key, contract, ts=None):
+        await asyncio.sleep(self.latency)
+
+
+class FakeNode:
+
+    def __init__(self, address: str, user_count: int):
+        self.config = {'address': address}
+        self.client = FakeClient()
+        self.router = None
+        self.trace = None
+        self.ledger = None
+        self.proposes = 0
+        self.users = [
+            User({
+                'key': f'{i + 1:064x}',
+                'rev_addr': f'{address}/user{i}',
+                'initial_balance': 1000,
+                'deploy_time_limit': 5,
+            }, self, structlog.get_logger()) for i in range(user_count)
+        ]
+
+    async def try_propose(self):
+        self.proposes += 1
+        if self.trace is not None:
+            self.trace.propose(self.config['address'])
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'trace')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        with TraceWriter(self.path, buffer_size=RECORD.size) as writer:
+            for i in range(10):
+                writer.transfer('n0', Transfer(f'a{i % 3}', 'b', i), i + 1)
+            writer.propose('n0')
+        # A record cut short by a crash is ignored.
+        with open(self.path, 'ab') as f:
+            f.write(b'\0' * (RECORD.size // 2))
+        with TraceReader(self.path, chunk_records=3) as reader:
+            events = list(reader)
+        self.assertEqual(11, len(events))
+        self.assertEqual(Transfer('a1', 'b', 4), events[4].transfer)
+        self.assertEqual(5, events[4].ts)
+        self.assertEqual('n0', events[4].node)
+        self.assertIsNone(events[10].transfer)
+        offsets = [e.offset for e in events]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def _record(self, nodes):
+        with TraceWriter(self.path) as writer:
+            for n in nodes:
+                n.trace = writer
+
+            async def run():
+                for i in range(3):
+                    for n in nodes:
+                        for u in n.users:
+                            recipient = nodes[0].users[0].rev_addr
+                            await u.replay_transfer(
+                                Transfer(u.rev_addr, recipient, 10), i + 1)
+                        await n.try_propose()
+                    await asyncio.sleep(0.02)
+
+            asyncio.run(run())
+            for n in nodes:
+                n.trace = None
+
+    def test_replay(self):
+        self._record([FakeNode('n0', 2), FakeNode('n1', 3)])
+        for speed in (0, 1, 4):
+            nodes = [FakeNode('n0', 2), FakeNode('n1', 3)]
+            replayer = TraceReplayer(
+                nodes, structlog.get_logger(), speed, max_inflight=2)
+            start = time.monotonic()
+            with TraceReader(self.path) as reader:
+                finished = asyncio.run(replayer.replay(iter(reader)))
+            elapsed = time.monotonic() - start
+            self.assertEqual(15, finished)
+            balances = replayer.expected_balances({'n0/user0': 1000})
+            self.assertEqual(1000 + 120, balances['n0/user0'])
+            self.assertEqual(-30, balances['n1/user2'])
+            self.assertEqual([1, 2, 3], nodes[1].client.deploys[::3])
+            self.assertEqual(3, nodes[0].proposes)
+            self.assertEqual(3, nodes[1].proposes)
+            self.assertEqual(970, nodes[1].users[0].balance)
+            self.assertEqual(3, nodes[1].users[0].deploy_counter)
+            if speed == 1:
+                self.assertGreaterEqual(elapsed, 0.04)
+
+    def test_unknown_sender_skipped(self):
+        self._record([FakeNode('n0', 2), FakeNode('n1', 3)])
+        nodes = [FakeNode('n0', 2)]
+        replayer = TraceReplayer(nodes, structlog.get_logger(), 0)
+        with TraceReader(self.path) as reader:
+            self.assertEqual(6, asyncio.run(replayer.replay(iter(reader))))
+        self.assertEqual(9, replayer.skipped)
+
+    def test_failed_deploys_not_recorded(self):
+        node = FakeNode('n0', 1)
+        node.client = FailingClient()
+        user = node.users[0]
+
+        async def run():
+            for i in range(4):
+                try:
+                    await user.replay_transfer(
+                        Transfer(user.rev_addr, 'b', 10), i + 1)
+                except UserDeployError:
+                    pass
+
+        with TraceWriter(self.path) as writer:
+            node.trace = writer
+            asyncio.run(run())
+        with TraceReader(self.path) as reader:
+            self.assertEqual([1, 3], [e.ts for e in reader])
+
+    def test_offset_at_send_time(self):
+        node = FakeNode('n0', 1)
+        node.client = SlowClient(0.1)
+        user = node.users[0]
+        with TraceWriter(self.path) as writer:
+            node.trace = writer
+            asyncio.run(
+                user.replay_transfer(Transfer(user.rev_addr, 'b', 10), 1))
+        with TraceReader(self.path) as reader:
+            (event, ) = list(reader)
+        self.assertLess(event.offset, 0.05)
+
+    def test_record_into_replayed_trace(self):
+        config = {
+            'rng_seed': 1,
+            'admin_key': '1' * 64,
+            'trace_path': self.path,
+            'replay_trace': os.path.join(self.tmpdir.name, '.', 'trace'),
+        }
+        with self.assertRaises(ValueError):
+            World(config)
@@ -1,15 +1,18 @@
 import asyncio
+import time
 from dataclasses import dataclass
 from random import Random
-from typing import List
+from typing import List, Optional, Tuple
 
 import grpc
 from rchain.client import RClientException
 from rchain.crypto import PrivateKey
-from rchain.util import load_contract
 from structlog.stdlib import BoundLogger as Logger
 
 from .common import Transfer, VaultDemoException
+from .contracts import TRANSFER
+from .metrics import REGISTRY, Counter
+from .presign import PresignedTransfers, Presigner
 
 
 @dataclass
@@ -23,56 +26,199 @@ class UserDeployTimeoutError(UserDeployError):
 
 class User:
 
+    __slots__ = (
+        'node', 'config', 'rev_addr', 'balance', 'deploy_counter', '_rng',
+        '_key', '_logger', '_parent_logger', '_deploys', '_presigned')
+
     def __init__(self, config: dict, node: 'Node', parent_logger: Logger):
         self.node = node
         self.config = config
-        self.rng = Random(self.config['rng_seed'])
-        self.key = PrivateKey.from_hex(self.config['key'])
-        self.rev_addr = self.key.get_public_key().get_address()
+        self._rng: Optional[Random] = None
+        self._key: Optional[PrivateKey] = None
+        self._logger: Optional[Logger] = None
+        self._parent_logger = parent_logger
+        self._deploys: Optional[Counter] = None
+        self._presigned: Optional[PresignedTransfers] = None
+        # Deriving the address is the expensive part of constructing a user,
+        # generated configs carry it precomputed.
+        self.rev_addr = self.config.get('rev_addr') or \
+            self.key.get_public_key().get_address()
         self.balance = self.config['initial_balance']
-        self.logger = parent_logger.bind(rev_addr=self.rev_addr)
         self.deploy_counter = 0
 
-    async def _deploy_transfer(self, recipient: str, amount: int):
-        contract = load_contract(
-            'rchain.vault', 'transfer.rho.tpl', {
-                'from': self.rev_addr,
-                'to': recipient,
-                'amount': amount
-            })
+    # Every Random carries a few KiB of Mersenne Twister state, so it's only
+    # seeded once the user starts deploying.
+    @property
+    def rng(self) -> Random:
+        if self._rng is None:
+            self._rng = Random(self.config['rng_seed'])
+        return self._rng
+
+    # None until the user starts deploying.
+    def get_rng_state(self) -> Optional[tuple]:
+        return None if self._rng is None else self._rng.getstate()
+
+    def set_rng_state(self, state: Optional[tuple]):
+        if state is None:
+            self._rng = None
+        else:
+            self.rng.setstate(state)
+
+    @property
+    def key(self) -> PrivateKey:
+        if self._key is None:
+            self._key = PrivateKey.from_hex(self.config['key'])
+        return self._key
+
+    @property
+    def logger(self) -> Logger:
+        if self._logger is None:
+            self._logger = self._parent_logger.bind(rev_addr=self.rev_addr)
+        return self._logger
+
+    def _count_error(self, error: UserDeployError):
+        REGISTRY.counter(
+            'deploy_errors',
+            node=self.node.config['address'],
+            user=self.rev_addr,
+            error=type(error).__name__).inc()
+
+    async def _send_transfer(self, transfer: Transfer, ts: int):
+        client = self.node.router or self.node.client
+        if self._presigned is not None:
+            deploy_data = await self._presigned.take(transfer, ts)
+            if deploy_data is not None:
+                return await client.deploy_signed(deploy_data)
+            REGISTRY.counter(
+                'presign_misses', node=self.node.config['address']).inc()
+        contract = TRANSFER.render(
+            transfer.sender, transfer.recipient, transfer.amount)
+        return await client.deploy(self.key, contract, ts=ts)
+
+    async def _deploy_transfer(self, transfer: Transfer, ts: int):
+        # The amount is reserved by the caller before the deploy is sent so
+        # that transfers in flight are accounted for when clamping amounts of
+        # the following ones. Give it back if the deploy doesn't go through.
+        sent_at = time.monotonic()
         try:
-            self.deploy_counter += 1
             await asyncio.wait_for(
-                self.node.client.deploy(
-                    self.key, contract, ts=self.deploy_counter),
+                self._send_transfer(transfer, ts),
                 self.config['deploy_time_limit'])
-            self.balance -= amount
         except asyncio.TimeoutError:
-            raise UserDeployTimeoutError(self) from None
+            self.balance += transfer.amount
+            error = UserDeployTimeoutError(self)
+            self._count_error(error)
+            raise error from None
         except (IOError, grpc.RpcError, RClientException) as e:
-            raise UserDeployError(self)
+            self.balance += transfer.amount
+            error = UserDeployError(self)
+            self._count_error(error)
+            raise error
+        except BaseException:
+            self.balance += transfer.amount
+            raise
+        # Only deploys the node accepted are traced, a replay sends exactly
+        # the transfers that were finished.
+        if self.node.trace is not None:
+            self.node.trace.transfer(
+                self.node.config['address'], transfer, ts, sent_at)
+        if self._deploys is None:
+            self._deploys = REGISTRY.counter(
+                'deploys', node=self.node.config['address'], user=self.rev_addr)
+        self._deploys.inc()
 
-    async def deploy_random_transfers(self, recipients: List[str]) -> List[Transfer]:
-        transfer_batch_size = self.rng.randint(
+    def _draw_batch_size(self, rng: Random) -> int:
+        return rng.randint(
             self.config['deploy_batch_min_size'],
             self.config['deploy_batch_max_size'])
+
+    def _draw_transfer(
+            self, rng: Random, balance: int,
+            recipients: List[str]) -> Transfer:
+        recipient = rng.choice(recipients)
+        transfer_amount = min(
+            balance,
+            rng.randint(
+                self.config['transfer_min_amount'],
+                self.config['transfer_max_amount']))
+        return Transfer(self.rev_addr, recipient, transfer_amount)
+
+    # Draws the next random transfer and reserves its amount. Timestamps and
+    # reservations are assigned in issue order, so they stay monotonic no
+    # matter in which order deploys finish.
+    def _next_transfer(self, recipients: List[str]) -> Tuple[Transfer, int]:
+        transfer = self._draw_transfer(self.rng, self.balance, recipients)
+        self.deploy_counter += 1
+        self.balance -= transfer.amount
+        return (transfer, self.deploy_counter)
+
+    # Predicts the next batch of transfers on a copy of the rng and starts
+    # signing their deploys. The rng itself isn't touched, so the transfers
+    # actually deployed stay the same for a given seed; predictions that turn
+    # out wrong are signed again when deployed.
+    def presign_next_batch(self, recipients: List[str], presigner: Presigner):
+        if self._presigned is not None:
+            self._presigned.cancel()
+        rng = Random()
+        rng.setstate(self.rng.getstate())
+        balance = self.balance
+        transfers = []
+        for i in range(self._draw_batch_size(rng)):
+            transfer = self._draw_transfer(rng, balance, recipients)
+            balance -= transfer.amount
+            transfers.append((transfer, self.deploy_counter + i + 1))
+        self._presigned = presigner.sign(self.config['key'], transfers)
+
+    async def deploy_random_transfer(self, recipients: List[str]) -> Transfer:
+        (transfer, ts) = self._next_transfer(recipients)
+        await self._deploy_transfer(transfer, ts)
+        return transfer
+
+    # Deploys a transfer read from a trace instead of a random one.
+    async def replay_transfer(self, transfer: Transfer, ts: int):
+        self.deploy_counter = max(self.deploy_counter, ts)
+        self.balance -= transfer.amount
+        await self._deploy_transfer(transfer, ts)
+
+    async def deploy_random_transfers(self, recipients: List[str]) -> List[Transfer]:
+        transfer_batch_size = self._draw_batch_size(self.rng)
         self.logger.info('Deploying %s random transfers', transfer_batch_size)
         self.logger.info(
             'Expected balance (before transfers): %d', self.balance)
-        finished_transfers = []
-        for _ in range(0, transfer_batch_size):
-            recipient = self.rng.choice(recipients)
-            transfer_amount = min(
-                self.balance,
-                self.rng.randint(
-                    self.config['transfer_min_amount'],
-                    self.config['transfer_max_amount']))
-            self.logger.info(
-                'Deploying transfer of %d REV to %s', transfer_amount,
-                recipient)
-            await self._deploy_transfer(recipient, transfer_amount)
-            finished_transfers.append(
-                Transfer(self.rev_addr, recipient, transfer_amount))
+
+        inflight = asyncio.Semaphore(self.config.get('deploy_max_inflight', 1))
+        results = [None] * transfer_batch_size
+        errors = []
+
+        async def deploy(i: int, transfer: Transfer, ts: int):
+            try:
+                await self._deploy_transfer(transfer, ts)
+                results[i] = transfer
+            except UserDeployError as e:
+                errors.append(e)
+            finally:
+                inflight.release()
+
+        tasks = []
+        try:
+            for i in range(0, transfer_batch_size):
+                await inflight.acquire()
+                if errors:
+                    inflight.release()
+                    break
+                (transfer, ts) = self._next_transfer(recipients)
+                self.logger.info(
+                    'Deploying transfer of %d REV to %s', transfer.amount,
+                    transfer.recipient)
+                tasks.append(asyncio.create_task(deploy(i, transfer, ts)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+
+        if errors:
+            raise errors[0]
         self.logger.info(
             'Expected balance (after transfers):  %d', self.balance)
-        return finished_transfers
+        return [t for t in results if t is not None]
@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+
+import structlog
+from rchain.client import RClientException
+
+from .user import User, UserDeployError
+
+USER_CONFIG = {
+    'key': '1' * 64,
+    'rev_addr': '1111sender',
+    'rng_seed': 7,
+    'initial_balance': 1000,
+    'transfer_min_amount': 10,
+    'transfer_max_amount': 10,
+    'deploy_batch_min_size': 6,
+    'deploy_batch_max_size': 6,
+    'deploy_max_inflight': 3,
+    'deploy_time_limit': 5,
+}
+
+
+# Deploys take the given time by timestamp and fail for the given ones.
+class FakeClient:
+
+    def __init__(self, latencies: dict, failing: set):
+        self.latencies = latencies
+        self.failing = failing
+        self.sent = []
+        self.finished = []
+        self.in_flight = 0
+
+    async def deploy(self, key, contract, ts=None):
+        self.sent.append(ts)
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latencies.get(ts, 0.01))
+            if ts in self.failing:
+                raise RClientException('Injected deploy failure')
+            self.finished.append(ts)
+        finally:
+            self.in_flight -= 1
+
+
+class FakeNode:
+
+    def __init__(self, client: FakeClient):
+        self.config = {'address': 'user-test'}
+        self.client = client
+        self.router = None
+        self.trace = None
+
+
+class TestUser(unittest.TestCase):
+
+    def _user(self, client: FakeClient) -> User:
+        return User(
+            dict(USER_CONFIG), FakeNode(client), structlog.get_logger())
+
+    def test_out_of_order_completion(self):
+        client = FakeClient({1: 0.05, 2: 0.03, 3: 0.01}, set())
+        user = self._user(client)
+        transfers = asyncio.run(user.deploy_random_transfers(['a']))
+        self.assertEqual(6, len(transfers))
+        self.assertNotEqual(client.sent, client.finished)
+        self.assertEqual([1, 2, 3, 4, 5, 6], client.sent)
+        self.assertEqual(940, user.balance)
+        self.assertEqual(6, user.deploy_counter)
+
+    def test_failure_with_deploys_in_flight(self):
+        client = FakeClient({1: 0.05, 2: 0.01, 3: 0.05}, {2})
+        user = self._user(client)
+
+        async def test():
+            with self.assertRaises(UserDeployError):
+                await user.deploy_random_transfers(['a'])
+            # Raised once the deploys sent before the failure settled.
+            self.assertEqual(0, client.in_flight)
+
+        asyncio.run(test())
+        # No deploys are started after the failure.
+        self.assertEqual([1, 2, 3], client.sent)
+        self.assertEqual([1, 3], sorted(client.finished))
+        # The failed transfer's amount was given back.
+        self.assertEqual(980, user.balance)
+
+        # Timestamps keep increasing after a failed batch.
+        client.failing = set()
+        asyncio.run(user.deploy_random_transfers(['a']))
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7, 8, 9], client.sent)
+        self.assertEqual(920, user.balance)
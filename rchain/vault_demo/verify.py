@@ -0,0 +1,214 @@
+import asyncio
+import re
+from dataclasses import asdict, dataclass, field
+from string import Template
+from typing import Dict, Iterable, List, Optional
+
+from rchain.crypto import PrivateKey
+
+from .common import AsyncRClient, Transfer
+from .contracts import GET_BALANCE
+from .resolver import DeployResolver, DeployResolveTimeoutError
+
+# Looks up balances of all addresses in one deploy. Every balance is sent to
+# deployId as an (addr, balance) tuple, so they can be told apart regardless
+# of the order in which they arrive.
+GET_BALANCES_RHO_TPL = Template('''
+new rl(`rho:registry:lookup`), RevVaultCh, loop,
+    deployId(`rho:rchain:deployId`) in {
+  rl!(`rho:rchain:revVault`, *RevVaultCh) |
+  for (@(_, RevVault) <- RevVaultCh) {
+    contract loop(@addrs) = {
+      match addrs {
+        [] => Nil
+        [addr ...rest] => {
+          new vaultCh, balanceCh in {
+            @RevVault!("findOrCreate", addr, *vaultCh) |
+            for (@(true, vault) <- vaultCh) {
+              @vault!("balance", *balanceCh) |
+              for (@balance <- balanceCh) {
+                deployId!((addr, balance))
+              }
+            }
+          } |
+          loop!(rest)
+        }
+      }
+    } |
+    loop!([$addrs])
+  }
+}
+''')
+
+
+def render_get_balances(rev_addrs: List[str]) -> str:
+    return GET_BALANCES_RHO_TPL.substitute(
+        addrs=', '.join(f'"{a}"' for a in rev_addrs))
+
+
+_GET_BALANCES_AFFIXES = GET_BALANCES_RHO_TPL.substitute(
+    addrs='\x00').split('\x00')
+
+
+def parse_get_balances(contract: str) -> Optional[List[str]]:
+    (prefix, suffix) = _GET_BALANCES_AFFIXES
+    if not (contract.startswith(prefix) and contract.endswith(suffix)):
+        return None
+    return re.findall(r'"([^"]*)"', contract[len(prefix):-len(suffix)])
+
+
+def parse_balance(data) -> Optional[int]:
+    if data is None or not data.blockResults or \
+            not data.blockResults[0].postBlockData:
+        return None
+    return data.blockResults[0].postBlockData[0].exprs[0].g_int
+
+
+def parse_balances(data) -> Dict[str, int]:
+    if data is None or not data.blockResults:
+        return {}
+    balances = {}
+    for par in data.blockResults[0].postBlockData:
+        (addr, balance) = par.exprs[0].e_tuple_body.ps
+        balances[addr.exprs[0].g_string] = balance.exprs[0].g_int
+    return balances
+
+
+# Balances after the given transfers. User.balance can't stand in for this,
+# it only accounts for what a user has sent.
+def expected_balances(
+        initial: Dict[str, int],
+        transfers: Iterable[Transfer]) -> Dict[str, int]:
+    balances = dict(initial)
+    for tf in transfers:
+        balances[tf.sender] = balances.get(tf.sender, 0) - tf.amount
+        balances[tf.recipient] = balances.get(tf.recipient, 0) + tf.amount
+    return balances
+
+
+@dataclass
+class BalanceDiff:
+    rev_addr: str
+    expected: int
+    actual: Optional[int]
+
+    @property
+    def ok(self) -> bool:
+        return self.expected == self.actual
+
+
+@dataclass
+class BalanceReport:
+    diffs: List[BalanceDiff] = field(default_factory=list)
+
+    @property
+    def mismatches(self) -> List[BalanceDiff]:
+        return [d for d in self.diffs if not d.ok and d.actual is not None]
+
+    @property
+    def missing(self) -> List[BalanceDiff]:
+        return [d for d in self.diffs if d.actual is None]
+
+    @property
+    def ok(self) -> bool:
+        return all(d.ok for d in self.diffs)
+
+    def to_dict(self) -> dict:
+        return {
+            'checked': len(self.diffs),
+            'matched': len(self.diffs) - len(self.mismatches) -
+            len(self.missing),
+            'mismatches': [asdict(d) for d in self.mismatches],
+            'missing': [d.rev_addr for d in self.missing],
+        }
+
+
+# Without propose, the query deploys are only answered once another party
+# proposes a block including them, so a resolver with a timeout long enough
+# for that is needed.
+class BalanceVerifier:
+
+    def __init__(
+            self,
+            client: AsyncRClient,
+            key: PrivateKey,
+            mode: str = 'combined',
+            batch_size: int = 500,
+            concurrency: int = 32,
+            resolver: Optional[DeployResolver] = None,
+            propose: bool = True):
+        if mode not in ('combined', 'concurrent'):
+            raise ValueError(f'Unknown verification mode: {mode}')
+        self.client = client
+        self.key = key
+        self.mode = mode
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.resolver = resolver
+        self.propose = propose
+
+    async def _gather_limited(self, coros) -> list:
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def limited(coro):
+            async with sem:
+                return await coro
+
+        return await asyncio.gather(*(limited(c) for c in coros))
+
+    # Without a resolver the data is looked up once, deploys whose block isn't
+    # available yet are reported as missing. The resolver bounds concurrency
+    # of its lookups on its own.
+    async def _get_data(self, deploy_ids: list) -> list:
+        if self.resolver is None:
+            return await self._gather_limited(
+                self.client.get_data_at_deploy_id(d) for d in deploy_ids)
+        results = await asyncio.gather(
+            *(self.resolver.resolve(d) for d in deploy_ids),
+            return_exceptions=True)
+        for r in results:
+            if isinstance(r, BaseException) and \
+                    not isinstance(r, DeployResolveTimeoutError):
+                raise r
+        return [None if isinstance(r, BaseException) else r for r in results]
+
+    async def _fetch_combined(self, rev_addrs: List[str]) -> Dict[str, int]:
+        batches = [
+            rev_addrs[i:i + self.batch_size]
+            for i in range(0, len(rev_addrs), self.batch_size)
+        ]
+        deploy_ids = await self._gather_limited(
+            self.client.deploy(self.key, render_get_balances(b))
+            for b in batches)
+        if self.propose:
+            await self.client.propose()
+        results = await self._get_data(deploy_ids)
+        balances = {}
+        for data in results:
+            balances.update(parse_balances(data))
+        return balances
+
+    async def _fetch_concurrent(self, rev_addrs: List[str]) -> Dict[str, int]:
+        deploy_ids = await self._gather_limited(
+            self.client.deploy(self.key, GET_BALANCE.render(a))
+            for a in rev_addrs)
+        if self.propose:
+            await self.client.propose()
+        results = await self._get_data(deploy_ids)
+        return {
+            a: bal
+            for a, bal in zip(rev_addrs, map(parse_balance, results))
+            if bal is not None
+        }
+
+    async def fetch_balances(self, rev_addrs: List[str]) -> Dict[str, int]:
+        if self.mode == 'combined':
+            return await self._fetch_combined(rev_addrs)
+        return await self._fetch_concurrent(rev_addrs)
+
+    async def verify(self, expected: Dict[str, int]) -> BalanceReport:
+        actual = await self.fetch_balances(list(expected))
+        return BalanceReport([
+            BalanceDiff(addr, bal, actual.get(addr))
+            for addr, bal in expected.items()
+        ])
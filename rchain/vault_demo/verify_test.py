@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+
+import grpc
+from rchain.crypto import PrivateKey
+from rchain.pb.DeployService_pb2 import ListeningNameDataResponse
+
+from .aio_client import AioRClient
+from .common import Transfer
+from .resolver import DeployResolver
+from .stub_node import start_server
+from .verify import (
+    BalanceDiff, BalanceReport, BalanceVerifier, expected_balances)
+
+
+# Deploys mentioning the lost address never get their data, as if their block
+# wasn't available on the node.
+class LossyClient:
+
+    def __init__(self, client: AioRClient, lost: str):
+        self.client = client
+        self.lost = lost
+        self.lost_ids = set()
+
+    async def deploy(self, key, contract, ts=None):
+        deploy_id = await self.client.deploy(key, contract, ts)
+        if f'"{self.lost}"' in contract:
+            self.lost_ids.add(deploy_id)
+        return deploy_id
+
+    async def propose(self):
+        await self.client.propose()
+
+    async def get_data_at_deploy_id(self, deploy_id: bytes):
+        if deploy_id in self.lost_ids:
+            return ListeningNameDataResponse(length=0)
+        return await self.client.get_data_at_deploy_id(deploy_id)
+
+
+class TestExpectedBalances(unittest.TestCase):
+
+    def test_incoming_transfers(self):
+        initial = {'a': 100, 'b': 100, 'c': 100}
+        transfers = [
+            Transfer('a', 'b', 30),
+            Transfer('b', 'c', 10),
+            Transfer('c', 'a', 5),
+            Transfer('a', 'b', 1),
+        ]
+        self.assertEqual({
+            'a': 74,
+            'b': 121,
+            'c': 105
+        }, expected_balances(initial, transfers))
+        self.assertEqual(100, initial['a'])
+
+    def test_report(self):
+        report = BalanceReport([
+            BalanceDiff('a', 74, 74),
+            BalanceDiff('b', 121, 100),
+            BalanceDiff('c', 105, None),
+        ])
+        self.assertEqual(['b'], [d.rev_addr for d in report.mismatches])
+        self.assertEqual(['c'], [d.rev_addr for d in report.missing])
+
+
+class TestBalanceVerifier(unittest.TestCase):
+
+    def _verify(self, mode: str, resolve: bool = False) -> BalanceReport:
+        # The lost address gets a combined query of its own.
+        expected = {'a': 10, 'b': 20, 'd': 0, 'c': 30}
+
+        async def test():
+            (server, node) = await start_server('127.0.0.1:0')
+            node.ledger.vaults.update({'a': 10, 'b': 25, 'c': 30})
+            try:
+                async with grpc.aio.insecure_channel(
+                        f'127.0.0.1:{node.port}') as channel:
+                    client = LossyClient(AioRClient(channel), 'c')
+                    resolver = None
+                    if resolve:
+                        resolver = DeployResolver(
+                            client, min_backoff=0.01, timeout=0.2)
+                        resolver.start()
+                    verifier = BalanceVerifier(
+                        client,
+                        PrivateKey.from_hex('1' * 64),
+                        mode,
+                        batch_size=3,
+                        resolver=resolver)
+                    try:
+                        return await verifier.verify(expected)
+                    finally:
+                        if resolver is not None:
+                            await resolver.close()
+            finally:
+                await server.stop(None)
+
+        return asyncio.run(test())
+
+    def test_modes(self):
+        for (mode, resolve) in (('combined', False), ('concurrent', False),
+                                ('concurrent', True)):
+            with self.subTest(mode=mode, resolve=resolve):
+                # With a resolver, the lost lookup times out.
+                report = self._verify(mode, resolve)
+                self.assertEqual(4, len(report.diffs))
+                self.assertEqual(
+                    [BalanceDiff('b', 20, 25)], report.mismatches)
+                # Missing results aren't taken for zero balances.
+                self.assertEqual(
+                    [BalanceDiff('c', 30, None)], report.missing)
+                self.assertEqual(BalanceDiff('d', 0, 0), report.diffs[2])
+                self.assertFalse(report.ok)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            BalanceVerifier(None, None, 'other')
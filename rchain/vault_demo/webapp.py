@@ -1,11 +1,128 @@
+import argparse
 import asyncio
+import json
+import os
+from pathlib import Path
 from typing import Optional
 
-from quart import jsonify, make_response, Quart, render_template, request
+from quart import Quart, make_response, render_template
+
+from .broadcast import Broadcaster
+from .world import World
 
 app = Quart(__name__)
-app.clients = set()
+app.broadcaster = Broadcaster()
+app.background_tasks = []
+
+
+class ServerSentEvent:
+
+    def __init__(
+            self,
+            data: str,
+            *,
+            event: Optional[str]=None,
+            id: Optional[int]=None,
+            retry: Optional[int]=None,
+    ) -> None:
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+
+    def encode(self) -> bytes:
+        message = f"data: {self.data}"
+        if self.event is not None:
+            message = f"{message}\nevent: {self.event}"
+        if self.id is not None:
+            message = f"{message}\nid: {self.id}"
+        if self.retry is not None:
+            message = f"{message}\nretry: {self.retry}"
+        message = f"{message}\r\n\r\n"
+        return message.encode('utf-8')
+
+
+@app.before_serving
+async def start_simulation():
+    app.background_tasks.append(
+        asyncio.ensure_future(app.broadcaster.run()))
+    config_path = app.config.get(
+        'SIMULATION_CONFIG', os.environ.get('VAULT_DEMO_CONFIG'))
+    if config_path:
+        config = json.loads(Path(config_path).read_text())
+        # Balances read from the nodes are shown next to the expected ones.
+        if app.config.get('MONITOR_INTERVAL'):
+            config['monitor_interval'] = app.config['MONITOR_INTERVAL']
+        world = World(config)
+        world.events = app.broadcaster
+        task = asyncio.ensure_future(world.main())
+        task.add_done_callback(_simulation_done)
+        app.background_tasks.append(task)
+
+
+def _simulation_done(task: asyncio.Future):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        World.logger.error(
+            'Simulation failed',
+            exc_info=(type(error), error, error.__traceback__))
+        app.broadcaster.publish_failure(f'{type(error).__name__}: {error}')
+
+
+@app.after_serving
+async def stop_simulation():
+    for t in app.background_tasks:
+        t.cancel()
+
+
+@app.route('/', methods=['GET'])
+async def index():
+    return await render_template('index.html')
+
+
+@app.route('/sse')
+async def sse():
+
+    async def send_events():
+        # The generator is closed when the client disconnects, the queue must
+        # go with it. Subscribing in here means a client that leaves before
+        # the first event never leaves a queue behind.
+        queue = app.broadcaster.subscribe()
+        try:
+            while True:
+                data = await queue.get()
+                yield ServerSentEvent(data, event='batch').encode()
+        finally:
+            app.broadcaster.unsubscribe(queue)
+
+    response = await make_response(
+        send_events(),
+        {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Transfer-Encoding': 'chunked',
+        },
+    )
+    response.timeout = None
+    return response
+
 
-def create_redis():
-    url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
-    return redis.Redis.from_url(url, decode_responses=True)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the simulation with a live dashboard')
+    parser.add_argument('config', nargs='?', help='World config (JSON)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument(
+        '--monitor-interval',
+        type=float,
+        help='also show vault balances read from the nodes, refreshed at '
+        'this interval')
+    args = parser.parse_args()
+    if args.config:
+        app.config['SIMULATION_CONFIG'] = args.config
+    if args.monitor_interval:
+        app.config['MONITOR_INTERVAL'] = args.monitor_interval
+    app.run(host=args.host, port=args.port)
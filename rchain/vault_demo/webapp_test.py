@@ -0,0 +1,56 @@
+import asyncio
+import json
+import unittest
+
+from . import webapp
+from .broadcast import Broadcaster
+
+
+class TestWebapp(unittest.TestCase):
+
+    def setUp(self):
+        self.broadcaster = webapp.app.broadcaster
+        webapp.app.broadcaster = Broadcaster()
+
+    def tearDown(self):
+        webapp.app.broadcaster = self.broadcaster
+
+    def test_sse_subscription(self):
+        broadcaster = webapp.app.broadcaster
+
+        async def test():
+            async with webapp.app.test_request_context('/sse'):
+                response = await webapp.sse()
+                # A client that never reads doesn't leave a queue behind.
+                self.assertEqual(set(), broadcaster.clients)
+                async with response.response as body:
+                    events = body.__aiter__()
+                    event = asyncio.ensure_future(events.__anext__())
+                    await asyncio.sleep(0)
+                    self.assertEqual(1, len(broadcaster.clients))
+                    broadcaster.publish_balance('a', 1)
+                    broadcaster.flush()
+                    data = (await event).decode()
+                self.assertEqual(set(), broadcaster.clients)
+            return data
+
+        data = asyncio.run(test())
+        self.assertTrue(data.startswith('data: '))
+        batch = json.loads(data[len('data: '):data.index('\n')])
+        self.assertEqual({'a': 1}, batch['balances'])
+
+    def test_simulation_failure(self):
+
+        async def fail():
+            raise RuntimeError('boom')
+
+        async def test():
+            task = asyncio.ensure_future(fail())
+            task.add_done_callback(webapp._simulation_done)
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(test())
+        self.assertEqual(
+            'RuntimeError: boom',
+            webapp.app.broadcaster._take_batch()['failure'])
@@ -2,18 +2,38 @@ import asyncio
 import sys
 import contextlib
 import json
-import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from random import Random
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import structlog
 from rchain.crypto import PrivateKey
-from rchain.util import load_contract
 
 from .node import Node
 from .user import User
-from .common import AsyncRClient
+from .common import AsyncRClient, Transfer
+from .contracts import CREATE_GENESIS_VAULT, TRANSFER
+from .funding import FundingState, VaultFunder
+from . import metrics
+from .broadcast import Broadcaster
+from .checkpoint import Checkpointer
+from .ledger import LedgerReader, LedgerWriter
+from .logconfig import configure_logging
+from .metrics_http import MetricsExporter
+from .monitor import BalanceMonitor, BroadcasterSink, SupplySink
+from .resolver import DeployResolver
+from .router import NodeRouter
+from .shard import run_shard, split_nodes
+from .trace import TraceReader, TraceReplayer, TraceWriter
+from .verify import BalanceReport, BalanceVerifier, expected_balances
+
+
+async def _cancel(task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
 
 
 class World:
@@ -25,6 +45,19 @@ class World:
         self.rng = Random(self.config['rng_seed'])
         self.admin_key = PrivateKey.from_hex(self.config['admin_key'])
         self.admin_rev_addr = self.admin_key.get_public_key().get_address()
+        self.events: Optional[Broadcaster] = None
+        # Recording would truncate the trace before it's replayed.
+        if self.config.get('trace_path') and \
+                self.config.get('replay_trace') and \
+                os.path.realpath(self.config['trace_path']) == \
+                os.path.realpath(self.config['replay_trace']):
+            raise ValueError(
+                'Cannot record a trace into the replayed trace '
+                f'{self.config["replay_trace"]}')
+        if self.config.get('open_loop_rate', 1) <= 0:
+            raise ValueError(
+                'open_loop_rate must be positive: '
+                f'{self.config["open_loop_rate"]}')
 
     async def _init_vaults(self, client: AsyncRClient, users: List[User]):
         # account for possible deploy fees for transfers from genesis vault by
@@ -35,11 +68,7 @@ class World:
             self.admin_rev_addr, balance)
         await client.deploy(
             self.admin_key,
-            contract=load_contract(
-                'rchain.vault', 'create_genesis_vault.rho.tpl', {
-                    'addr': self.admin_rev_addr,
-                    'balance': balance
-                }))
+            contract=CREATE_GENESIS_VAULT.render(self.admin_rev_addr, balance))
         await client.propose()
 
         for u in users:
@@ -48,79 +77,327 @@ class World:
                 u.rev_addr)
             await client.deploy(
                 self.admin_key,
-                contract=load_contract(
-                    'rchain.vault', 'transfer.rho.tpl', {
-                        'from': self.admin_rev_addr,
-                        'to': u.rev_addr,
-                        'amount': u.config['initial_balance']
-                    }))
+                contract=TRANSFER.render(
+                    self.admin_rev_addr, u.rev_addr,
+                    u.config['initial_balance']))
         await client.propose()
 
-    async def _get_user_balances(self, client: AsyncRClient, users: List[User]):
-        deploy_ids = [
-            await client.deploy(
-                self.admin_key,
-                contract=load_contract(
-                    'rchain.vault', 'get_balance.rho.tpl',
-                    {'addr': u.rev_addr})) for u in users
+    async def _init_vaults_bulk(self, nodes: List[Node], users: List[User]):
+        async with contextlib.AsyncExitStack() as stack:
+            # Funding deploys are proposed and checked on the node that
+            # received them.
+            verifiers = []
+            for n in nodes:
+                resolver = await stack.enter_async_context(
+                    DeployResolver(
+                        n.client,
+                        timeout=self.config.get('resolve_timeout', 60)))
+                verifiers.append(self._balance_verifier(n.client, resolver))
+            funder = VaultFunder(
+                verifiers, self.admin_key, self.logger,
+                FundingState(self.config.get('funding_state_path')),
+                self.config.get('funding_chunk_size', 200),
+                self.config.get('funding_concurrency', 8),
+                self.config.get('funding_max_rounds', 3))
+            await funder.fund(
+                {u.rev_addr: u.config['initial_balance']
+                 for u in users})
+
+    def _balance_verifier(
+            self, client: AsyncRClient,
+            resolver: DeployResolver) -> BalanceVerifier:
+        return BalanceVerifier(
+            client, self.admin_key, self.config.get('verify_mode', 'combined'),
+            self.config.get('verify_batch_size', 500),
+            self.config.get('verify_concurrency', 32), resolver)
+
+    async def _verify_balances(
+            self, client: AsyncRClient,
+            expected: Dict[str, int]) -> BalanceReport:
+        async with DeployResolver(
+                client,
+                timeout=self.config.get('resolve_timeout', 60)) as resolver:
+            verifier = self._balance_verifier(client, resolver)
+            self.logger.info(
+                'Verifying balances of %d users (%s)', len(expected),
+                verifier.mode)
+            return await verifier.verify(expected)
+
+    def _collect_metrics(
+            self, registry: metrics.MetricsRegistry, nodes: List[Node]):
+        for n in nodes:
+            registry.gauge(
+                'rpc_in_flight', node=n.config['address']).set(
+                    sum(s.in_flight for s in n.client.channel_stats()))
+
+    # A world-wide open loop rate is shared by nodes in proportion to their
+    # user counts.
+    def _split_open_loop_rate(self, nodes: List[Node], user_count: int):
+        rate = self.config['open_loop_rate']
+        for n in nodes:
+            n.config['load_mode'] = 'open'
+            n.config['open_loop_rate'] = \
+                rate * len(n.users) / user_count if user_count else 0
+
+    async def _generate_transfers(
+            self, nodes: List[Node], recipients: List[str],
+            run_duration: float) -> List[Transfer]:
+        tasks = [
+            asyncio.create_task(n.generate_transfers(recipients, run_duration))
+            for n in nodes
         ]
-        await client.propose()
-        balances = []
-        for deploy_id in deploy_ids:
-            data = await client.get_data_at_deploy_id(deploy_id)
-            bal = data.blockResults[0].postBlockData[0].exprs[0].g_int
-            balances.append(bal)
+        (done, pending) = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_EXCEPTION)
+        try:
+            return [tf for t in done for tf in t.result()]
+        except Exception:
+            for t in pending:
+                t.cancel()
+            raise
+
+    async def _generate_transfers_sharded(
+            self, users: List[User], recipients: List[str],
+            run_duration: float,
+            workers: int) -> Tuple[List[Transfer], List[Tuple[str, int]]]:
+        shards = split_nodes(self.config['nodes'], workers)
+        self.logger.info(
+            'Generating transfers in %d worker processes', len(shards))
+        # Workers have registries of their own, which are only merged into
+        # this one when they finish. Until then scrapes miss their metrics.
+        if self.config.get('metrics_port'):
+            self.logger.warning(
+                'Worker metrics are exported once the workers finish')
+        # Every worker streams into a ledger file of its own.
+        ledger_path = self.config.get('ledger_path')
+        evt_loop = asyncio.get_running_loop()
+        # Forking a process that has gRPC channels in use is unsupported.
+        with ProcessPoolExecutor(
+                max_workers=len(shards),
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = await asyncio.gather(
+                *(
+                    evt_loop.run_in_executor(
+                        executor, run_shard, shard, recipients, run_duration,
+                        f'{ledger_path}.{i}' if ledger_path else None)
+                    for i, shard in enumerate(shards)
+                ))
+        for result in results:
+            result.users.update_users(users)
+            metrics.REGISTRY.merge(result.metrics)
+        ledgers = []
+        if ledger_path:
+            ledgers = [(f'{ledger_path}.{i}', r.ledger_start)
+                       for i, r in enumerate(results)]
+        return ([tf for r in results for tf in r.transfers], ledgers)
+
+    # Expected balances and transfer count from the ledgers of a run, given
+    # as (path, index of the run's first record). Transfers written to a
+    # ledger aren't kept in memory.
+    @staticmethod
+    def _ledger_balances(
+            initial: Dict[str, int],
+            ledgers: List[Tuple[str, int]]) -> Tuple[Dict[str, int], int]:
+        balances = initial
+        count = 0
+        for (path, start) in ledgers:
+            with LedgerReader(path) as reader:
+                balances = reader.expected_balances(balances, start)
+                count += len(reader) - start
+        return (balances, count)
+
+    # Looks up balances while transfers are generated, only with the queries
+    # the nodes' proposes pick up.
+    def _start_monitor(
+            self, nodes: List[Node], users: List[User]) -> asyncio.Task:
+        sinks = [SupplySink()]
+        if self.events is not None:
+            sinks.append(BroadcasterSink(self.events))
+        monitor = BalanceMonitor(
+            [n.client for n in nodes], self.admin_key,
+            [u.rev_addr for u in users], sinks, self.logger,
+            self.config['monitor_interval'],
+            resolve_timeout=self.config.get('resolve_timeout', 60))
+        return asyncio.create_task(monitor.run())
+
+    async def _replay_trace(self, nodes: List[Node]) -> TraceReplayer:
+        replayer = TraceReplayer(
+            nodes, self.logger, self.config.get('replay_speed', 1.0),
+            self.config.get('replay_max_inflight', 1000))
+        self.logger.info(
+            'Replaying trace %s at speed %s', self.config['replay_trace'],
+            replayer.speed or 'max')
+        with TraceReader(self.config['replay_trace']) as reader:
+            await replayer.replay(iter(reader))
+        return replayer
 
     async def main(self):
-        with contextlib.ExitStack() as stack:
+        async with contextlib.AsyncExitStack() as stack:
             nodes = [
-                stack.enter_context(Node(node_config, self.logger))
-                for node_config in config['nodes']
+                await stack.enter_async_context(Node(node_config, self.logger))
+                for node_config in self.config['nodes']
             ]
             users = [u for n in nodes for u in n.users]
             client = nodes[0].client
-            await self._init_vaults(client, users)
+            router = None
+            if self.config.get('routing_policy'):
+                router = NodeRouter(
+                    {n.config['address']: n.client
+                     for n in nodes}, self.config['routing_policy'],
+                    self.config.get('routing_failure_threshold', 5),
+                    self.config.get('routing_reset_timeout', 30))
+                client = router
+                for n in nodes:
+                    n.router = router
+            for n in nodes:
+                n.events = self.events
+            metrics.REGISTRY.gauge('expected_supply').set(
+                sum(u.config['initial_balance'] for u in users))
+            if self.config.get('metrics_port'):
+                exporter = await stack.enter_async_context(
+                    MetricsExporter(
+                        self.config.get('metrics_host', '127.0.0.1'),
+                        self.config['metrics_port']))
+                exporter.collectors.append(
+                    lambda registry: self._collect_metrics(registry, nodes))
+                self.logger.info(
+                    'Serving metrics on http://%s:%d/metrics', exporter.host,
+                    exporter.port)
+            checkpointer = None
+            if self.config.get('checkpoint_dir'):
+                checkpointer = Checkpointer(
+                    self.config['checkpoint_dir'], self.logger,
+                    self.config.get('checkpoint_interval', 60))
+                if checkpointer.restore(nodes):
+                    self.logger.info(
+                        'Resuming from checkpoint after %.0fs of simulation',
+                        checkpointer.elapsed)
+                for n in nodes:
+                    stack.callback(n.ledger.close)
+
+            if checkpointer is not None and \
+                    checkpointer.snapshot.vaults_funded:
+                self.logger.info('Vaults funded before checkpoint')
+            elif self.config.get('funding_mode', 'sequential') == 'bulk':
+                await self._init_vaults_bulk(nodes, users)
+            else:
+                # The genesis vault must exist on the node the funding
+                # transfers go to, they aren't spread over nodes.
+                await self._init_vaults(nodes[0].client, users)
+            if checkpointer is not None:
+                await checkpointer.mark_funded()
 
+            if 'open_loop_rate' in self.config:
+                self._split_open_loop_rate(nodes, len(users))
             recipients = [u.rev_addr for u in users]
-            tasks = [n.generate_transfers(recipients, 120) for n in nodes]
-            (done, pending) = await asyncio.wait(
-                tasks, return_when=asyncio.FIRST_EXCEPTION)
-            for t in done:
-                t.result()
+            if self.events is not None:
+                # Published transfers keep these up to date.
+                balances = {
+                    u.rev_addr: u.config['initial_balance']
+                    for u in users
+                }
+                if checkpointer is not None:
+                    (balances, _) = self._ledger_balances(
+                        balances,
+                        [(p, 0) for p in checkpointer.ledger_paths(nodes)])
+                for (rev_addr, balance) in balances.items():
+                    self.events.publish_balance(rev_addr, balance)
+            run_duration = self.config.get('run_duration', 120)
+            if checkpointer is not None:
+                run_duration = max(0, run_duration - checkpointer.elapsed)
+            workers = self.config.get('workers', 0)
+            if self.config.get('metrics_interval'):
+                reporter = asyncio.create_task(
+                    metrics.report_periodically(
+                        self.logger, self.config['metrics_interval']))
+                stack.callback(reporter.cancel)
+            monitor = None
+            if self.config.get('monitor_interval'):
+                monitor = self._start_monitor(nodes, users)
+                stack.push_async_callback(_cancel, monitor)
+            if self.config.get('trace_path'):
+                if workers:
+                    self.logger.warning(
+                        'Traces need an in-process run, ignoring workers')
+                    workers = 0
+                trace = stack.enter_context(
+                    TraceWriter(self.config['trace_path']))
+                for n in nodes:
+                    n.trace = trace
+            ledgers: List[Tuple[str, int]] = []
+            replayer = None
+            if self.config.get('replay_trace'):
+                replayer = await self._replay_trace(nodes)
+                transfers = []
+            elif checkpointer is not None:
+                if workers:
+                    self.logger.warning(
+                        'Checkpoints need an in-process run, ignoring workers')
+                checkpointer.start()
+                await self._generate_transfers(nodes, recipients, run_duration)
+                await checkpointer.flush()
+                transfers = []
+                ledgers = [(p, 0) for p in checkpointer.ledger_paths(nodes)]
+            elif workers:
+                (transfers,
+                 ledgers) = await self._generate_transfers_sharded(
+                     users, recipients, run_duration, workers)
+            else:
+                ledger = None
+                if self.config.get('ledger_path'):
+                    ledger = stack.enter_context(
+                        LedgerWriter(self.config['ledger_path']))
+                    ledgers.append((ledger.path, ledger.count))
+                    for n in nodes:
+                        n.ledger = ledger
+                transfers = await self._generate_transfers(
+                    nodes, recipients, run_duration)
+                if ledger is not None:
+                    ledger.flush()
 
-            balances = await self._get_user_balances(client, users)
-            for u, bal in zip(users, balances):
-                self.logger.info('User %s expected balance: %d', u.balance)
-                self.logger.info('User %s actual balance:   %d', bal)
+            # The final verification sets observed_supply from here on.
+            if monitor is not None:
+                await _cancel(monitor)
 
-if __name__ == '__main__':
+            # User.balance only tracks what a user has sent, incoming
+            # transfers are accounted for here.
+            initial = {u.rev_addr: u.config['initial_balance'] for u in users}
+            if replayer is not None:
+                expected = replayer.expected_balances(initial)
+                count = replayer.finished
+            elif ledgers:
+                (expected, count) = self._ledger_balances(initial, ledgers)
+            else:
+                expected = expected_balances(initial, transfers)
+                count = len(transfers)
+            self.logger.info('Finished %d transfers', count)
+            metrics.log_summary(self.logger)
+            if router is not None:
+                router.log_shares(self.logger)
 
-    shared_processors = [
-        structlog.stdlib.add_log_level,
-        structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S"),
-        structlog.stdlib.PositionalArgumentsFormatter(),
-    ]
-
-    structlog.configure(
-        processors=shared_processors + [
-            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
-        ],
-        logger_factory=structlog.stdlib.LoggerFactory(),
-        wrapper_class=structlog.stdlib.BoundLogger,
-        cache_logger_on_first_use=True,
-    )
-
-    formatter = structlog.stdlib.ProcessorFormatter(
-        processor=structlog.dev.ConsoleRenderer(),
-        foreign_pre_chain=shared_processors,
-    )
-
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
-    root_logger = logging.getLogger()
-    root_logger.addHandler(handler)
-    root_logger.setLevel(logging.INFO)
+            report = await self._verify_balances(client, expected)
+            for d in report.mismatches:
+                self.logger.error(
+                    'User %s expected balance %d, actual %d', d.rev_addr,
+                    d.expected, d.actual)
+            for d in report.missing:
+                self.logger.error('User %s balance not available', d.rev_addr)
+            if self.events is not None:
+                for d in report.diffs:
+                    if d.actual is not None:
+                        self.events.publish_balance(d.rev_addr, d.actual)
+            metrics.REGISTRY.gauge('observed_supply').set(
+                sum(d.actual for d in report.diffs if d.actual is not None))
+            self.logger.info(
+                'Verified %d balances: %d mismatched, %d missing',
+                len(report.diffs), len(report.mismatches), len(report.missing))
+            return report
 
+if __name__ == '__main__':
     config = json.loads(Path('config.json').read_text())
-    w = World(config)
-    asyncio.run(w.main())
+    listener = configure_logging(config)
+    try:
+        w = World(config)
+        asyncio.run(w.main())
+    finally:
+        if listener is not None:
+            listener.stop()